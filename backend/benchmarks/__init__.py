@@ -0,0 +1,5 @@
+# Benchmarks for Beach Monitor Spain (ejecutar desde backend/ con python -m)
+import os
+
+# Contra el stub no hay cupo que proteger; bench_quota crea el suyo explícitamente
+os.environ.setdefault('WEATHER_QUOTA_ENABLED', 'false')
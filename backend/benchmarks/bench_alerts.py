@@ -0,0 +1,73 @@
+"""
+Avisos CAP: análisis una vez por boletín e índice playa/provincia → avisos
+
+Ingiere el boletín grabado de data/cap_samples, comprueba los avisos que
+afectan a cada playa y mide la lectura del índice (por playa y por provincia)
+frente a analizar el boletín y cruzar polígonos en cada consulta, como haría
+un endpoint sin índice. La caducidad de un aviso recalcula el índice con el
+bitmap ya calculado, y una segunda ingesta del mismo boletín no recalcula nada.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_alerts [consultas]
+"""
+
+import asyncio
+import sys
+import time
+
+from services.alerts import AlertIndex, AlertIngestor, parse_cap
+from services.beach_repository import BeachRepository
+from services.weather_service import AEMETService
+
+
+async def main(requests: int):
+    repository = BeachRepository.load()
+    beaches = repository.all()
+    ingestor = AlertIngestor(beaches, AEMETService(), source='files')
+
+    start = time.perf_counter()
+    await ingestor.run_once()
+    ingest = (time.perf_counter() - start) * 1000
+    stats = ingestor.stats()
+    print(f"Boletín {stats['issued']}: {stats['parsed']} mensajes CAP, {stats['active']} avisos en vigor, "
+          f"{stats['beaches_affected']} playas afectadas; ingesta {ingest:.1f} ms (bitmap aviso x playa "
+          f"{stats['last_membership_ms']} ms, {stats['membership_bytes']} bytes; índice {stats['last_build_ms']} ms)")
+
+    index = ingestor.index()
+    for beach in beaches:
+        alerts = index.for_beach(beach.id)
+        if alerts:
+            described = (f"{alert['level']}/{alert['type']} ({', '.join(alert['areas'])})" for alert in alerts)
+            print(f"    {beach.id:>4} {beach.name:<32}" + ', '.join(described))
+
+    provinces = [province.id for province in repository.provinces()]
+    start = time.perf_counter()
+    for i in range(requests):
+        ingestor.index().for_beach(beaches[i % len(beaches)].id)
+        ingestor.index().for_province(provinces[i % len(provinces)])
+    indexed = (time.perf_counter() - start) / requests * 1e6
+
+    # Sin índice: cada consulta analiza el boletín y cruza todas las playas con los polígonos
+    documents = ingestor._read_files()
+    now = ingestor.now()
+    samples = max(1, requests // 100)
+    start = time.perf_counter()
+    for i in range(samples):
+        alerts = [parse_cap(document) for document in documents]
+        AlertIndex(alerts, beaches, now).for_beach(beaches[i % len(beaches)].id)
+    naive = (time.perf_counter() - start) / samples * 1e6
+    print(f"\nConsulta (playa + provincia): índice {indexed:.2f} µs frente a {naive:.0f} µs analizando en cada consulta")
+
+    # Caducidad de un aviso: el índice se recalcula reutilizando el bitmap del boletín
+    start = time.perf_counter()
+    ingestor._rebuild(index.valid_until)
+    print(f"Recálculo al caducar un aviso (sin geometría): {(time.perf_counter() - start) * 1000:.2f} ms, "
+          f"{len(ingestor.index().all())} avisos en vigor")
+
+    await ingestor.run_once()
+    print(f"Segunda ingesta del mismo boletín: {ingestor.unchanged} sin cambios, "
+          f"{ingestor.rebuilds} cálculo(s) del índice en total")
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000))
@@ -0,0 +1,54 @@
+"""
+Prueba de carga del single-flight: llamadas upstream frente a concurrencia de clientes
+
+Lanza N peticiones simultáneas (caché fría) para estaciones compartidas y cuenta
+cuántas peticiones llegan al stub de AEMET.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_coalescing
+"""
+
+import asyncio
+import time
+
+from benchmarks.stub_server import StubServer
+from services.weather_service import WeatherServiceManager
+
+# Estaciones compartidas por varias playas del catálogo (p. ej. 6155A en ids 1 y 3)
+STATIONS = [
+    (36.7196, -4.4214, '6155A'),
+    (36.5108, -4.8850, '6155A'),
+    (43.3713, -8.4079, '1387'),
+    (42.2069, -8.7331, '1484D'),
+]
+
+
+async def run(concurrency: int):
+    stub = StubServer(delay=0.05)
+    base_url = await stub.start()
+    manager = WeatherServiceManager()
+    manager.aemet.api_key = 'benchmark'
+    manager.aemet.base_url = base_url
+    await manager.startup()
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            manager.get_complete_weather_data(*STATIONS[i % len(STATIONS)])
+            for i in range(concurrency)
+        ))
+        elapsed = (time.perf_counter() - start) * 1000
+        return stub.requests, manager.singleflight.stats()['coalescing_ratio'], elapsed
+    finally:
+        await manager.shutdown()
+        await stub.stop()
+
+
+async def main():
+    print(f"{'clientes':>10}{'upstream':>10}{'ratio':>8}{'ms':>10}")
+    for concurrency in (1, 10, 100, 500, 2000):
+        upstream, ratio, elapsed = await run(concurrency)
+        print(f"{concurrency:>10}{upstream:>10}{ratio:>8.3f}{elapsed:>10.1f}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""
+Latencia de get_complete_weather_data con componentes lentos
+
+Cada petición (caché vacía) necesita el dato atmosférico (AEMET, dos saltos, u
+OpenWeatherMap con /weather y /uvi) y el marítimo. Con los componentes en
+paralelo la latencia es la del más lento, acotada por su tiempo máximo; la
+columna "serie" es la suma que pagaba la cadena secuencial.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_components [repeticiones]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from benchmarks.stub_server import StubServer
+from services.weather_service import HTTPClientConfig, WeatherServiceManager
+
+DELAY = 0.05
+MARINE_DELAY = 0.15
+HTTP_CONFIG = HTTPClientConfig(atmospheric_timeout=2.0, uv_timeout=0.3, marine_timeout=0.3)
+
+# (nombre, estación AEMET, fallos del stub, retardo marítimo, suma en serie en s)
+SCENARIOS = [
+    ('OpenWeatherMap /weather + /uvi', None, {}, 0.0, 2 * DELAY),
+    ('OpenWeatherMap, /uvi colgado', None, {'uvi': 'hang'}, 0.0, None),
+    ('AEMET + marítimo lento', '6155A', {}, MARINE_DELAY, 2 * DELAY + MARINE_DELAY),
+    ('AEMET + marítimo colgado', '6155A', {}, 30.0, None),
+]
+
+
+def slow_marine(manager: WeatherServiceManager, delay: float):
+    original = manager.marine.get_sea_conditions
+
+    async def get_sea_conditions(lat: float, lon: float):
+        await asyncio.sleep(delay)
+        return await original(lat, lon)
+
+    manager.marine.get_sea_conditions = get_sea_conditions
+
+
+async def main(repeat: int):
+    stub = StubServer(delay=DELAY)
+    stub.hang_seconds = 30.0
+    base_url = await stub.start()
+    print(f"{'escenario':<34}{'p50 ms':>8}{'serie ms':>10}  fuente / missing")
+    try:
+        for name, station, faults, marine_delay, serial in SCENARIOS:
+            stub.faults = faults
+            manager = WeatherServiceManager(http_config=HTTP_CONFIG)
+            for service in (manager.aemet, manager.openweather):
+                service.api_key = 'benchmark'
+                service.base_url = base_url
+            if marine_delay:
+                slow_marine(manager, marine_delay)
+            await manager.startup()
+            latencies = []
+            try:
+                for _ in range(repeat):
+                    manager.cache.clear()
+                    start = time.perf_counter()
+                    data = await manager.get_complete_weather_data(36.7196, -4.4214, station)
+                    latencies.append((time.perf_counter() - start) * 1000)
+            finally:
+                await manager.shutdown()
+            serial_text = f"{serial * 1000:>10.0f}" if serial else f"{'∞':>10}"
+            print(f"{name:<34}{statistics.median(latencies):>8.0f}{serial_text}  {data['source']} {data['missing']}")
+    finally:
+        await stub.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10))
@@ -0,0 +1,76 @@
+"""
+Inyección de fallos: latencia con AEMET caído, con y sin circuit breaker
+
+Con el stub de AEMET sin responder (o devolviendo 500) y timeouts de lectura
+de 1 s, lanza peticiones secuenciales con la caché vacía y muestra latencia,
+fuente usada y estado del circuito. Después AEMET se recupera y se comprueba
+la sonda en semiabierto y el cierre del circuito.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_faults [hang|error|reset]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from benchmarks.stub_server import StubServer
+from services.resilience import BreakerConfig, CircuitBreaker
+from services.weather_service import HTTPClientConfig, WeatherServiceManager
+
+REQUESTS = 12
+OPEN_SECONDS = 2.0
+HTTP_CONFIG = HTTPClientConfig(connect_timeout=1.0, read_timeout=1.0, total_timeout=2.0)
+
+
+async def make_manager(base_url: str, breaker: bool) -> WeatherServiceManager:
+    manager = WeatherServiceManager(http_config=HTTP_CONFIG)
+    for service in (manager.aemet, manager.openweather):
+        service.api_key = 'benchmark'
+        service.base_url = base_url
+    config = BreakerConfig(window=10, min_calls=3, open_seconds=OPEN_SECONDS)
+    if not breaker:
+        config.min_calls = 10 ** 9
+    manager.breakers = {source: CircuitBreaker(source, config) for source in manager.cache_ttls}
+    await manager.startup()
+    return manager
+
+
+async def run_phase(manager: WeatherServiceManager, label: str, requests: int = REQUESTS):
+    latencies = []
+    rows = []
+    for _ in range(requests):
+        manager.cache.clear()
+        start = time.perf_counter()
+        data = await manager.get_complete_weather_data(36.7196, -4.4214, '6155A')
+        elapsed = (time.perf_counter() - start) * 1000
+        latencies.append(elapsed)
+        rows.append(f"{elapsed:7.0f} ms  {data['source']:<15} aemet={manager.breakers['aemet'].state}")
+    print(f"\n{label}: p50 {statistics.median(latencies):.0f} ms, total {sum(latencies) / 1000:.1f} s")
+    for row in rows:
+        print('   ', row)
+
+
+async def main(fault: str):
+    stub = StubServer()
+    base_url = await stub.start()
+    try:
+        for breaker in (False, True):
+            stub.faults = {'aemet': fault}
+            manager = await make_manager(base_url, breaker)
+            try:
+                await run_phase(manager, f"AEMET '{fault}' {'con' if breaker else 'sin'} circuit breaker")
+                if breaker:
+                    stub.faults = {}
+                    await asyncio.sleep(OPEN_SECONDS)
+                    await run_phase(manager, "AEMET recuperado (sonda semiabierta)", requests=3)
+                    print(f"\nCircuito AEMET: {manager.breakers['aemet'].stats()}")
+            finally:
+                await manager.shutdown()
+    finally:
+        await stub.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else 'hang'))
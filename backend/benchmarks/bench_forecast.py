@@ -0,0 +1,71 @@
+"""
+Predicción municipal: análisis una vez por emisión y lectura desde memoria
+
+Analiza las predicciones grabadas de data/forecast_samples (diaria y horaria de
+AEMET), compara el tamaño de la tabla columnar con el JSON original, mide la
+respuesta del endpoint servida desde memoria y cuenta las descargas a AEMET que
+provoca un día completo de consultas según el calendario de publicación.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_forecast [consultas]
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from services.forecast import DEFAULT_SAMPLES_DIR, ForecastRefresher, ForecastStore, parse_hourly_prediction
+from services.http_cache import render_json
+from services.weather_service import AEMETService
+
+
+async def main(requests: int):
+    store = ForecastStore()
+    aemet = AEMETService()
+    codes = sorted({name.split('_')[1].split('.')[0] for name in os.listdir(DEFAULT_SAMPLES_DIR)})
+    refresher = ForecastRefresher(store, aemet, codes, source='files')
+
+    raw_bytes = sum(os.path.getsize(os.path.join(DEFAULT_SAMPLES_DIR, name)) for name in os.listdir(DEFAULT_SAMPLES_DIR))
+    start = time.perf_counter()
+    for code in codes:
+        await refresher.refresh(code)
+    parsed = (time.perf_counter() - start) * 1000
+    stats = store.stats()
+    print(f"{len(codes)} municipios: análisis {parsed:.1f} ms, JSON {raw_bytes / 1024:.0f} KiB → "
+          f"tabla columnar {stats['bytes'] / 1024:.1f} KiB")
+
+    with open(os.path.join(DEFAULT_SAMPLES_DIR, f'horaria_{codes[0]}.json'), encoding='utf-8') as f:
+        hourly = json.load(f)
+    start = time.perf_counter()
+    for _ in range(100):
+        parse_hourly_prediction(hourly)
+    per_parse = (time.perf_counter() - start) * 10
+    print(f"Predicción horaria ({len(parse_hourly_prediction(hourly))} horas): {per_parse:.2f} ms por análisis")
+
+    # Cuerpo de la respuesta: la primera vez se construye, después se reutiliza
+    entry = store.get(codes[0])
+    start = time.perf_counter()
+    for i in range(requests):
+        render_json(dict(store.get(codes[i % len(codes)]).payload(), beach_id=1))
+    per_request = (time.perf_counter() - start) / requests * 1e6
+    print(f"Respuesta /forecast desde memoria: {per_request:.0f} µs ({len(entry.payload()['daily'])} días, "
+          f"{len(entry.payload()['hourly'])} horas, {len(render_json(entry.payload()))} bytes)")
+
+    # Un día de consultas cada minuto: solo se descarga tras cada publicación
+    publications = set()
+    day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    for minute in range(24 * 60):
+        now = day + timedelta(minutes=minute)
+        publications.add(refresher.last_publication(now))
+    # La publicación de la víspera ya estaba descargada al empezar el día
+    downloads = len([published for published in publications if published >= day]) * 2
+    print(f"Un día con {requests} consultas/minuto por municipio: {downloads} descargas a AEMET por municipio "
+          f"(diaria + horaria en cada publicación {refresher.publication_hours}) "
+          f"frente a {requests * 24 * 60 * 2} sin la tabla")
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000))
@@ -0,0 +1,93 @@
+"""
+Punto en polígono: pasada vectorizada por polígono frente a bucle por punto
+
+Genera `polígonos` polígonos sintéticos en forma de estrella (no convexos, como
+las zonas de aviso costeras) sobre el dominio Península + Baleares + Canarias y
+`puntos` puntos aleatorios. Calcula el bitmap polígono × punto con
+services.geometry (rectángulo envolvente + ray casting vectorizado), lo compara
+con el ray casting en Python puro punto a punto y mide la lectura del bitmap.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_geometry [puntos] [polígonos] [vértices]
+"""
+
+import math
+import sys
+import time
+
+import numpy as np
+
+from services.geometry import MembershipBitmap, PointSet, ring_bbox
+
+LAT = (27.0, 44.5)
+LON = (-18.5, 5.0)
+
+
+def star(rng, vertices: int):
+    lat0 = rng.uniform(*LAT)
+    lon0 = rng.uniform(*LON)
+    radius = rng.uniform(0.2, 1.5)
+    angles = np.sort(rng.uniform(0, 2 * math.pi, vertices))
+    radii = radius * rng.uniform(0.3, 1.0, vertices)
+    return [(lat0 + r * math.sin(a), lon0 + r * math.cos(a)) for a, r in zip(angles, radii)]
+
+
+def point_in_polygon(lat: float, lon: float, ring) -> bool:
+    inside = False
+    count = len(ring)
+    for k in range(count):
+        lat1, lon1 = ring[k]
+        lat2, lon2 = ring[(k + 1) % count]
+        if (lat1 > lat) != (lat2 > lat) and lon < lon1 + (lat - lat1) * (lon2 - lon1) / (lat2 - lat1):
+            inside = not inside
+    return inside
+
+
+def naive(lats, lons, polygons):
+    # Lo que costaría cruzar cada punto con cada polígono (con rectángulo envolvente)
+    bboxes = [ring_bbox(ring) for ring in polygons]
+    rows = np.zeros((len(polygons), len(lats)), dtype=bool)
+    for j, (lat, lon) in enumerate(zip(lats.tolist(), lons.tolist())):
+        for i, (ring, (min_lat, min_lon, max_lat, max_lon)) in enumerate(zip(polygons, bboxes)):
+            if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon and point_in_polygon(lat, lon, ring):
+                rows[i, j] = True
+    return rows
+
+
+def main(points: int, count: int, vertices: int):
+    rng = np.random.default_rng(11)
+    polygons = [star(rng, vertices) for _ in range(count)]
+    lats = rng.uniform(*LAT, points)
+    lons = rng.uniform(*LON, points)
+
+    start = time.perf_counter()
+    point_set = PointSet(lats, lons)
+    indexed = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    bitmap = MembershipBitmap.build(point_set, ([ring] for ring in polygons))
+    vectorized = (time.perf_counter() - start) * 1000
+    candidates = sum(len(point_set.in_bbox(ring_bbox(ring))) for ring in polygons)
+    print(f"{count} polígonos x {vertices} vértices, {points} puntos: {candidates} candidatos tras el rectángulo "
+          f"envolvente ({candidates / (count * points):.1%} de los pares)")
+    print(f"    vectorizado     {vectorized:8.1f} ms  (+{indexed:.2f} ms ordenando los puntos)")
+
+    start = time.perf_counter()
+    expected = naive(lats, lons, polygons)
+    python = (time.perf_counter() - start) * 1000
+    rows = np.unpackbits(bitmap.bits, axis=1, count=points).astype(bool)
+    print(f"    Python puro     {python:8.1f} ms  ({python / vectorized:.0f}x), "
+          f"{'mismo resultado' if np.array_equal(rows, expected) else 'RESULTADOS DISTINTOS'}")
+    print(f"Bitmap: {bitmap.nbytes / 1024:.1f} KiB frente a {rows.nbytes / 1024:.0f} KiB sin empaquetar; "
+          f"{int(bitmap.counts().sum())} pertenencias")
+
+    lookups = 100000
+    start = time.perf_counter()
+    for i in range(lookups):
+        bitmap.shapes_of(i % points)
+    print(f"Polígonos de un punto desde el bitmap: {(time.perf_counter() - start) / lookups * 1e6:.2f} µs")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 200,
+         int(sys.argv[3]) if len(sys.argv) > 3 else 64)
@@ -0,0 +1,131 @@
+"""
+Predicción en rejilla: interpolación vectorizada frente a consultas por playa
+
+Genera una rejilla sintética del dominio Península + Baleares + Canarias con
+campos lineales (la interpolación bilineal debe reproducirlos exactamente), la
+abre con memmap e interpola todas las playas del catálogo y `puntos` puntos
+aleatorios en una pasada. Después compara la tabla de provincia pidiendo a
+AEMET (stub con retardo) en cada estación frente a leerla de la rejilla.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_grid [puntos] [resolución en grados]
+"""
+
+import asyncio
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from benchmarks.stub_server import StubServer
+from services.beach_repository import BeachRepository
+from services.grid_forecast import ForecastGrid, GridForecastTable, save_grid
+from services.weather_service import WeatherServiceManager
+
+LAT = (27.0, 44.5)
+LON = (-18.5, 5.0)
+STEPS = 24
+DELAY = 0.05
+
+
+def temperature(lats, lons, step):
+    return 30.0 - 0.5 * (lats - LAT[0]) + 0.1 * (lons - LON[0]) + 0.2 * step
+
+
+def write_grid(directory: str, resolution: float) -> float:
+    lats = np.arange(LAT[0], LAT[1] + resolution / 2, resolution)
+    lons = np.arange(LON[0], LON[1] + resolution / 2, resolution)
+    grid_lat, grid_lon = np.meshgrid(lats, lons, indexing='ij')
+    steps = np.arange(STEPS)[:, None, None]
+    first = datetime.now(timezone.utc).replace(tzinfo=None, minute=0, second=0, microsecond=0)
+    shape = (STEPS, len(lats), len(lons))
+    arrays = {
+        'temperature': temperature(grid_lat, grid_lon, steps),
+        'humidity': np.broadcast_to(50 + 0.5 * (grid_lat - LAT[0]), shape),
+        'wind_u': np.broadcast_to(-3.0 + 0.1 * (grid_lon - LON[0]), shape),
+        'wind_v': np.broadcast_to(2.0 + 0 * grid_lat, shape),
+        'pressure': np.broadcast_to(1015 - 0.2 * (grid_lat - LAT[0]), shape),
+        'cloud_cover': np.broadcast_to(4.0 * (grid_lat - LAT[0]), shape),
+        'uv_index': np.broadcast_to(10 - 0.3 * (grid_lat - LAT[0]), shape),
+    }
+    meta = {
+        'model': 'Sintético',
+        'issued': first.isoformat(),
+        'lat': {'start': LAT[0], 'step': resolution, 'count': len(lats)},
+        'lon': {'start': LON[0], 'step': resolution, 'count': len(lons)},
+        'steps': [(first + timedelta(hours=h)).isoformat() for h in range(STEPS)],
+    }
+    save_grid(directory, meta, arrays)
+    return sum(array.size for array in arrays.values()) * 4 / 1e6
+
+
+async def province_table(beaches, grid, base_url: str):
+    manager = WeatherServiceManager()
+    for service in (manager.aemet, manager.openweather):
+        service.api_key = 'benchmark'
+        service.base_url = base_url
+    manager.grid = grid
+    await manager.startup()
+    try:
+        start = time.perf_counter()
+        results = await manager.get_station_weather_table(beaches, concurrency=10)
+        elapsed = (time.perf_counter() - start) * 1000
+        sources = sorted({result['source'] for result in results.values()})
+        return elapsed, len(results), sources
+    finally:
+        await manager.shutdown()
+
+
+async def main(points: int, resolution: float):
+    beaches = BeachRepository.load().all()
+    with tempfile.TemporaryDirectory() as directory:
+        size_mb = write_grid(directory, resolution)
+        start = time.perf_counter()
+        grid = ForecastGrid(directory)
+        opened = (time.perf_counter() - start) * 1000
+        print(f"Rejilla {grid.lat[2]}x{grid.lon[2]} ({resolution}°), {STEPS} pasos, "
+              f"{len(grid.arrays)} variables: {size_mb:.0f} MB en disco, apertura memmap {opened:.2f} ms")
+
+        table = GridForecastTable.load(beaches)
+        table.install(grid)
+        print(f"Catálogo ({len(beaches)} playas x {STEPS} pasos): {table.last_interpolation * 1000:.2f} ms")
+
+        rng = np.random.default_rng(7)
+        lats = rng.uniform(36.0, 43.5, points)
+        lons = rng.uniform(-9.0, 3.0, points)
+        start = time.perf_counter()
+        grid.derive(lats, lons)
+        many = (time.perf_counter() - start) * 1000
+        step = np.arange(STEPS)[:, None]
+        error = np.abs(grid.interpolate(lats, lons)['temperature'] - temperature(lats[None, :], lons[None, :], step)).max()
+        print(f"{points} puntos x {STEPS} pasos: {many:.1f} ms ({many / points * 1000:.2f} µs/punto), "
+              f"error máximo de temperatura {error:.2e} °C")
+
+        lookups = 20000
+        start = time.perf_counter()
+        for i in range(lookups):
+            beach = beaches[i % len(beaches)]
+            table.lookup(beach.lat, beach.lng)
+        lookup_us = (time.perf_counter() - start) / lookups * 1e6
+        sample = table.lookup(beaches[0].lat, beaches[0].lng)
+        print(f"Consulta por playa: {lookup_us:.1f} µs ({beaches[0].name}: {sample.temperature_air} °C, "
+              f"{sample.wind_speed} km/h {sample.wind_direction}, {sample.conditions})")
+
+        stub = StubServer(delay=DELAY)
+        base_url = await stub.start()
+        try:
+            print(f"\nTabla de todas las playas, caché vacía (stub con {DELAY * 1000:.0f} ms por llamada):")
+            for label, source in (('por estación (AEMET)', None), ('rejilla', table)):
+                before = stub.requests
+                elapsed, total, sources = await province_table(beaches, source, base_url)
+                calls = stub.requests - before
+                print(f"    {label:<28}{elapsed:8.1f} ms  {total} playas  llamadas upstream {calls}  {sources}")
+        finally:
+            await stub.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000,
+                     float(sys.argv[2]) if len(sys.argv) > 2 else 0.05))
@@ -0,0 +1,73 @@
+"""
+Latencia de cola con y sin peticiones de respaldo (hedging)
+
+El stub de AEMET responde con una latencia base y una fracción de respuestas
+muy lentas (cola); OpenWeatherMap responde con la latencia base. Con la caché
+vacía en cada petición, compara p50/p99 de la cadena secuencial con el modo de
+respaldo al percentil configurado, y muestra la tasa de respaldo y de victorias.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_hedging [peticiones] [percentil]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from benchmarks.stub_server import StubServer
+from services.resilience import HedgeConfig, RequestHedger
+from services.weather_service import WeatherServiceManager
+
+TAIL_RATE = 0.02
+TAIL_SECONDS = 0.5
+BASE_DELAY = 0.01
+
+
+async def run(base_url: str, requests: int, hedge: bool, percentile: float):
+    manager = WeatherServiceManager()
+    for service in (manager.aemet, manager.openweather):
+        service.api_key = 'benchmark'
+        service.base_url = base_url
+    manager.hedger = RequestHedger(HedgeConfig(enabled=hedge, percentile=percentile, initial_delay=0.2))
+    await manager.startup()
+    latencies = []
+    sources = {}
+    try:
+        for _ in range(requests):
+            manager.cache.clear()
+            start = time.perf_counter()
+            data = await manager.get_complete_weather_data(36.7196, -4.4214, '6155A')
+            latencies.append((time.perf_counter() - start) * 1000)
+            sources[data['source']] = sources.get(data['source'], 0) + 1
+    finally:
+        await manager.shutdown()
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+    label = f"con respaldo (p{percentile * 100:g})" if hedge else "secuencial"
+    print(f"\n{label}: p50 {statistics.median(latencies):.1f} ms, p99 {p99:.1f} ms, "
+          f"máx {latencies[-1]:.1f} ms, fuentes {sources}")
+    if hedge:
+        stats = manager.hedger.stats()
+        print(f"    respaldo {stats['hedge_rate']:.1%} de las peticiones, "
+              f"gana el secundario {stats['win_rate']:.1%}, espera {stats['delay_ms']}")
+
+
+async def main(requests: int, percentile: float):
+    stub = StubServer(delay=BASE_DELAY)
+    stub.faults = {'aemet': 'tail'}
+    stub.tail_rate = TAIL_RATE
+    stub.tail_seconds = TAIL_SECONDS
+    base_url = await stub.start()
+    print(f"AEMET: {TAIL_RATE:.0%} de respuestas con +{TAIL_SECONDS * 1000:.0f} ms; {requests} peticiones")
+    try:
+        for hedge in (False, True):
+            await run(base_url, requests, hedge, percentile)
+    finally:
+        await stub.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 300,
+                     float(sys.argv[2]) if len(sys.argv) > 2 else 0.95))
@@ -0,0 +1,56 @@
+"""
+Latencia p50/p99 de AEMETService con sesión nueva por petición frente a sesión compartida
+
+Uso (desde backend/):
+    python -m benchmarks.bench_http_session [iteraciones]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from benchmarks.stub_server import StubServer
+from services.weather_service import AEMETService, HTTPClientConfig
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(service: AEMETService, iterations: int):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await service.get_coastal_weather('6155A')
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def main(iterations: int):
+    stub = StubServer()
+    base_url = await stub.start()
+
+    service = AEMETService()
+    service.api_key = 'benchmark'
+    service.base_url = base_url
+
+    try:
+        fresh = await run(service, iterations)
+        await service.open_session(HTTPClientConfig.from_env())
+        await run(service, 10)  # calentar el pool
+        pooled = await run(service, iterations)
+    finally:
+        await service.close_session()
+        await stub.stop()
+
+    print(f"{'modo':<10}{'p50 ms':>10}{'p99 ms':>10}{'media ms':>10}")
+    for name, samples in (('fresh', fresh), ('pooled', pooled)):
+        print(f"{name:<10}{percentile(samples, 50):>10.3f}{percentile(samples, 99):>10.3f}"
+              f"{statistics.mean(samples):>10.3f}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
@@ -0,0 +1,68 @@
+"""
+Ingesta de boletines costeros y boyas a partir de los ficheros grabados
+
+Procesa data/marine_samples (boletines costera_<costa>.json de AEMET y
+boyas.csv), muestra las condiciones resultantes por zona y mide el coste de la
+ingesta, de una consulta por playa (acceso a la tabla) frente a la simulación
+anterior, y de una segunda pasada con los mismos boletines (no se re-analizan).
+
+Uso (desde backend/):
+    python -m benchmarks.bench_marine [consultas]
+"""
+
+import asyncio
+import sys
+import time
+
+from services.beach_repository import BeachRepository
+from services.marine import MarineConditionsTable, MarineIngestor
+from services.weather_service import WeatherServiceManager
+
+
+async def main(lookups: int):
+    repository = BeachRepository.load()
+    beaches = repository.all()
+    manager = WeatherServiceManager()
+    table = MarineConditionsTable.load(beaches)
+    ingestor = MarineIngestor(table, manager.aemet, manager.marine, source='files')
+
+    start = time.perf_counter()
+    await ingestor.run_once()
+    first = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    await ingestor.run_once()
+    second = (time.perf_counter() - start) * 1000
+
+    print(f"{'zona':<40}{'olas m':>7}{'dir':>5}{'viento':>8}  texto")
+    for zone_id, zone in sorted(table.zones.items()):
+        conditions = table._zone_conditions.get(zone_id, {})
+        wind = f"F{conditions['wind_force']} {conditions['wind_direction']}" if 'wind_force' in conditions else '-'
+        print(f"{zone.name:<40}{conditions.get('wave_height', '-'):>7}{conditions.get('wave_direction', '-'):>5}"
+              f"{wind:>8}  {conditions.get('forecast', '')[:60]}")
+
+    print(f"\n{'playa':<34}{'zona':>6}{'boya':>6}{'agua °C':>9}{'olas m':>8}{'periodo':>9}")
+    for beach in beaches[:12]:
+        conditions = table.lookup(beach.lat, beach.lng) or {}
+        print(f"{beach.name[:33]:<34}{conditions.get('zone', '-'):>6}{conditions.get('buoy', '-'):>6}"
+              f"{conditions.get('water_temperature', '-'):>9}{conditions.get('wave_height', '-'):>8}"
+              f"{conditions.get('wave_period', '-'):>9}")
+
+    stats = table.stats()
+    print(f"\nIngesta: {first:.1f} ms (boletines analizados {ingestor.parsed}), "
+          f"segunda pasada {second:.1f} ms (sin cambios {ingestor.unchanged}); "
+          f"{stats['points_covered']}/{stats['points']} playas cubiertas")
+
+    points = [(beach.lat, beach.lng) for beach in beaches]
+    start = time.perf_counter()
+    for i in range(lookups):
+        table.lookup(*points[i % len(points)])
+    lookup_ns = (time.perf_counter() - start) / lookups * 1e9
+    start = time.perf_counter()
+    for i in range(lookups):
+        manager.marine._simulate_sea_conditions(*points[i % len(points)])
+    simulated_ns = (time.perf_counter() - start) / lookups * 1e9
+    print(f"Consulta por playa: tabla {lookup_ns:.0f} ns, simulación {simulated_ns:.0f} ns")
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000))
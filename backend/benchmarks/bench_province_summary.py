@@ -0,0 +1,84 @@
+"""
+Tiempo del resumen de provincia agregado sobre sus playas
+
+Mide `summarize_beaches` sobre N playas sintéticas y el camino completo del
+endpoint con la caché caliente (tabla por estación + agregado), contra el stub
+de AEMET. El objetivo es una mediana < 5 ms para 150 playas.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_province_summary [n_playas]
+"""
+
+import asyncio
+import random
+import statistics
+import sys
+import time
+
+from benchmarks.stub_server import StubServer
+from services.beach_repository import Beach
+from services.stations import StationInventory
+from services.summary import summarize_beaches
+from services.weather_service import WeatherServiceManager
+
+RUNS = 500
+TARGET_MS = 5.0
+
+
+def synthetic_beaches(n: int, inventory: StationInventory, rng: random.Random):
+    beaches = []
+    for i in range(n):
+        lat, lng = rng.uniform(36.0, 43.5), rng.uniform(-9.0, 3.0)
+        beach = Beach({
+            'id': i + 1, 'name': f'Playa {i + 1}', 'province': 'Sintética', 'municipality': 'Sintético',
+            'coordinates': {'lat': lat, 'lng': lng}
+        }, province_id=1)
+        beach.stations = tuple(station.id for _, station in inventory.nearest(lat, lng, 3))
+        beach.aemet_station = beach.stations[0]
+        beaches.append(beach)
+    return beaches
+
+
+def report(label: str, samples):
+    samples = sorted(samples)
+    p50 = statistics.median(samples)
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    verdict = 'OK' if p50 < TARGET_MS else 'SUPERA OBJETIVO'
+    print(f"{label:<34}p50 {p50:>7.3f} ms   p99 {p99:>7.3f} ms   {verdict}")
+
+
+async def main(n: int):
+    rng = random.Random(42)
+    beaches = synthetic_beaches(n, StationInventory.load(), rng)
+
+    stub = StubServer()
+    base_url = await stub.start()
+    manager = WeatherServiceManager()
+    manager.aemet.api_key = 'benchmark'
+    manager.aemet.base_url = base_url
+    await manager.startup()
+    try:
+        # Calentar la caché (una llamada por estación)
+        table = await manager.get_station_weather_table(beaches)
+        print(f"{n} playas, {len(manager.group_by_station(beaches))} estaciones, {stub.requests} peticiones upstream")
+
+        samples = []
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            summarize_beaches(table)
+            samples.append((time.perf_counter() - start) * 1000)
+        report('summarize_beaches', samples)
+
+        samples = []
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            summarize_beaches(await manager.get_station_weather_table(beaches))
+            samples.append((time.perf_counter() - start) * 1000)
+        report('tabla + resumen (caché caliente)', samples)
+    finally:
+        await manager.shutdown()
+        await stub.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 150))
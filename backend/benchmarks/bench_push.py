@@ -0,0 +1,176 @@
+"""
+Prueba de carga del canal SSE: N suscriptores inactivos en un solo worker
+
+Arranca la API en un subproceso (uvicorn, un worker) con AEMET apuntando al
+stub con temperaturas cambiantes y el pre-calentamiento cada pocos segundos,
+abre N conexiones a /api/stream/weather repartidas entre las playas del
+catálogo y mide memoria del servidor por suscriptor y el reparto de los
+cambios (cuántos clientes reciben deltas y cuánto tarda el hub en repartir
+una tanda).
+
+Uso (desde backend/):
+    python -m benchmarks.bench_push [n_suscriptores]
+"""
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+CHANGE_INTERVAL = 5
+CONNECT_BATCH = 500
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def rss_mb(pid: int) -> float:
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+async def serve(port: int, max_subscribers: int):
+    os.environ.update({
+        'HISTORY_ENABLED': 'false',
+        'PUSH_MAX_SUBSCRIBERS': str(max_subscribers),
+        'WEATHER_PREWARM_ENABLED': 'true',
+        'WEATHER_PREWARM_INTERVAL': str(CHANGE_INTERVAL),
+        'WEATHER_PREWARM_JITTER': '0',
+        'WEATHER_PREWARM_RPM_AEMET': '100000',
+        'WEATHER_CACHE_TTL_AEMET': str(CHANGE_INTERVAL),
+    })
+    import uvicorn
+    import main
+    from benchmarks.stub_server import StubServer
+
+    stub = StubServer(drift=True)
+    main.weather_manager.aemet.base_url = await stub.start()
+    main.weather_manager.aemet.api_key = 'benchmark'
+    server = uvicorn.Server(uvicorn.Config(main.app, host='127.0.0.1', port=port, log_level='warning', backlog=4096))
+    try:
+        await server.serve()
+    finally:
+        await stub.stop()
+
+
+class Client:
+    __slots__ = ('snapshot_at', 'delta_at', 'deltas', 'failed')
+
+    def __init__(self):
+        self.snapshot_at = None
+        self.delta_at = None
+        self.deltas = 0
+        self.failed = False
+
+
+async def listen(session: aiohttp.ClientSession, url: str, client: Client, connected: asyncio.Semaphore):
+    try:
+        async with session.get(url) as response:
+            event = None
+            async for line in response.content:
+                if line.startswith(b'event: '):
+                    event = line[7:].strip()
+                elif line.startswith(b'data: '):
+                    if event == b'snapshot' and client.snapshot_at is None:
+                        client.snapshot_at = time.perf_counter()
+                        connected.release()
+                    elif event == b'delta':
+                        client.deltas += 1
+                        if client.delta_at is None:
+                            client.delta_at = time.perf_counter()
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        client.failed = True
+    finally:
+        if client.snapshot_at is None:
+            # Cuenta como intento terminado para no bloquear el reparto por lotes
+            client.snapshot_at = time.perf_counter()
+            client.failed = True
+            connected.release()
+
+
+async def wait_until_up(base_url: str):
+    async with aiohttp.ClientSession() as session:
+        for _ in range(200):
+            try:
+                async with session.get(base_url + '/') as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError('El servidor no arrancó')
+
+
+async def main(n: int):
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    server = subprocess.Popen([sys.executable, '-m', 'benchmarks.bench_push', 'serve', str(port), str(n)])
+    try:
+        await wait_until_up(base_url)
+        async with aiohttp.ClientSession() as session:
+            async with session.get(base_url + '/api/provinces') as response:
+                provinces = [p['id'] for p in (await response.json())['provinces']]
+            beach_ids = []
+            for province_id in provinces:
+                async with session.get(f'{base_url}/api/beaches/{province_id}') as response:
+                    beach_ids.extend(b['id'] for b in (await response.json())['beaches'])
+
+        baseline = rss_mb(server.pid)
+        connector = aiohttp.TCPConnector(limit=0)
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=30)
+        clients = [Client() for _ in range(n)]
+        connected = asyncio.Semaphore(0)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            start = time.perf_counter()
+            tasks = []
+            for i, client in enumerate(clients):
+                url = f'{base_url}/api/stream/weather?beaches={beach_ids[i % len(beach_ids)]}'
+                tasks.append(asyncio.create_task(listen(session, url, client, connected)))
+                if (i + 1) % CONNECT_BATCH == 0:
+                    for _ in range(CONNECT_BATCH):
+                        await connected.acquire()
+            for _ in range(n % CONNECT_BATCH):
+                await connected.acquire()
+            connect_time = time.perf_counter() - start
+
+            subscribed = rss_mb(server.pid)
+            async with session.get(base_url + '/api/system/status') as response:
+                push = (await response.json())['push']
+            failed = sum(1 for c in clients if c.failed)
+            print(f"{n - failed} suscriptores conectados en {connect_time:.1f} s "
+                  f"({push['subscribers']} en el hub, {failed} fallidos)")
+            print(f"RSS servidor: {baseline:.0f} MB -> {subscribed:.0f} MB "
+                  f"({(subscribed - baseline) * 1024 / n:.1f} KB por suscriptor)")
+
+            # Esperar al menos un ciclo de cambios del pre-calentamiento
+            await asyncio.sleep(CHANGE_INTERVAL * 3)
+            async with session.get(base_url + '/api/system/status') as response:
+                push = (await response.json())['push']
+            received = sum(1 for c in clients if c.delta_at is not None)
+            print(f"Deltas: {received}/{n} clientes, {sum(c.deltas for c in clients)} eventos recibidos; "
+                  f"hub: {push['publishes']} tandas, {push['events_sent']} enviados, "
+                  f"{push['disconnected']} desconectados por lentos, última tanda {push['last_publish_ms']} ms")
+
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        asyncio.run(serve(int(sys.argv[2]), int(sys.argv[3])))
+    else:
+        asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000))
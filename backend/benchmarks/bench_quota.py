@@ -0,0 +1,110 @@
+"""
+Pico de tráfico contra un cupo de AEMET, con y sin limitador por prioridades
+
+El stub de AEMET responde 429 por encima de LIMIT peticiones en WINDOW
+segundos (como el cupo por clave). Durante DURATION segundos se mezclan
+pre-calentamiento continuo, lotes de provincia cada segundo y peticiones de
+usuario cada USER_INTERVAL segundos, con la caché vacía. Sin limitador el pico agota la clave,
+se abre el circuito y todo acaba en datos de respaldo; con él, lotes y
+pre-calentamiento ceden cupo y las peticiones de usuario siguen llegando a AEMET.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_quota [segundos]
+"""
+
+import asyncio
+import random
+import statistics
+import sys
+import time
+
+from benchmarks.bench_province_summary import synthetic_beaches
+from benchmarks.stub_server import StubServer
+from services.rate_limit import BATCH, PREWARM, QuotaConfig, QuotaExceeded, TokenBucket, request_priority
+from services.stations import StationInventory
+from services.weather_service import WeatherServiceManager
+
+LIMIT = 40
+WINDOW = 20.0
+USER_INTERVAL = 2.0
+
+
+async def run(base_url: str, beaches, duration: float, limited: bool):
+    manager = WeatherServiceManager()
+    manager.aemet.api_key = 'benchmark'
+    manager.aemet.base_url = base_url
+    if limited:
+        # Ráfaga + reposición de una ventana no superan el cupo del proveedor
+        manager.quotas['aemet'] = TokenBucket('aemet', QuotaConfig(per_minute=LIMIT * 0.75 * 60 / WINDOW, burst=LIMIT * 0.25))
+        manager.aemet.quota = manager.quotas['aemet']
+    else:
+        manager.aemet.quota = None
+    await manager.startup()
+
+    rng = random.Random(1)
+    deadline = time.monotonic() + duration
+    interactive = []
+    batch = []
+
+    async def prewarm():
+        with request_priority(PREWARM):
+            groups = manager.group_by_station(beaches)
+            while time.monotonic() < deadline:
+                for group in groups:
+                    if time.monotonic() >= deadline:
+                        return
+                    manager.cache.clear()
+                    try:
+                        await manager.refresh('aemet', group.lat, group.lon, group.station, group.fallback_stations)
+                    except QuotaExceeded:
+                        pass
+                    await asyncio.sleep(0.05)
+
+    async def batches():
+        with request_priority(BATCH):
+            while time.monotonic() < deadline:
+                manager.cache.clear()
+                table = await manager.get_station_weather_table(beaches, concurrency=10, timeout=5)
+                batch.append(sum(1 for data in table.values() if data['source'] == 'AEMET') / len(beaches))
+                await asyncio.sleep(1.0)
+
+    async def users():
+        while time.monotonic() < deadline:
+            beach = rng.choice(beaches)
+            manager.cache.clear()
+            start = time.perf_counter()
+            data = await manager.get_complete_weather_data(beach.lat, beach.lng, beach.aemet_station)
+            interactive.append(((time.perf_counter() - start) * 1000, data['source'] == 'AEMET'))
+            await asyncio.sleep(USER_INTERVAL)
+
+    try:
+        await asyncio.gather(prewarm(), batches(), users())
+    finally:
+        await manager.shutdown()
+
+    served = sum(1 for _, ok in interactive if ok)
+    print(f"\n{'con' if limited else 'sin'} limitador:")
+    p50 = statistics.median(ms for ms, _ in interactive)
+    print(f"    usuario: {served}/{len(interactive)} con datos AEMET, p50 {p50:.0f} ms")
+    print(f"    lotes: {statistics.mean(batch):.0%} de playas con datos AEMET ({len(batch)} lotes)")
+    print(f"    circuito AEMET: {manager.breakers['aemet'].state}")
+    if limited:
+        stats = manager.quotas['aemet'].stats()
+        print(f"    cupo: concedidas {stats['granted']}, descartadas {stats['shed']}")
+
+
+async def main(duration: float):
+    beaches = synthetic_beaches(150, StationInventory.load(), random.Random(42))
+    for limited in (False, True):
+        stub = StubServer()
+        stub.limits = {'aemet': (LIMIT, WINDOW)}
+        base_url = await stub.start()
+        try:
+            await run(base_url, beaches, duration, limited)
+            print(f"    respuestas 429 del proveedor: {stub.throttled}")
+        finally:
+            await stub.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(float(sys.argv[1]) if len(sys.argv) > 1 else 20))
@@ -0,0 +1,76 @@
+"""
+Tiempo de serialización por endpoint
+
+Compara, con payloads del tamaño real de cada endpoint, el camino por defecto de
+FastAPI (`jsonable_encoder` + `JSONResponse`), el mismo con validación contra el
+response_model, orjson directo (`render_json`) y orjson + gzip.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_serialization [repeticiones]
+"""
+
+import gzip
+import sys
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from services.beach_repository import BeachRepository
+from services.schemas import BatchWeather, ProvinceBeachesWeather, ProvinceWeatherSummary
+from services.summary import summarize_beaches
+from services.weather_service import WeatherServiceManager
+
+
+def payloads():
+    repository = BeachRepository.load()
+    manager = WeatherServiceManager()
+    weather = manager._get_fallback_data({'water_temperature': 21.4, 'wave_height': 0.9})
+    beaches = repository.all()
+    # 200 playas (límite del batch) repitiendo el catálogo
+    batch = [
+        dict(weather, beach_id=beaches[i % len(beaches)].id,
+             coordinates={'lat': beaches[i % len(beaches)].lat, 'lng': beaches[i % len(beaches)].lng})
+        for i in range(200)
+    ]
+    province = batch[:40]
+    summary = summarize_beaches({item['beach_id'] + i * 1000: item for i, item in enumerate(province)})
+    summary.update(province_id=1, province_name='Andalucía', beaches=len(province), timestamp=weather['timestamp'])
+
+    return [
+        ('/api/provinces', {'provinces': [p.to_dict() for p in repository.provinces()]}, None),
+        ('/api/beaches/{id} (catálogo)', {'beaches': [b.to_dict() for b in beaches], 'province_id': 1}, None),
+        ('/api/beaches/batch/weather', {'beaches': batch, 'total': len(batch)}, BatchWeather),
+        ('/api/province/{id}/beaches/weather',
+         {'province_id': 1, 'beaches': province, 'total': len(province), 'stations': 8}, ProvinceBeachesWeather),
+        ('/api/province/{id}/weather', summary, ProvinceWeatherSummary),
+    ]
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main(repeat: int):
+    print(f"{'endpoint':<36}{'bytes':>8}{'gzip':>8}{'default µs':>12}{'+modelo µs':>12}{'orjson µs':>11}{'+gzip µs':>10}")
+    for name, payload, model in payloads():
+        body = ORJSONResponse(payload).body
+        compressed = gzip.compress(body, compresslevel=9)
+
+        default = timed(lambda: JSONResponse(jsonable_encoder(payload)).body, repeat)
+        validated = (
+            timed(lambda: JSONResponse(jsonable_encoder(model.model_validate(payload).model_dump(mode='json'))).body, repeat)
+            if model else None
+        )
+        fast = timed(lambda: ORJSONResponse(payload).body, repeat)
+        fast_gzip = timed(lambda: gzip.compress(ORJSONResponse(payload).body, compresslevel=9), repeat)
+
+        validated_text = f"{validated:>12.1f}" if validated is not None else f"{'-':>12}"
+        print(f"{name:<36}{len(body):>8}{len(compressed):>8}{default:>12.1f}{validated_text}{fast:>11.1f}{fast_gzip:>10.1f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
@@ -0,0 +1,62 @@
+"""
+Tiempo por consulta del índice espacial con playas sintéticas
+
+Compara nearest/radius/bbox del GridIndex con un recorrido lineal.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_spatial [n_playas]
+"""
+
+import random
+import sys
+import time
+
+from services.spatial import GridIndex, haversine_km
+
+# Península, Baleares y Canarias
+REGIONS = [((36.0, 43.8), (-9.3, 3.3)), ((38.6, 40.1), (1.2, 4.4)), ((27.6, 29.4), (-18.2, -13.4))]
+QUERIES = 2000
+
+
+def synthetic_points(n: int, rng: random.Random):
+    points = []
+    for i in range(n):
+        (lat0, lat1), (lng0, lng1) = REGIONS[i % len(REGIONS)]
+        points.append((i, rng.uniform(lat0, lat1), rng.uniform(lng0, lng1)))
+    return points
+
+
+def timed(label: str, fn, queries):
+    start = time.perf_counter()
+    for query in queries:
+        fn(*query)
+    elapsed_us = (time.perf_counter() - start) / len(queries) * 1e6
+    print(f"{label:<22}{elapsed_us:>12.1f} µs/consulta")
+
+
+def main(n: int):
+    rng = random.Random(42)
+    points = synthetic_points(n, rng)
+
+    start = time.perf_counter()
+    index = GridIndex.build(points, cell_deg=0.25)
+    print(f"{n} playas, índice construido en {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    centers = [(lat, lng) for _, lat, lng in synthetic_points(QUERIES, rng)]
+
+    def linear_nearest(lat, lng, k):
+        return sorted((haversine_km(lat, lng, plat, plng), item) for item, plat, plng in points)[:k]
+
+    # Comprobación de exactitud frente al recorrido lineal
+    for lat, lng in centers[:50]:
+        assert [item for _, item in index.nearest(lat, lng, 5)] == [item for _, item in linear_nearest(lat, lng, 5)]
+
+    timed('nearest k=5', index.nearest, [(lat, lng, 5) for lat, lng in centers])
+    timed('nearest k=20', index.nearest, [(lat, lng, 20) for lat, lng in centers])
+    timed('radius 10 km', index.within, [(lat, lng, 10) for lat, lng in centers])
+    timed('bbox 0.2°', index.bbox, [(lat - 0.1, lng - 0.1, lat + 0.1, lng + 0.1) for lat, lng in centers])
+    timed('lineal nearest k=5', linear_nearest, [(lat, lng, 5) for lat, lng in centers[:100]])
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,176 @@
+"""
+Servidor HTTP local que imita AEMET y OpenWeatherMap para benchmarks
+
+Permite inyectar fallos por proveedor en caliente (`faults`): 'error' (HTTP 500),
+'hang' (no responde durante `hang_seconds`), 'reset' (cierra la conexión) o
+'tail' (una fracción `tail_rate` de las respuestas tarda `tail_seconds` más).
+Con `limits` imita el cupo por clave: más de N peticiones en la ventana → HTTP 429.
+Las predicciones municipales se sirven desde data/forecast_samples, los boletines
+costeros desde data/marine_samples y el boletín de avisos CAP (fichero tar, como
+AEMET) desde data/cap_samples.
+"""
+
+import asyncio
+import io
+import json
+import os
+import random
+import tarfile
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from aiohttp import web
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+FORECAST_SAMPLES_DIR = os.path.join(DATA_DIR, 'forecast_samples')
+CAP_SAMPLES_DIR = os.path.join(DATA_DIR, 'cap_samples')
+MARINE_SAMPLES_DIR = os.path.join(DATA_DIR, 'marine_samples')
+OBSERVATION = [{
+    'fint': '2025-07-29T10:00:00', 'ta': 24.3, 'hr': 61, 'vv': 4.2, 'dv': 'SW', 'vis': 20.0, 'prec': '', 'pres': 1014.2
+}]
+
+OPENWEATHER = {
+    'main': {'temp': 25.1, 'humidity': 58, 'pressure': 1015},
+    'wind': {'speed': 3.9, 'deg': 225},
+    'weather': [{'description': 'cielo claro'}],
+    'visibility': 10000
+}
+
+
+class StubServer:
+    """
+    Stub de AEMET (con el salto a 'datos') y OpenWeatherMap en 127.0.0.1
+    """
+
+    def __init__(self, delay: float = 0.0, missing_stations=(), drift: bool = False):
+        self.delay = delay
+        self.missing_stations = set(missing_stations)
+        # Con drift la temperatura cambia en cada lectura (pruebas de push)
+        self.drift = drift
+        self.faults: Dict[str, str] = {}
+        self.hang_seconds = 30.0
+        self.tail_rate = 0.1
+        self.tail_seconds = 1.0
+        self._random = random.Random(0)
+        # Cupo por proveedor: {proveedor: (peticiones, ventana en segundos)}
+        self.limits: Dict[str, Tuple[int, float]] = {}
+        self.throttled = 0
+        self._calls: Dict[str, Deque[float]] = {}
+        self.requests = 0
+        # Peticiones recibidas por proveedor ('aemet', 'openweather', ...)
+        self.provider_requests: Dict[str, int] = {}
+        self.base_url: Optional[str] = None
+        self._runner: Optional[web.AppRunner] = None
+
+    async def _pause(self, provider: str, request: web.Request):
+        self.requests += 1
+        self.provider_requests[provider] = self.provider_requests.get(provider, 0) + 1
+        if provider in self.limits:
+            self._check_limit(provider)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        fault = self.faults.get(provider)
+        if fault == 'error':
+            raise web.HTTPInternalServerError()
+        if fault == 'hang':
+            await asyncio.sleep(self.hang_seconds)
+        if fault == 'tail' and self._random.random() < self.tail_rate:
+            await asyncio.sleep(self.tail_seconds)
+        if fault == 'reset':
+            request.transport.close()
+            raise web.HTTPInternalServerError()
+
+    def _check_limit(self, provider: str):
+        limit, window = self.limits[provider]
+        calls = self._calls.setdefault(provider, deque())
+        now = time.monotonic()
+        while calls and now - calls[0] > window:
+            calls.popleft()
+        if len(calls) >= limit:
+            self.throttled += 1
+            raise web.HTTPTooManyRequests()
+        calls.append(now)
+
+    async def _aemet_station(self, request: web.Request) -> web.Response:
+        await self._pause('aemet', request)
+        station = request.match_info['station']
+        if station in self.missing_stations:
+            return web.json_response({'descripcion': 'No hay datos que satisfagan esos criterios', 'estado': 404})
+        return web.json_response({'datos': f"{self.base_url}/datos/{station}"})
+
+    async def _aemet_datos(self, request: web.Request) -> web.Response:
+        await self._pause('aemet', request)
+        if self.drift:
+            return web.json_response([dict(OBSERVATION[0], ta=round(20 + self.requests % 100 * 0.1, 1))])
+        return web.json_response(OBSERVATION)
+
+    async def _aemet_forecast(self, request: web.Request) -> web.Response:
+        await self._pause('aemet', request)
+        kind, code = request.match_info['kind'], request.match_info['code']
+        if not os.path.exists(os.path.join(FORECAST_SAMPLES_DIR, f'{kind}_{code}.json')):
+            return web.json_response({'descripcion': 'No hay datos que satisfagan esos criterios', 'estado': 404})
+        return web.json_response({'datos': f"{self.base_url}/datos/prediccion/{kind}/{code}"})
+
+    async def _forecast_datos(self, request: web.Request) -> web.Response:
+        await self._pause('aemet', request)
+        kind, code = request.match_info['kind'], request.match_info['code']
+        with open(os.path.join(FORECAST_SAMPLES_DIR, f'{kind}_{code}.json'), encoding='utf-8') as f:
+            return web.json_response(json.load(f))
+
+    async def _aemet_coastal(self, request: web.Request) -> web.Response:
+        await self._pause('aemet', request)
+        coast = request.match_info['coast']
+        if not os.path.exists(os.path.join(MARINE_SAMPLES_DIR, f'costera_{coast}.json')):
+            return web.json_response({'descripcion': 'No hay datos que satisfagan esos criterios', 'estado': 404})
+        return web.json_response({'datos': f"{self.base_url}/datos/costera/{coast}"})
+
+    async def _coastal_datos(self, request: web.Request) -> web.Response:
+        await self._pause('aemet', request)
+        with open(os.path.join(MARINE_SAMPLES_DIR, f"costera_{request.match_info['coast']}.json"), encoding='utf-8') as f:
+            return web.json_response(json.load(f))
+
+    async def _aemet_alerts(self, request: web.Request) -> web.Response:
+        await self._pause('aemet', request)
+        return web.json_response({'datos': f"{self.base_url}/datos/avisos/{request.match_info['area']}"})
+
+    async def _alerts_datos(self, request: web.Request) -> web.Response:
+        await self._pause('aemet', request)
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w') as archive:
+            for name in sorted(os.listdir(CAP_SAMPLES_DIR)):
+                archive.add(os.path.join(CAP_SAMPLES_DIR, name), arcname=name)
+        return web.Response(body=buffer.getvalue(), content_type='application/x-tar')
+
+    async def _openweather(self, request: web.Request) -> web.Response:
+        await self._pause('openweather', request)
+        return web.json_response(OPENWEATHER)
+
+    async def _uvi(self, request: web.Request) -> web.Response:
+        # Un fallo en 'uvi' afecta solo al índice UV; sin él se aplica el de OpenWeatherMap
+        await self._pause('uvi' if 'uvi' in self.faults else 'openweather', request)
+        return web.json_response({'value': 7.2})
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_get('/observacion/convencional/datos/estacion/{station}', self._aemet_station)
+        app.router.add_get('/datos/{station}', self._aemet_datos)
+        app.router.add_get('/prediccion/especifica/municipio/{kind}/{code}', self._aemet_forecast)
+        app.router.add_get('/datos/prediccion/{kind}/{code}', self._forecast_datos)
+        app.router.add_get('/prediccion/maritima/costera/costa/{coast}', self._aemet_coastal)
+        app.router.add_get('/datos/costera/{coast}', self._coastal_datos)
+        app.router.add_get('/avisos_cap/ultimoelaborado/area/{area}', self._aemet_alerts)
+        app.router.add_get('/datos/avisos/{area}', self._alerts_datos)
+        app.router.add_get('/weather', self._openweather)
+        app.router.add_get('/uvi', self._uvi)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self.base_url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
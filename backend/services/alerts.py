@@ -0,0 +1,483 @@
+"""
+Weather warnings for Beach Monitor Spain
+AEMET CAP warnings parsed once per bulletin, with a precomputed beach → alerts
+and province → alerts index for constant-time reads
+"""
+
+import asyncio
+import hashlib
+import io
+import os
+import tarfile
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+import numpy as np
+
+from services.geometry import MembershipBitmap, PointSet
+from services.rate_limit import BATCH, QuotaExceeded, request_priority
+from services.resilience import ProviderUnavailable
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+DEFAULT_SAMPLES_DIR = os.path.join(DATA_DIR, 'cap_samples')
+
+CAP = '{urn:oasis:names:tc:emergency:cap:1.2}'
+
+LEVELS = {'amarillo': 'yellow', 'naranja': 'orange', 'rojo': 'red'}
+# Fenómeno de Meteoalerta → tipo de alerta de la API
+TYPES = {
+    'CO': 'waves', 'RO': 'waves', 'VI': 'wind', 'GL': 'wind', 'TO': 'storm', 'PR': 'rain', 'NE': 'snow',
+    'TA': 'heat', 'TI': 'cold', 'NI': 'fog', 'PO': 'dust', 'AL': 'avalanche',
+}
+
+# Provincias por código INE (dígitos 3 y 4 de la zona de Meteoalerta)
+PROVINCES = {
+    '01': 'Álava', '02': 'Albacete', '03': 'Alicante', '04': 'Almería', '05': 'Ávila', '06': 'Badajoz',
+    '07': 'Illes Balears', '08': 'Barcelona', '09': 'Burgos', '10': 'Cáceres', '11': 'Cádiz', '12': 'Castellón',
+    '13': 'Ciudad Real', '14': 'Córdoba', '15': 'A Coruña', '16': 'Cuenca', '17': 'Girona', '18': 'Granada',
+    '19': 'Guadalajara', '20': 'Gipuzkoa', '21': 'Huelva', '22': 'Huesca', '23': 'Jaén', '24': 'León',
+    '25': 'Lleida', '26': 'La Rioja', '27': 'Lugo', '28': 'Madrid', '29': 'Málaga', '30': 'Murcia',
+    '31': 'Navarra', '32': 'Ourense', '33': 'Asturias', '34': 'Palencia', '35': 'Las Palmas', '36': 'Pontevedra',
+    '37': 'Salamanca', '38': 'Santa Cruz de Tenerife', '39': 'Cantabria', '40': 'Segovia', '41': 'Sevilla',
+    '42': 'Soria', '43': 'Tarragona', '44': 'Teruel', '45': 'Toledo', '46': 'Valencia', '47': 'Valladolid',
+    '48': 'Bizkaia', '49': 'Zamora', '50': 'Zaragoza', '51': 'Ceuta', '52': 'Melilla',
+}
+
+
+def _parse_polygon(text: str) -> List[Tuple[float, float]]:
+    # CAP: pares 'lat,lon' separados por espacios
+    ring = []
+    for pair in text.split():
+        lat, lon = pair.split(',')
+        ring.append((float(lat), float(lon)))
+    return ring
+
+
+def _time(text: Optional[str]) -> Optional[datetime]:
+    if not text:
+        return None
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return None
+
+
+class AlertArea:
+    """
+    Zona de un aviso: código de Meteoalerta y polígonos
+    """
+
+    __slots__ = ('name', 'zone', 'polygons')
+
+    def __init__(self, name: str, zone: Optional[str], polygons: List[List[Tuple[float, float]]]):
+        self.name = name
+        self.zone = zone
+        self.polygons = [ring for ring in polygons if len(ring) >= 3]
+
+    @property
+    def province_code(self) -> Optional[str]:
+        return self.zone[2:4] if self.zone and len(self.zone) >= 4 else None
+
+
+class WeatherAlert:
+    """
+    Aviso CAP de AEMET (bloque <info> en castellano)
+    """
+
+    __slots__ = ('id', 'msg_type', 'references', 'sent', 'type', 'level', 'event', 'title', 'description',
+                 'onset', 'expires', 'areas')
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def provinces(self) -> List[str]:
+        codes = {area.province_code for area in self.areas}
+        return sorted(PROVINCES[code] for code in codes if code in PROVINCES)
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'type': self.type,
+            'level': self.level,
+            'title': self.title,
+            'description': self.description,
+            'provinces': self.provinces(),
+            'areas': [area.name for area in self.areas],
+            'start_time': self.onset.isoformat() if self.onset else None,
+            'end_time': self.expires.isoformat() if self.expires else None,
+            'source': 'AEMET'
+        }
+
+
+def parse_cap(text) -> Optional[WeatherAlert]:
+    """
+    Analiza un mensaje CAP 1.2 de AEMET (None si no tiene bloque <info>)
+    """
+    root = ET.fromstring(text)
+    infos = root.findall(f'{CAP}info')
+    if not infos:
+        return None
+    info = next((item for item in infos if (item.findtext(f'{CAP}language') or '').startswith('es')), infos[0])
+
+    parameters = {
+        item.findtext(f'{CAP}valueName'): item.findtext(f'{CAP}value') or ''
+        for item in info.findall(f'{CAP}parameter')
+    }
+    phenomenon = (info.findtext(f'{CAP}eventCode/{CAP}value') or '').split(';')[0]
+    areas = []
+    for area in info.findall(f'{CAP}area'):
+        zone = None
+        for geocode in area.findall(f'{CAP}geocode'):
+            if 'zona' in (geocode.findtext(f'{CAP}valueName') or ''):
+                zone = geocode.findtext(f'{CAP}value')
+        polygons = [_parse_polygon(polygon.text) for polygon in area.findall(f'{CAP}polygon') if polygon.text]
+        areas.append(AlertArea(area.findtext(f'{CAP}areaDesc') or '', zone, polygons))
+
+    # <references>: 'emisor,identificador,fecha' separados por espacios
+    references = [item.split(',')[1] for item in (root.findtext(f'{CAP}references') or '').split() if item.count(',') >= 2]
+    level = parameters.get('AEMET-Meteoalerta nivel', '').lower()
+    return WeatherAlert(
+        id=root.findtext(f'{CAP}identifier'),
+        msg_type=root.findtext(f'{CAP}msgType'),
+        references=references,
+        sent=_time(root.findtext(f'{CAP}sent')),
+        type=TYPES.get(phenomenon, 'other'),
+        level=LEVELS.get(level, level or None),
+        event=info.findtext(f'{CAP}event'),
+        title=info.findtext(f'{CAP}headline') or info.findtext(f'{CAP}event'),
+        description=info.findtext(f'{CAP}description') or '',
+        onset=_time(info.findtext(f'{CAP}onset') or info.findtext(f'{CAP}effective')),
+        expires=_time(info.findtext(f'{CAP}expires')),
+        areas=areas
+    )
+
+
+def active_alerts(alerts: Iterable[WeatherAlert], now: datetime) -> List[WeatherAlert]:
+    """
+    Avisos vigentes en `now`: con nivel de riesgo, sin cancelar y sin caducar
+    """
+    alerts = list(alerts)
+    cancelled = {reference for alert in alerts if alert.msg_type == 'Cancel' for reference in alert.references}
+    active = [
+        alert for alert in alerts
+        if alert.msg_type != 'Cancel' and alert.id not in cancelled and alert.level in LEVELS.values()
+        and (alert.expires is None or alert.expires > now)
+    ]
+    return sorted(active, key=lambda alert: (alert.onset or now, alert.id))
+
+
+def alert_membership(alerts: List[WeatherAlert], beaches: List, points: Optional[PointSet] = None) -> MembershipBitmap:
+    """
+    Bitmap aviso × playa de un boletín: una pasada vectorizada por aviso sobre todas las playas
+
+    Las zonas con polígono se cruzan por punto en polígono; las que no lo tienen
+    se asignan por provincia (prefijo INE del código de municipio de la playa).
+    """
+    if points is None:
+        points = PointSet((beach.lat for beach in beaches), (beach.lng for beach in beaches))
+    provinces = np.array([(beach.municipality_code or '')[:2] for beach in beaches])
+    masks = []
+    for alert in alerts:
+        mask = points.contained(ring for area in alert.areas for ring in area.polygons)
+        for area in alert.areas:
+            if not area.polygons and area.province_code:
+                mask |= provinces == area.province_code
+        masks.append(mask)
+    return MembershipBitmap.from_masks(masks, len(beaches))
+
+
+class AlertIndex:
+    """
+    Índice playa → avisos y provincia → avisos de un boletín
+
+    La geometría no se repite aquí: la pertenencia de cada playa a cada aviso
+    llega en el bitmap calculado una vez por boletín (`alert_membership`). El
+    índice se construye con cada boletín y cuando caduca el primero de sus
+    avisos; las respuestas quedan ya construidas, así que leer es un acceso a
+    diccionario.
+    """
+
+    def __init__(self, alerts: Iterable[WeatherAlert], beaches: Iterable, now: datetime, version: str = '',
+                 membership: Optional[MembershipBitmap] = None):
+        alerts = list(alerts)
+        beaches = list(beaches)
+        if membership is None:
+            membership = alert_membership(alerts, beaches)
+        self.version = version
+        self.built_at = now
+        self.alerts = active_alerts(alerts, now)
+        expiries = [alert.expires for alert in self.alerts if alert.expires is not None]
+        self.valid_until: Optional[datetime] = min(expiries) if expiries else None
+
+        # Provincia INE (prefijo del código de municipio) → provincias del catálogo
+        catalogue_provinces: Dict[str, set] = {}
+        for beach in beaches:
+            if beach.municipality_code:
+                catalogue_provinces.setdefault(beach.municipality_code[:2], set()).add(beach.province_id)
+
+        rows = {id(alert): row for row, alert in enumerate(alerts)}
+        payloads = [alert.to_dict() for alert in self.alerts]
+        by_beach: Dict[int, List[Dict]] = {}
+        by_province: Dict[int, List[Dict]] = {}
+        for alert, payload in zip(self.alerts, payloads):
+            provinces = set()
+            for area in alert.areas:
+                provinces.update(catalogue_provinces.get(area.province_code, ()))
+            for position in membership.members(rows[id(alert)]):
+                beach = beaches[position]
+                by_beach.setdefault(beach.id, []).append(payload)
+                provinces.add(beach.province_id)
+            for province_id in provinces:
+                by_province.setdefault(province_id, []).append(payload)
+
+        self._all = payloads
+        self._by_beach = by_beach
+        self._by_province = by_province
+
+    def expired(self, now: datetime) -> bool:
+        return self.valid_until is not None and now >= self.valid_until
+
+    def all(self) -> List[Dict]:
+        return self._all
+
+    def for_beach(self, beach_id: int) -> List[Dict]:
+        return self._by_beach.get(beach_id, [])
+
+    def for_province(self, province_id: int) -> List[Dict]:
+        return self._by_province.get(province_id, [])
+
+    def stats(self) -> Dict:
+        return {
+            'active': len(self._all),
+            'beaches_affected': len(self._by_beach),
+            'provinces_affected': len(self._by_province),
+            'valid_until': self.valid_until.isoformat() if self.valid_until else None
+        }
+
+
+class AlertIngestor:
+    """
+    Tarea asyncio que descarga periódicamente el último boletín de avisos CAP de AEMET
+
+    Fuentes (ALERTS_SOURCE): 'aemet' descarga de AEMET OpenData el fichero tar del
+    área ALERTS_AEMET_AREA; 'files' lee los ficheros CAP grabados de
+    ALERTS_SAMPLES_DIR y los evalúa en su hora de emisión; 'none' no hay avisos.
+    Por defecto, 'aemet' si hay clave. El boletín solo se analiza si ha cambiado.
+    Con `manager` la descarga pasa por su circuito de AEMET y su límite de
+    llamadas upstream simultáneas, como las observaciones.
+    """
+
+    def __init__(self, beaches: Iterable, aemet, source: Optional[str] = None, samples_dir: Optional[str] = None,
+                 interval: Optional[float] = None, manager=None):
+        self.beaches = list(beaches)
+        self.aemet = aemet
+        self.manager = manager
+        default_source = 'aemet' if aemet.api_key else 'none'
+        self.source = (source or os.getenv('ALERTS_SOURCE', default_source)).lower()
+        self.samples_dir = samples_dir or os.getenv('ALERTS_SAMPLES_DIR', DEFAULT_SAMPLES_DIR)
+        self.area = os.getenv('ALERTS_AEMET_AREA', 'esp')
+        self.interval = interval if interval is not None else float(os.getenv('ALERTS_REFRESH_INTERVAL', 600))
+        self.points = PointSet((beach.lat for beach in self.beaches), (beach.lng for beach in self.beaches))
+        self.alerts: List[WeatherAlert] = []
+        # Bitmap aviso × playa del boletín vigente: los recálculos por caducidad lo reutilizan
+        self.membership = MembershipBitmap.from_masks([], len(self.beaches))
+        self.issued: Optional[datetime] = None
+        self._digest: Optional[str] = None
+        self._index = AlertIndex((), self.beaches, self.now(), membership=self.membership)
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.bulletins = 0
+        self.unchanged = 0
+        self.rebuilds = 0
+        self.failed = 0
+        self.last_run: Optional[datetime] = None
+        self.last_build: Optional[float] = None
+        self.last_membership: Optional[float] = None
+
+    def now(self) -> datetime:
+        # Los ficheros grabados se evalúan en la hora de su boletín
+        if self.source == 'files' and self.issued is not None:
+            return self.issued
+        return datetime.now(timezone.utc)
+
+    def index(self) -> AlertIndex:
+        """
+        Índice vigente; se recalcula solo si ha caducado algún aviso desde el último cálculo
+        """
+        now = self.now()
+        if self._index.expired(now):
+            self._rebuild(now)
+        return self._index
+
+    def _rebuild(self, now: datetime):
+        started = time.perf_counter()
+        self._index = AlertIndex(self.alerts, self.beaches, now, version=f'{self._digest}-{self.rebuilds}',
+                                 membership=self.membership)
+        self.last_build = time.perf_counter() - started
+        self.rebuilds += 1
+
+    async def start(self):
+        if self.source == 'none':
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                print(f"Error in weather alerts ingestion: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> bool:
+        """
+        Descarga el boletín y, si es nuevo, lo analiza y recalcula el índice
+        """
+        self.runs += 1
+        self.last_run = datetime.now()
+        documents = self._read_files() if self.source == 'files' else await self._download()
+        if documents is None:
+            return False
+        digest = hashlib.sha1(b'\0'.join(sorted(documents))).hexdigest()[:16]
+        if digest == self._digest:
+            self.unchanged += 1
+            return False
+
+        alerts = []
+        for document in documents:
+            try:
+                alert = parse_cap(document)
+            except ET.ParseError as e:
+                print(f"CAP parsing error: {e}")
+                continue
+            if alert is not None:
+                alerts.append(alert)
+        started = time.perf_counter()
+        self.membership = alert_membership(alerts, self.beaches, self.points)
+        self.last_membership = time.perf_counter() - started
+        self.alerts = alerts
+        sent = [alert.sent for alert in alerts if alert.sent is not None]
+        self.issued = max(sent) if sent else None
+        self._digest = digest
+        self.bulletins += 1
+        self._rebuild(self.now())
+        return True
+
+    def _read_files(self) -> Optional[List[bytes]]:
+        if not os.path.isdir(self.samples_dir):
+            return None
+        documents = []
+        for name in sorted(os.listdir(self.samples_dir)):
+            path = os.path.join(self.samples_dir, name)
+            with open(path, 'rb') as f:
+                content = f.read()
+            if name.endswith('.tar'):
+                documents.extend(_untar(content))
+            elif name.endswith('.xml'):
+                documents.append(content)
+        return documents
+
+    async def _fetch(self) -> Optional[bytes]:
+        """
+        Boletín completo vigente: fichero tar con un XML por aviso (dos saltos, como el resto de AEMET)
+
+        b'' si no hay ningún aviso en vigor y None si AEMET responde con error.
+        Lanza ProviderUnavailable si AEMET no responde (timeout, conexión, 5xx/429).
+        """
+        url = f"{self.aemet.base_url}/avisos_cap/ultimoelaborado/area/{self.area}"
+        await self.aemet._spend(cost=2)
+        try:
+            async with self.aemet._session_scope() as session:
+                async with session.get(url, headers={'api_key': self.aemet.api_key}) as response:
+                    if response.status == 429:
+                        self.aemet._throttled()
+                    if response.status >= 500 or response.status == 429:
+                        raise ProviderUnavailable(f"AEMET alerts error: {response.status}")
+                    if response.status != 200:
+                        print(f"AEMET alerts error: {response.status}")
+                        return None
+                    data = await response.json(content_type=None)
+                if 'datos' not in data:
+                    # 404 en el cuerpo: no hay ningún aviso en vigor
+                    if int(data.get('estado', 0) or 0) == 404:
+                        return b''
+                    print("AEMET alerts response missing 'datos' field")
+                    return None
+                async with session.get(data['datos']) as data_response:
+                    if data_response.status >= 500:
+                        raise ProviderUnavailable(f"AEMET alerts data error: {data_response.status}")
+                    if data_response.status != 200:
+                        print(f"AEMET alerts data error: {data_response.status}")
+                        return None
+                    return await data_response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise ProviderUnavailable(f"AEMET unreachable: {e!r}") from e
+
+    async def _download(self) -> Optional[List[bytes]]:
+        # Descarga de fondo: cupo de lote
+        with request_priority(BATCH):
+            try:
+                if self.manager is not None:
+                    # Circuito abierto o AEMET caído: None, sin llamar o tras registrar el fallo
+                    content = await self.manager._call_provider('aemet', self._fetch)
+                else:
+                    content = await self._fetch()
+            except QuotaExceeded:
+                print("Weather alerts download skipped: no AEMET quota left")
+                return None
+            except Exception as e:
+                print(f"Error downloading weather alerts: {e!r}")
+                content = None
+        if content is None:
+            self.failed += 1
+            return None
+        if not content:
+            return []
+        if content.lstrip().startswith(b'<'):
+            return [content]
+        return _untar(content)
+
+    def stats(self) -> Dict:
+        stats = self._index.stats()
+        stats.update({
+            'source': self.source,
+            'running': self._task is not None and not self._task.done(),
+            'issued': self.issued.isoformat() if self.issued else None,
+            'parsed': len(self.alerts),
+            'runs': self.runs,
+            'bulletins': self.bulletins,
+            'unchanged': self.unchanged,
+            'rebuilds': self.rebuilds,
+            'failed': self.failed,
+            'last_run': self.last_run.isoformat() if self.last_run else None,
+            'last_build_ms': round(self.last_build * 1000, 2) if self.last_build is not None else None,
+            'last_membership_ms': round(self.last_membership * 1000, 2) if self.last_membership is not None else None,
+            'membership_bytes': self.membership.nbytes
+        })
+        return stats
+
+
+def _untar(content: bytes) -> List[bytes]:
+    documents = []
+    with tarfile.open(fileobj=io.BytesIO(content)) as archive:
+        for member in archive.getmembers():
+            if member.isfile() and member.name.endswith('.xml'):
+                documents.append(archive.extractfile(member).read())
+    return documents
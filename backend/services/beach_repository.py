@@ -0,0 +1,205 @@
+"""
+Beach catalogue for Beach Monitor Spain
+Loads the beach catalogue once and keeps it indexed in memory
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from services.spatial import GridIndex
+
+DEFAULT_DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'beaches.json')
+
+
+class Beach:
+    """
+    Registro compacto de una playa del catálogo
+    """
+
+    __slots__ = (
+        'id', 'name', 'province_id', 'province', 'municipality', 'municipality_code', 'lat', 'lng',
+        'description', 'services', 'blue_flag', 'length_km', 'width_m', 'sand_type', 'aemet_station',
+        'stations'
+    )
+
+    def __init__(self, data: Dict, province_id: int):
+        self.id = int(data['id'])
+        self.name = data['name']
+        self.province_id = province_id
+        self.province = data['province']
+        self.municipality = data['municipality']
+        self.municipality_code = data.get('municipality_code')
+        self.lat = float(data['coordinates']['lat'])
+        self.lng = float(data['coordinates']['lng'])
+        self.description = data.get('description', '')
+        self.services = tuple(data.get('services', ()))
+        self.blue_flag = bool(data.get('blue_flag', False))
+        self.length_km = data.get('length_km')
+        self.width_m = data.get('width_m')
+        self.sand_type = data.get('sand_type')
+        self.aemet_station = data.get('aemet_station')
+        # Estaciones candidatas por cercanía (ver BeachRepository.resolve_stations)
+        self.stations = (self.aemet_station,) if self.aemet_station else ()
+
+    def to_dict(self) -> Dict:
+        """
+        Representación pública (formato de la API)
+        """
+        return {
+            'id': self.id,
+            'name': self.name,
+            'province': self.province,
+            'municipality': self.municipality,
+            'municipality_code': self.municipality_code,
+            'coordinates': {'lat': self.lat, 'lng': self.lng},
+            'description': self.description,
+            'services': list(self.services),
+            'blue_flag': self.blue_flag,
+            'length_km': self.length_km,
+            'width_m': self.width_m,
+            'sand_type': self.sand_type,
+            'aemet_station': self.aemet_station
+        }
+
+
+class Province:
+    """
+    Región costera con su centro y estación AEMET de referencia
+    """
+
+    __slots__ = ('id', 'name', 'beaches_count', 'lat', 'lng', 'aemet_station')
+
+    def __init__(self, data: Dict):
+        self.id = int(data['id'])
+        self.name = data['name']
+        self.beaches_count = int(data.get('beaches_count', 0))
+        self.lat = float(data['center']['lat'])
+        self.lng = float(data['center']['lng'])
+        self.aemet_station = data.get('aemet_station')
+
+    def to_dict(self) -> Dict:
+        return {'id': self.id, 'name': self.name, 'beaches_count': self.beaches_count}
+
+
+class BeachRepository:
+    """
+    Catálogo de playas en memoria con índices por id, provincia, estación y municipio
+    """
+
+    def __init__(self, provinces: List[Province], beaches: List[Beach], version: str = '',
+                 modified_at: Optional[datetime] = None):
+        self.version = version
+        self.modified_at = modified_at or datetime.now(timezone.utc)
+        self._provinces: Dict[int, Province] = {province.id: province for province in provinces}
+        self._by_id: Dict[int, Beach] = {}
+        by_province: Dict[int, List[Beach]] = {}
+        by_municipality: Dict[str, List[Beach]] = {}
+
+        for beach in beaches:
+            self._by_id[beach.id] = beach
+            by_province.setdefault(beach.province_id, []).append(beach)
+            by_municipality.setdefault(beach.municipality.lower(), []).append(beach)
+
+        self._by_province: Dict[int, Tuple[Beach, ...]] = {k: tuple(v) for k, v in by_province.items()}
+        self._by_station: Dict[str, Tuple[Beach, ...]] = {}
+        self._index_stations()
+        self._by_municipality: Dict[str, Tuple[Beach, ...]] = {k: tuple(v) for k, v in by_municipality.items()}
+        self.spatial = GridIndex.build(
+            ((beach, beach.lat, beach.lng) for beach in beaches),
+            cell_deg=float(os.getenv('BEACHES_GRID_CELL_DEG', 0.25))
+        )
+
+    def _index_stations(self):
+        by_station: Dict[str, List[Beach]] = {}
+        for beach in self._by_id.values():
+            if beach.aemet_station:
+                by_station.setdefault(beach.aemet_station, []).append(beach)
+        self._by_station = {k: tuple(v) for k, v in by_station.items()}
+
+    def resolve_stations(self, inventory, k: int = 3):
+        """
+        Asigna a cada playa sus `k` estaciones AEMET más cercanas del inventario
+
+        La más cercana pasa a ser `aemet_station`; el resto se usan como
+        alternativas cuando AEMET no tiene datos de la primera. Los centros
+        de provincia se resuelven igual (solo la más cercana). La versión del
+        catálogo pasa a incluir la del inventario, porque `aemet_station` forma
+        parte de las respuestas.
+        """
+        if not len(inventory):
+            return
+        for beach in self._by_id.values():
+            nearest = inventory.nearest(beach.lat, beach.lng, k)
+            if nearest:
+                beach.stations = tuple(station.id for _, station in nearest)
+                beach.aemet_station = beach.stations[0]
+        for province in self._provinces.values():
+            nearest = inventory.nearest(province.lat, province.lng, 1)
+            if nearest:
+                province.aemet_station = nearest[0][1].id
+        self._index_stations()
+        if inventory.version:
+            self.version = hashlib.sha1(f'{self.version}:{inventory.version}'.encode()).hexdigest()[:12]
+        if inventory.modified_at is not None and inventory.modified_at > self.modified_at:
+            self.modified_at = inventory.modified_at
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> 'BeachRepository':
+        """
+        Carga el catálogo desde el fichero JSON (BEACHES_DATA_PATH o data/beaches.json)
+        """
+        path = path or os.getenv('BEACHES_DATA_PATH', DEFAULT_DATA_PATH)
+        with open(path, 'rb') as f:
+            raw = f.read()
+        data = json.loads(raw)
+
+        provinces = [Province(item) for item in data.get('provinces', [])]
+        beaches = [Beach(item, int(item['province_id'])) for item in data.get('beaches', [])]
+        return cls(
+            provinces, beaches,
+            version=hashlib.sha1(raw).hexdigest()[:12],
+            modified_at=datetime.fromtimestamp(os.path.getmtime(path), timezone.utc)
+        )
+
+    def get(self, beach_id: int) -> Optional[Beach]:
+        return self._by_id.get(beach_id)
+
+    def all(self) -> List[Beach]:
+        return list(self._by_id.values())
+
+    def by_province(self, province_id: int) -> Tuple[Beach, ...]:
+        return self._by_province.get(province_id, ())
+
+    def by_station(self, station: str) -> Tuple[Beach, ...]:
+        return self._by_station.get(station, ())
+
+    def by_municipality(self, municipality: str) -> Tuple[Beach, ...]:
+        return self._by_municipality.get(municipality.lower(), ())
+
+    def stations(self) -> List[str]:
+        return list(self._by_station.keys())
+
+    def nearest(self, lat: float, lng: float, k: int = 5,
+                max_radius_km: Optional[float] = None) -> List[Tuple[float, Beach]]:
+        return self.spatial.nearest(lat, lng, k, max_radius_km)
+
+    def within_radius(self, lat: float, lng: float, radius_km: float) -> List[Tuple[float, Beach]]:
+        return self.spatial.within(lat, lng, radius_km)
+
+    def in_bbox(self, min_lat: float, min_lng: float, max_lat: float, max_lng: float) -> List[Beach]:
+        return self.spatial.bbox(min_lat, min_lng, max_lat, max_lng)
+
+    def get_province(self, province_id: int) -> Optional[Province]:
+        return self._provinces.get(province_id)
+
+    def provinces(self) -> List[Province]:
+        return list(self._provinces.values())
+
+    def __contains__(self, beach_id: int) -> bool:
+        return beach_id in self._by_id
+
+    def __len__(self) -> int:
+        return len(self._by_id)
@@ -0,0 +1,212 @@
+"""
+Cache layer for Beach Monitor Spain
+In-process TTL cache with LRU bound and stale-while-revalidate support,
+plus an optional Redis tier shared between workers
+"""
+
+import json
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson es opcional
+    orjson = None
+
+
+def dumps(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+
+def loads(raw: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    stored_at: float
+    ttl: float
+
+    def age(self, now: Optional[float] = None) -> float:
+        return (now if now is not None else time.monotonic()) - self.stored_at
+
+    def is_fresh(self, now: Optional[float] = None) -> bool:
+        return self.age(now) < self.ttl
+
+
+class TTLCache:
+    """
+    Caché LRU con TTL por entrada
+
+    Las entradas caducadas se siguen sirviendo durante `stale_seconds`
+    (stale-while-revalidate); pasado ese margen se descartan.
+    """
+
+    def __init__(self, max_entries: int = 2048, stale_seconds: float = 600):
+        self.max_entries = max_entries
+        self.stale_seconds = stale_seconds
+        self._entries: 'OrderedDict[Hashable, CacheEntry]' = OrderedDict()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[CacheEntry]:
+        """
+        Devuelve la entrada (fresca o caducada dentro del margen) o None
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        now = time.monotonic()
+        if entry.age(now) >= entry.ttl + self.stale_seconds:
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        if entry.is_fresh(now):
+            self.hits += 1
+        else:
+            self.stale_hits += 1
+        return entry
+
+    def peek(self, key: Hashable) -> Optional[CacheEntry]:
+        """
+        Consulta sin alterar el orden LRU ni las estadísticas
+        """
+        return self._entries.get(key)
+
+    def set(self, key: Hashable, value: Any, ttl: float, age: float = 0.0):
+        """
+        Guarda un valor; `age` permite conservar la antigüedad de un valor leído de otra capa
+        """
+        self._entries[key] = CacheEntry(value=value, stored_at=time.monotonic() - age, ttl=ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round((self.hits + self.stale_hits) / lookups, 3) if lookups else 0.0
+        }
+
+
+# Liberar el lock solo si sigue siendo nuestro
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisCacheTier:
+    """
+    Segunda capa de caché en Redis, compartida por todos los workers
+
+    Cada valor se guarda serializado junto con la hora de escritura y su TTL,
+    con expiración en Redis de TTL + margen stale. Incluye un lock distribuido
+    (SET NX PX) para que solo un worker refresque cada clave.
+    """
+
+    def __init__(self, client, encode: Callable[[Any], Any], decode: Callable[[Any], Any],
+                 prefix: str = 'beachmon:', stale_seconds: float = 600, lock_ttl: float = 30):
+        self.client = client
+        self.encode = encode
+        self.decode = decode
+        self.prefix = prefix
+        self.stale_seconds = stale_seconds
+        self.lock_ttl = lock_ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._release_lock = client.register_script(_RELEASE_LOCK_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> 'RedisCacheTier':
+        import redis.asyncio as redis_asyncio
+        return cls(redis_asyncio.from_url(url), **kwargs)
+
+    def _key(self, key: Tuple) -> str:
+        return self.prefix + ':'.join(str(part) for part in key)
+
+    async def get(self, key: Tuple) -> Optional[Tuple[Any, float, float]]:
+        """
+        Devuelve (valor, antigüedad en segundos, ttl) o None
+        """
+        try:
+            raw = await self.client.get(self._key(key))
+        except Exception as e:
+            self.errors += 1
+            print(f"Redis cache error: {e}")
+            return None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        payload = loads(raw)
+        return self.decode(payload['v']), max(0.0, time.time() - payload['s']), payload['t']
+
+    async def set(self, key: Tuple, value: Any, ttl: float):
+        payload = dumps({'v': self.encode(value), 's': time.time(), 't': ttl})
+        try:
+            await self.client.set(self._key(key), payload, px=int((ttl + self.stale_seconds) * 1000))
+        except Exception as e:
+            self.errors += 1
+            print(f"Redis cache error: {e}")
+
+    async def acquire_lock(self, key: Tuple) -> Optional[str]:
+        """
+        Intenta tomar el lock de refresco de la clave; devuelve el token o None
+        """
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self.client.set(
+                self.prefix + 'lock:' + self._key(key), token, nx=True, px=int(self.lock_ttl * 1000)
+            )
+        except Exception as e:
+            self.errors += 1
+            print(f"Redis lock error: {e}")
+            return token  # sin Redis, cada worker refresca por su cuenta
+        return token if acquired else None
+
+    async def release_lock(self, key: Tuple, token: str):
+        try:
+            await self._release_lock(keys=[self.prefix + 'lock:' + self._key(key)], args=[token])
+        except Exception as e:
+            self.errors += 1
+            print(f"Redis lock error: {e}")
+
+    async def close(self):
+        await self.client.aclose()
+
+    def stats(self) -> Dict:
+        return {'backend': 'redis', 'hits': self.hits, 'misses': self.misses, 'errors': self.errors}
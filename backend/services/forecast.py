@@ -0,0 +1,553 @@
+"""
+Municipal forecasts for Beach Monitor Spain
+AEMET daily and hourly municipal predictions parsed once per issue into compact
+columnar tables, refreshed on the publication schedule and served from memory
+"""
+
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+import numpy as np
+
+from services.local_time import madrid_time
+from services.rate_limit import BATCH, QuotaExceeded, request_priority
+from services.resilience import ProviderUnavailable
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+DEFAULT_SAMPLES_DIR = os.path.join(DATA_DIR, 'forecast_samples')
+# Predicciones de cada municipio y su nombre en las URL y ficheros de AEMET
+PRODUCTS = {'daily': 'diaria', 'hourly': 'horaria'}
+
+# Direcciones de AEMET (en castellano) → las cardinales que usa la API
+DIRECTIONS = {'N': 'N', 'NE': 'NE', 'E': 'E', 'SE': 'SE', 'S': 'S', 'SO': 'SW', 'O': 'W', 'NO': 'NW', 'C': 'C'}
+
+HOURLY_NUMBERS = ('temperature', 'feels_like', 'humidity', 'precipitation', 'precipitation_probability',
+                  'wind_speed', 'gusts')
+DAILY_NUMBERS = ('temperature_max', 'temperature_min', 'feels_like_max', 'feels_like_min', 'humidity_max',
+                 'humidity_min', 'precipitation_probability', 'wind_speed', 'gusts', 'uv_index')
+LABELS = ('wind_direction', 'conditions')
+
+
+def _number(value) -> float:
+    # '' o ausente → NaN; 'Ip' (precipitación inapreciable) → 0
+    if value is None or value == '':
+        return np.nan
+    if value == 'Ip':
+        return 0.0
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class ForecastColumns:
+    """
+    Tabla columnar: una columna NumPy por campo
+
+    Los números son float32 (NaN = sin dato) y los textos (dirección del viento,
+    estado del cielo) códigos int16 sobre una tabla de etiquetas.
+    """
+
+    __slots__ = ('time', 'numbers', 'labels', 'codes')
+
+    def __init__(self, times: List[str], numbers: Dict[str, List[float]], labels: Dict[str, List[Optional[str]]],
+                 unit: str = 'm'):
+        # Días ('D') en la predicción diaria, minutos ('m') en la horaria
+        self.time = np.array(times, dtype=f'datetime64[{unit}]')
+        self.numbers = {name: np.array(values, dtype=np.float32) for name, values in numbers.items()}
+        self.labels: Dict[str, Tuple[str, ...]] = {}
+        self.codes: Dict[str, np.ndarray] = {}
+        for name, values in labels.items():
+            table = tuple(sorted({value for value in values if value}))
+            index = {label: code for code, label in enumerate(table)}
+            self.labels[name] = table
+            self.codes[name] = np.array([index.get(value, -1) for value in values], dtype=np.int16)
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    def rows(self, time_key: str = 'time') -> List[Dict]:
+        """
+        Filas para la respuesta JSON (None donde no hay dato)
+        """
+        columns = {time_key: [str(value) for value in self.time]}
+        for name, values in self.numbers.items():
+            columns[name] = [None if value != value else round(value, 1) for value in values.tolist()]
+        for name, codes in self.codes.items():
+            table = self.labels[name]
+            columns[name] = [table[code] if code >= 0 else None for code in codes.tolist()]
+        names = list(columns)
+        return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+    def nbytes(self) -> int:
+        return self.time.nbytes + sum(a.nbytes for a in self.numbers.values()) + sum(a.nbytes for a in self.codes.values())
+
+
+def _issued(data) -> Optional[str]:
+    if isinstance(data, list) and data and isinstance(data[0], dict):
+        return data[0].get('elaborado')
+    return None
+
+
+def _whole_day(entries) -> Optional[Dict]:
+    # Valor del día completo: periodo '00-24' o sin periodo (días lejanos); si no, el primero
+    if not isinstance(entries, list) or not entries:
+        return None
+    for entry in entries:
+        if entry.get('periodo') in (None, '00-24'):
+            return entry
+    return entries[0]
+
+
+def _first(value):
+    # En la predicción horaria dirección y velocidad vienen como listas de un elemento
+    return value[0] if isinstance(value, list) and value else value
+
+
+def parse_daily_prediction(data: List[Dict]) -> ForecastColumns:
+    """
+    Predicción diaria por municipio (/prediccion/especifica/municipio/diaria): una fila por día
+    """
+    days = data[0].get('prediccion', {}).get('dia', []) if data else []
+    times, labels = [], {name: [] for name in LABELS}
+    numbers = {name: [] for name in DAILY_NUMBERS}
+    for day in days:
+        times.append(day.get('fecha', '')[:10])
+        temperature = day.get('temperatura', {})
+        feels_like = day.get('sensTermica', {})
+        humidity = day.get('humedadRelativa', {})
+        wind = _whole_day(day.get('viento')) or {}
+        precipitation = _whole_day(day.get('probPrecipitacion')) or {}
+        gusts = _whole_day(day.get('rachaMax')) or {}
+        sky = _whole_day([entry for entry in day.get('estadoCielo', []) if entry.get('descripcion')]) or {}
+
+        numbers['temperature_max'].append(_number(temperature.get('maxima')))
+        numbers['temperature_min'].append(_number(temperature.get('minima')))
+        numbers['feels_like_max'].append(_number(feels_like.get('maxima')))
+        numbers['feels_like_min'].append(_number(feels_like.get('minima')))
+        numbers['humidity_max'].append(_number(humidity.get('maxima')))
+        numbers['humidity_min'].append(_number(humidity.get('minima')))
+        numbers['precipitation_probability'].append(_number(precipitation.get('value')))
+        numbers['wind_speed'].append(_number(_first(wind.get('velocidad'))))
+        numbers['gusts'].append(_number(gusts.get('value')))
+        numbers['uv_index'].append(_number(day.get('uvMax')))
+        labels['wind_direction'].append(DIRECTIONS.get(_first(wind.get('direccion'))))
+        labels['conditions'].append(sky.get('descripcion'))
+    return ForecastColumns(times, numbers, labels, unit='D')
+
+
+def _blocks(entries) -> Dict[int, float]:
+    # Probabilidad por bloques 'HHhh' (p. ej. '0814' = de 08 a 14 h) → valor por hora
+    hours = {}
+    for entry in entries or []:
+        period = entry.get('periodo', '')
+        if len(period) != 4:
+            continue
+        start, end = int(period[:2]), int(period[2:])
+        for hour in range(24):
+            if (hour - start) % 24 < (end - start) % 24:
+                hours[hour] = _number(entry.get('value'))
+    return hours
+
+
+def parse_hourly_prediction(data: List[Dict]) -> ForecastColumns:
+    """
+    Predicción horaria por municipio (/prediccion/especifica/municipio/horaria): una fila por hora
+    """
+    days = data[0].get('prediccion', {}).get('dia', []) if data else []
+    times, labels = [], {name: [] for name in LABELS}
+    numbers = {name: [] for name in HOURLY_NUMBERS}
+    for day in days:
+        date = day.get('fecha', '')[:10]
+        by_hour: Dict[int, Dict] = {}
+
+        def put(hour_text, field, value):
+            try:
+                hour = int(hour_text)
+            except (TypeError, ValueError):
+                return
+            by_hour.setdefault(hour, {})[field] = value
+
+        for source, field in (('temperatura', 'temperature'), ('sensTermica', 'feels_like'),
+                              ('humedadRelativa', 'humidity'), ('precipitacion', 'precipitation')):
+            for entry in day.get(source, []):
+                put(entry.get('periodo'), field, _number(entry.get('value')))
+        for entry in day.get('estadoCielo', []):
+            put(entry.get('periodo'), 'conditions', entry.get('descripcion') or None)
+        for entry in day.get('vientoAndRachaMax', []):
+            if 'direccion' in entry:
+                put(entry.get('periodo'), 'wind_direction', DIRECTIONS.get(_first(entry.get('direccion'))))
+                put(entry.get('periodo'), 'wind_speed', _number(_first(entry.get('velocidad'))))
+            else:
+                put(entry.get('periodo'), 'gusts', _number(entry.get('value')))
+        probability = _blocks(day.get('probPrecipitacion'))
+
+        for hour in sorted(by_hour):
+            values = by_hour[hour]
+            times.append(f'{date}T{hour:02d}:00')
+            for name in HOURLY_NUMBERS:
+                if name == 'precipitation_probability':
+                    numbers[name].append(probability.get(hour, np.nan))
+                else:
+                    numbers[name].append(values.get(name, np.nan))
+            for name in LABELS:
+                labels[name].append(values.get(name))
+    return ForecastColumns(times, numbers, labels)
+
+
+class MunicipalForecast:
+    """
+    Predicción de un municipio: tabla diaria y horaria de la última emisión
+    """
+
+    __slots__ = ('code', 'name', 'daily', 'hourly', 'issued', 'fetched_at', '_payload')
+
+    def __init__(self, code: str):
+        self.code = code
+        self.name: Optional[str] = None
+        self.daily: Optional[ForecastColumns] = None
+        self.hourly: Optional[ForecastColumns] = None
+        # Emisión ('elaborado') de cada predicción
+        self.issued: Dict[str, Optional[str]] = {'daily': None, 'hourly': None}
+        # Última descarga correcta de cada predicción
+        self.fetched_at: Dict[str, Optional[datetime]] = {'daily': None, 'hourly': None}
+        self._payload: Optional[Dict] = None
+
+    @property
+    def issued_at(self) -> Optional[datetime]:
+        """
+        Emisión más reciente con zona horaria ('elaborado' es hora de Madrid sin zona)
+        """
+        issued = [madrid_time(datetime.fromisoformat(value)) for value in self.issued.values() if value]
+        return max(issued) if issued else None
+
+    def payload(self) -> Dict:
+        """
+        Cuerpo de la respuesta, construido una vez por emisión
+        """
+        if self._payload is None:
+            self._payload = {
+                'municipality_code': self.code,
+                'municipality': self.name,
+                'issued': self.issued,
+                'daily': self.daily.rows('date') if self.daily is not None else [],
+                'hourly': self.hourly.rows() if self.hourly is not None else [],
+                'source': 'AEMET'
+            }
+        return self._payload
+
+
+class ForecastStore:
+    """
+    Predicciones por municipio en memoria
+
+    Cada emisión se analiza una sola vez; una respuesta ya construida se
+    reutiliza hasta que llega otra emisión.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, MunicipalForecast] = {}
+        self.parsed = 0
+        self.unchanged = 0
+
+    def get(self, code: str) -> Optional[MunicipalForecast]:
+        return self._entries.get(code)
+
+    def is_current(self, code: str, kind: str, issued: Optional[str]) -> bool:
+        entry = self._entries.get(code)
+        return entry is not None and issued is not None and entry.issued[kind] == issued
+
+    def update(self, code: str, daily: Optional[List[Dict]] = None,
+               hourly: Optional[List[Dict]] = None) -> MunicipalForecast:
+        """
+        Incorpora la predicción diaria y/o horaria descargada de un municipio
+        """
+        entry = self._entries.get(code) or MunicipalForecast(code)
+        changed = False
+        for kind, data, parse in (('daily', daily, parse_daily_prediction), ('hourly', hourly, parse_hourly_prediction)):
+            if not data:
+                continue
+            issued = _issued(data)
+            if self.is_current(code, kind, issued):
+                self.unchanged += 1
+                continue
+            try:
+                table = parse(data)
+            except (TypeError, ValueError, KeyError, AttributeError) as e:
+                print(f"AEMET {kind} forecast parsing error for {code}: {e}")
+                continue
+            setattr(entry, kind, table)
+            entry.issued[kind] = issued
+            entry.name = data[0].get('nombre') or entry.name
+            self.parsed += 1
+            changed = True
+        if changed:
+            entry._payload = None
+        self._entries[code] = entry
+        return entry
+
+    def stats(self) -> Dict:
+        return {
+            'municipalities': len(self._entries),
+            'parsed': self.parsed,
+            'unchanged': self.unchanged,
+            'bytes': sum(
+                table.nbytes() for entry in self._entries.values()
+                for table in (entry.daily, entry.hourly) if table is not None
+            )
+        }
+
+
+class ForecastRefresher:
+    """
+    Tarea asyncio que mantiene al día la predicción de los municipios del catálogo
+
+    AEMET publica las predicciones municipales varias veces al día
+    (AEMET_FORECAST_PUBLICATION_HOURS, hora local, más un margen
+    AEMET_FORECAST_PUBLICATION_DELAY en minutos): cada municipio se descarga de
+    nuevo cuando ha pasado una publicación desde su última descarga, y entre
+    publicaciones no se llama a AEMET. Fuentes (AEMET_FORECAST_SOURCE) como en
+    la ingesta marítima: 'aemet', 'files' (AEMET_FORECAST_SAMPLES_DIR) o 'none'.
+
+    Con `manager` las descargas pasan por su circuito de AEMET y su límite de
+    llamadas upstream simultáneas. Un municipio cuya descarga falla no se vuelve
+    a pedir hasta pasados AEMET_FORECAST_FAILURE_TTL segundos: mientras AEMET
+    falla, las consultas de /forecast responden con lo que haya sin llamar.
+    """
+
+    def __init__(self, store: ForecastStore, aemet, municipalities: Iterable[str], source: Optional[str] = None,
+                 samples_dir: Optional[str] = None, manager=None):
+        self.store = store
+        self.aemet = aemet
+        self.manager = manager
+        self.municipalities = sorted({code for code in municipalities if code})
+        default_source = 'aemet' if aemet.api_key else 'none'
+        self.source = (source or os.getenv('AEMET_FORECAST_SOURCE', default_source)).lower()
+        self.samples_dir = samples_dir or os.getenv('AEMET_FORECAST_SAMPLES_DIR', DEFAULT_SAMPLES_DIR)
+        self.publication_hours = sorted(
+            int(hour) for hour in os.getenv('AEMET_FORECAST_PUBLICATION_HOURS', '1,7,13,19').split(',') if hour.strip()
+        )
+        self.publication_delay = timedelta(minutes=float(os.getenv('AEMET_FORECAST_PUBLICATION_DELAY', 30)))
+        # Espera antes de reintentar los municipios que fallaron o se quedaron sin cupo
+        self.retry_interval = float(os.getenv('AEMET_FORECAST_RETRY_INTERVAL', 300))
+        self.failure_ttl = float(os.getenv('AEMET_FORECAST_FAILURE_TTL', 60))
+        # Municipio → instante (monotonic) del último fallo de descarga
+        self._failures: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.downloads = 0
+        self.failed = 0
+        self.shed = 0
+        self.suppressed = 0
+        self.last_run: Optional[datetime] = None
+        self.last_duration: Optional[float] = None
+
+    def last_publication(self, now: Optional[datetime] = None) -> datetime:
+        """
+        Hora de la publicación más reciente ya disponible (con el margen aplicado)
+        """
+        now = now or datetime.now()
+        for days in (0, 1):
+            day = (now - timedelta(days=days)).replace(minute=0, second=0, microsecond=0)
+            for hour in reversed(self.publication_hours):
+                published = day.replace(hour=hour) + self.publication_delay
+                if published <= now:
+                    return published
+        return now - timedelta(days=1)
+
+    def next_publication(self, now: Optional[datetime] = None) -> datetime:
+        now = now or datetime.now()
+        for days in (0, 1):
+            day = (now + timedelta(days=days)).replace(minute=0, second=0, microsecond=0)
+            for hour in self.publication_hours:
+                published = day.replace(hour=hour) + self.publication_delay
+                if published > now:
+                    return published
+        return now + timedelta(days=1)
+
+    def due_products(self, code: str, now: Optional[datetime] = None) -> List[str]:
+        """
+        Predicciones del municipio sin descargar desde la última publicación
+        """
+        entry = self.store.get(code)
+        if entry is None:
+            return list(PRODUCTS)
+        published = self.last_publication(now)
+        return [
+            product for product in PRODUCTS
+            if entry.fetched_at[product] is None or entry.fetched_at[product] < published
+        ]
+
+    def due(self, code: str, now: Optional[datetime] = None) -> bool:
+        return bool(self.due_products(code, now))
+
+    async def start(self):
+        if self.source == 'none':
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error refreshing municipal forecasts: {e}")
+            now = datetime.now()
+            wait = (self.next_publication(now) - now).total_seconds()
+            if any(self.due(code, now) for code in self.municipalities):
+                wait = min(wait, self.retry_interval)
+            await asyncio.sleep(max(1.0, wait))
+
+    async def run_once(self):
+        """
+        Descarga los municipios cuya predicción es anterior a la última publicación
+        """
+        started = time.monotonic()
+        self.last_run = datetime.now()
+        # Descarga de fondo que alimenta una vista de usuario: cupo de lote
+        with request_priority(BATCH):
+            for code in self.municipalities:
+                if self.due(code):
+                    await self.refresh(code)
+        self.last_duration = time.monotonic() - started
+
+    async def refresh(self, code: str) -> Optional[MunicipalForecast]:
+        """
+        Descarga (o lee de los ficheros) la predicción de un municipio; llamadas simultáneas se comparten
+        """
+        if self.source == 'none':
+            return self.store.get(code)
+        failed_at = self._failures.get(code)
+        if failed_at is not None and time.monotonic() - failed_at < self.failure_ttl:
+            self.suppressed += 1
+            return self.store.get(code)
+        future = self._inflight.get(code)
+        if future is None:
+            future = asyncio.ensure_future(self._refresh(code))
+            self._inflight[code] = future
+            future.add_done_callback(lambda _: self._inflight.pop(code, None))
+        return await asyncio.shield(future)
+
+    async def _refresh(self, code: str) -> Optional[MunicipalForecast]:
+        # Solo las predicciones pendientes; con ambas al día (consulta directa), las dos
+        products = self.due_products(code) or list(PRODUCTS)
+        if self.source == 'files':
+            daily, hourly = self._read_files(code, products)
+        else:
+            try:
+                daily, hourly = await self._download(code, products)
+            except QuotaExceeded:
+                self.shed += 1
+                print(f"Municipal forecast {code} skipped: no AEMET quota left")
+                return self.store.get(code)
+        fetched = {'daily': daily, 'hourly': hourly}
+        if any(fetched[product] is None for product in products):
+            # Lo que falte se reintenta pasado el tiempo de espera, sin volver a pedir lo ya descargado
+            self.failed += 1
+            self._failures[code] = time.monotonic()
+            if daily is None and hourly is None:
+                return self.store.get(code)
+        else:
+            self._failures.pop(code, None)
+        entry = self.store.update(code, daily=daily, hourly=hourly)
+        now = datetime.now()
+        for product in products:
+            if fetched[product] is not None:
+                entry.fetched_at[product] = now
+        return entry
+
+    def _read_files(self, code: str,
+                    products: Iterable[str] = tuple(PRODUCTS)) -> Tuple[Optional[List[Dict]], Optional[List[Dict]]]:
+        result = {}
+        for product in products:
+            path = os.path.join(self.samples_dir, f'{PRODUCTS[product]}_{code}.json')
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    result[product] = json.load(f)
+        return result.get('daily'), result.get('hourly')
+
+    async def _fetch(self, session: aiohttp.ClientSession, url: str) -> Tuple[int, Optional[List[Dict]]]:
+        """
+        Una descarga de AEMET; ProviderUnavailable si no responde (timeout, conexión, 5xx/429)
+        """
+        try:
+            status, data = await self.aemet._fetch_datos(session, url)
+        except (QuotaExceeded, ProviderUnavailable):
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise ProviderUnavailable(f"AEMET unreachable: {e!r}") from e
+        if status == 429:
+            self.aemet._throttled()
+        if status >= 500 or status == 429:
+            raise ProviderUnavailable(f"AEMET API error: {status}")
+        return status, data
+
+    async def _download(self, code: str,
+                        products: Iterable[str] = tuple(PRODUCTS)) -> Tuple[Optional[List[Dict]], Optional[List[Dict]]]:
+        result = {}
+        async with self.aemet._session_scope() as session:
+            for product in products:
+                kind = PRODUCTS[product]
+                url = f"{self.aemet.base_url}/prediccion/especifica/municipio/{kind}/{code}"
+
+                def fetch(url=url):
+                    return self._fetch(session, url)
+
+                try:
+                    if self.manager is not None:
+                        # Circuito abierto o AEMET caído: None, sin llamar o tras registrar el fallo
+                        status, data = await self.manager._call_provider('aemet', fetch) or (0, None)
+                    else:
+                        status, data = await fetch()
+                except QuotaExceeded:
+                    raise
+                except Exception as e:
+                    print(f"Error downloading {kind} forecast for {code}: {e!r}")
+                    status, data = 0, None
+                if status == 200 and data:
+                    self.downloads += 1
+                    result[product] = data
+                elif not status:
+                    # AEMET no responde: no se intenta la otra predicción
+                    break
+                else:
+                    print(f"AEMET {kind} forecast error for {code}: {status}")
+        return result.get('daily'), result.get('hourly')
+
+    def stats(self) -> Dict:
+        stats = self.store.stats()
+        now = datetime.now()
+        stats.update({
+            'source': self.source,
+            'running': self._task is not None and not self._task.done(),
+            'tracked': len(self.municipalities),
+            'due': sum(1 for code in self.municipalities if self.due(code, now)),
+            'downloads': self.downloads,
+            'failed': self.failed,
+            'shed': self.shed,
+            'suppressed': self.suppressed,
+            'backing_off': sum(1 for failed_at in self._failures.values()
+                               if time.monotonic() - failed_at < self.failure_ttl),
+            'last_publication': self.last_publication(now).isoformat(),
+            'next_publication': self.next_publication(now).isoformat(),
+            'last_run': self.last_run.isoformat() if self.last_run else None,
+            'last_duration': round(self.last_duration, 3) if self.last_duration is not None else None
+        })
+        return stats
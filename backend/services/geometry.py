@@ -0,0 +1,151 @@
+"""
+Polygon geometry for Beach Monitor Spain
+Vectorized point-in-polygon over a fixed set of points, with bounding-box
+prefilters and a packed shape × point membership bitmap
+"""
+
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+Ring = Sequence[Tuple[float, float]]
+
+# Tamaño máximo (puntos × aristas) de cada bloque de la comprobación vectorizada
+CHUNK_CELLS = 1 << 20
+
+
+def ring_bbox(ring: Ring) -> Tuple[float, float, float, float]:
+    """
+    Rectángulo envolvente (min_lat, min_lon, max_lat, max_lon) de un contorno
+    """
+    lats = [lat for lat, _ in ring]
+    lons = [lon for _, lon in ring]
+    return min(lats), min(lons), max(lats), max(lons)
+
+
+def points_in_ring(lats: np.ndarray, lons: np.ndarray, ring: Ring) -> np.ndarray:
+    """
+    Ray casting vectorizado: máscara de los puntos (lat, lon) dentro del contorno
+
+    Cada punto lanza un rayo hacia el este y está dentro si cruza un número impar
+    de aristas. Se evalúan todas las aristas para un bloque de puntos a la vez.
+    """
+    vertices = np.asarray(ring, dtype=np.float64)
+    lat1, lon1 = vertices[:, 0], vertices[:, 1]
+    lat2, lon2 = np.roll(lat1, -1), np.roll(lon1, -1)
+    dlat = lat2 - lat1
+    # Las aristas horizontales nunca cumplen la primera condición; la pendiente da igual
+    slope = np.divide(lon2 - lon1, dlat, out=np.zeros_like(dlat), where=dlat != 0)
+
+    inside = np.zeros(len(lats), dtype=bool)
+    chunk = max(1, CHUNK_CELLS // len(vertices))
+    for start in range(0, len(lats), chunk):
+        lat = lats[start:start + chunk, None]
+        lon = lons[start:start + chunk, None]
+        crosses = ((lat1 > lat) != (lat2 > lat)) & (lon < lon1 + (lat - lat1) * slope)
+        inside[start:start + chunk] = np.count_nonzero(crosses, axis=1) & 1
+    return inside
+
+
+class PointSet:
+    """
+    Conjunto fijo de puntos (p. ej. las playas del catálogo) con índice por latitud
+
+    Las latitudes ordenadas permiten recortar con búsqueda binaria la franja de un
+    rectángulo envolvente; solo los puntos dentro del rectángulo pasan al ray casting.
+    """
+
+    def __init__(self, lats: Iterable[float], lons: Iterable[float]):
+        self.lats = np.asarray(list(lats), dtype=np.float64)
+        self.lons = np.asarray(list(lons), dtype=np.float64)
+        self._order = np.argsort(self.lats, kind='stable')
+        self._sorted_lats = self.lats[self._order]
+        self._sorted_lons = self.lons[self._order]
+
+    def __len__(self) -> int:
+        return len(self.lats)
+
+    def in_bbox(self, bbox: Tuple[float, float, float, float]) -> np.ndarray:
+        """
+        Posiciones de los puntos dentro del rectángulo (min_lat, min_lon, max_lat, max_lon)
+        """
+        min_lat, min_lon, max_lat, max_lon = bbox
+        low = np.searchsorted(self._sorted_lats, min_lat, side='left')
+        high = np.searchsorted(self._sorted_lats, max_lat, side='right')
+        lons = self._sorted_lons[low:high]
+        return self._order[low:high][(lons >= min_lon) & (lons <= max_lon)]
+
+    def contained(self, rings: Iterable[Ring]) -> np.ndarray:
+        """
+        Máscara de los puntos dentro de alguno de los contornos
+        """
+        mask = np.zeros(len(self), dtype=bool)
+        for ring in rings:
+            if len(ring) < 3:
+                continue
+            candidates = self.in_bbox(ring_bbox(ring))
+            # Los puntos ya dentro de otro contorno no se vuelven a comprobar
+            candidates = candidates[~mask[candidates]]
+            if len(candidates):
+                mask[candidates] = points_in_ring(self.lats[candidates], self.lons[candidates], ring)
+        return mask
+
+
+class MembershipBitmap:
+    """
+    Pertenencia forma × punto empaquetada en bits (una fila por forma)
+
+    Se calcula una vez por conjunto de formas; las filas y columnas se leen sin
+    volver a hacer geometría.
+    """
+
+    def __init__(self, bits: np.ndarray, points: int):
+        self.bits = bits
+        self.points = points
+
+    @classmethod
+    def from_masks(cls, masks: Sequence[np.ndarray], points: int) -> 'MembershipBitmap':
+        rows = np.zeros((len(masks), points), dtype=bool)
+        for row, mask in enumerate(masks):
+            rows[row] = mask
+        return cls(np.packbits(rows, axis=1), points)
+
+    @classmethod
+    def build(cls, point_set: PointSet, shapes: Iterable[Iterable[Ring]]) -> 'MembershipBitmap':
+        """
+        Una pasada por forma (unión de contornos) sobre todos los puntos
+        """
+        return cls.from_masks([point_set.contained(rings) for rings in shapes], len(point_set))
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.bits.shape[0], self.points
+
+    @property
+    def nbytes(self) -> int:
+        return self.bits.nbytes
+
+    def row(self, shape: int) -> np.ndarray:
+        """
+        Máscara de los puntos dentro de la forma
+        """
+        return np.unpackbits(self.bits[shape], count=self.points).astype(bool)
+
+    def members(self, shape: int) -> np.ndarray:
+        """
+        Posiciones de los puntos dentro de la forma
+        """
+        return np.flatnonzero(self.row(shape))
+
+    def shapes_of(self, point: int) -> List[int]:
+        """
+        Formas que contienen el punto
+        """
+        byte, bit = divmod(point, 8)
+        return np.flatnonzero(self.bits[:, byte] & (0x80 >> bit)).tolist()
+
+    def counts(self) -> np.ndarray:
+        """
+        Número de puntos dentro de cada forma
+        """
+        return np.unpackbits(self.bits, axis=1, count=self.points).sum(axis=1)
@@ -0,0 +1,483 @@
+"""
+Gridded forecast for Beach Monitor Spain
+Memory-mapped forecast grids (Iberian Peninsula, Balearics and Canaries) interpolated
+once per issue for every beach, served from memory without per-request I/O
+"""
+
+import asyncio
+import bisect
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from services.weather_service import WeatherData
+
+# Campos precalculados por playa y paso de predicción (eje 0 de la tabla)
+FIELDS = ('temperature', 'humidity', 'wind_speed', 'wind_degrees', 'pressure', 'visibility', 'uv_index', 'condition')
+# Valor de cada variable opcional que no venga en la rejilla
+DEFAULTS = {'humidity': 65.0, 'pressure': 1013.0, 'visibility': 10.0, 'uv_index': 0.0,
+            'wind_u': 0.0, 'wind_v': 0.0, 'cloud_cover': 0.0, 'precipitation': 0.0}
+# Valor de cada campo de `FIELDS` sin dato en la celda (se indica en `missing` de la respuesta)
+FIELD_DEFAULTS = {'humidity': DEFAULTS['humidity'], 'wind_speed': 0.0, 'wind_degrees': 0.0, 'pressure': DEFAULTS['pressure'],
+                  'visibility': DEFAULTS['visibility'], 'uv_index': DEFAULTS['uv_index'], 'condition': 0.0}
+CONDITIONS = ('Despejado', 'Poco nuboso', 'Nuboso', 'Cubierto', 'Lluvia débil', 'Lluvia')
+CARDINALS = ('N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE', 'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW')
+
+
+class ForecastGrid:
+    """
+    Predicción en rejilla regular lat/lon abierta con memmap
+
+    Un directorio con `meta.json` (ejes, pasos de validez, emisión y modelo) y un
+    `<variable>.npy` float32 de forma (pasos, lat, lon) por variable. Solo
+    `temperature` es obligatoria; el viento va en componentes `wind_u`/`wind_v`
+    (m/s) para poder interpolarlo. Las celdas sin dato (máscara) son NaN. Los
+    pasos de validez están en UTC.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        self.issued: Optional[str] = meta.get('issued')
+        self.model: str = meta.get('model', 'Grid')
+        self.lat = (float(meta['lat']['start']), float(meta['lat']['step']), int(meta['lat']['count']))
+        self.lon = (float(meta['lon']['start']), float(meta['lon']['step']), int(meta['lon']['count']))
+        self.steps = np.array(meta['steps'], dtype='datetime64[s]')
+        # Copia como datetime (UTC sin zona) para elegir el paso vigente sin pasar por NumPy en cada consulta
+        self.step_times: List[datetime] = self.steps.astype(datetime).tolist()
+        # Y en hora local sin zona, como el `timestamp` del resto de proveedores
+        self.local_times: List[datetime] = [
+            step.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None) for step in self.step_times
+        ]
+        shape = (len(self.steps), self.lat[2], self.lon[2])
+        self.arrays: Dict[str, np.ndarray] = {}
+        for name in meta['variables']:
+            array = np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+            if array.shape != shape:
+                raise ValueError(f"Grid variable {name} has shape {array.shape}, expected {shape}")
+            self.arrays[name] = array
+        if 'temperature' not in self.arrays:
+            raise ValueError("Grid has no temperature variable")
+
+    @staticmethod
+    def _axis(values: np.ndarray, axis: Tuple[float, float, int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Posición fraccionaria en el eje (vale también para ejes descendentes, step < 0)
+        start, step, count = axis
+        position = (values - start) / step
+        lower = np.clip(np.floor(position).astype(np.int64), 0, count - 2)
+        return lower, position - lower, (position >= 0) & (position <= count - 1)
+
+    def interpolate(self, lats: np.ndarray, lons: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Interpolación bilineal de todas las variables en todos los puntos: {variable: (pasos, puntos)}
+
+        Una sola lectura vectorizada de las cuatro esquinas por variable. Si alguna
+        esquina es NaN se reparte su peso entre las demás; los puntos fuera de la
+        rejilla quedan a NaN.
+        """
+        i, wy, inside_lat = self._axis(np.asarray(lats, dtype=np.float64), self.lat)
+        j, wx, inside_lon = self._axis(np.asarray(lons, dtype=np.float64), self.lon)
+        weights = np.stack(((1 - wy) * (1 - wx), (1 - wy) * wx, wy * (1 - wx), wy * wx))
+        corners = ((i, j), (i, j + 1), (i + 1, j), (i + 1, j + 1))
+        outside = ~(inside_lat & inside_lon)
+
+        results = {}
+        for name, array in self.arrays.items():
+            values = np.stack([array[:, row, col] for row, col in corners]).astype(np.float64)
+            present = ~np.isnan(values)
+            weight = np.where(present, weights[:, None, :], 0.0)
+            total = weight.sum(axis=0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                result = (np.where(present, values, 0.0) * weight).sum(axis=0) / total
+            result[:, outside] = np.nan
+            results[name] = result
+        return results
+
+    def derive(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """
+        Campos de `FIELDS` por paso y punto: array (campos, pasos, puntos)
+        """
+        raw = self.interpolate(lats, lons)
+        shape = raw['temperature'].shape
+
+        def variable(name: str) -> np.ndarray:
+            return raw[name] if name in raw else np.full(shape, DEFAULTS[name])
+
+        u, v = variable('wind_u'), variable('wind_v')
+        clouds, rain = variable('cloud_cover'), variable('precipitation')
+        condition = np.select(
+            [rain >= 2.5, rain >= 0.1, clouds > 85, clouds > 50, clouds > 15],
+            [5, 4, 3, 2, 1],
+            default=0
+        ).astype(np.float64)
+        # Sin nubosidad o precipitación en la celda no se sabe el estado del cielo
+        condition[np.isnan(clouds) | np.isnan(rain)] = np.nan
+        # Redondeados aquí, una vez por emisión, y no en cada consulta
+        return np.stack((
+            np.round(raw['temperature'], 1),
+            np.round(variable('humidity')),
+            np.round(np.hypot(u, v) * 3.6, 1),  # m/s a km/h
+            np.round(np.degrees(np.arctan2(-u, -v)) % 360),  # dirección de procedencia
+            np.round(variable('pressure'), 1),
+            np.round(variable('visibility'), 1),
+            np.round(variable('uv_index')),
+            condition,
+        ))
+
+    def step_index(self, when: Optional[datetime] = None) -> Optional[int]:
+        """
+        Paso vigente en `when` (el último ya alcanzado); None si la predicción ha expirado
+
+        Un `when` sin zona horaria se toma como UTC.
+        """
+        times = self.step_times
+        now = when or datetime.now(timezone.utc)
+        if now.tzinfo is not None:
+            now = now.astimezone(timezone.utc).replace(tzinfo=None)
+        index = bisect.bisect_right(times, now) - 1
+        if index < 0:
+            return 0
+        spacing = times[-1] - times[-2] if len(times) > 1 else timedelta(hours=1)
+        if now >= times[-1] + spacing:
+            return None
+        return index
+
+    def stats(self) -> Dict:
+        return {
+            'model': self.model,
+            'issued': self.issued,
+            'variables': sorted(self.arrays),
+            'shape': [len(self.steps), self.lat[2], self.lon[2]],
+            'resolution_deg': [abs(self.lat[1]), abs(self.lon[1])],
+            'first_step': str(self.steps[0]) if len(self.steps) else None,
+            'last_step': str(self.steps[-1]) if len(self.steps) else None
+        }
+
+
+def save_grid(directory: str, meta: Dict, arrays: Dict[str, np.ndarray]):
+    """
+    Escribe una rejilla en el formato de `ForecastGrid` (conversores y ficheros de prueba)
+
+    `meta` lleva `lat`/`lon` ({start, step, count}), `steps` (ISO) y opcionalmente
+    `issued` y `model`; la lista de variables se toma de `arrays`.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f'{name}.npy'), np.asarray(array, dtype=np.float32))
+    with open(os.path.join(directory, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(dict(meta, variables=sorted(arrays)), f, indent=2)
+
+
+class _GridState:
+    """
+    Rejilla cargada y sus campos interpolados (se sustituye entera en cada emisión)
+    """
+
+    __slots__ = ('grid', 'values', 'columns', 'extra')
+
+    def __init__(self, grid: ForecastGrid, values: np.ndarray, columns: Dict[Tuple[float, float], int]):
+        self.grid = grid
+        self.values = values
+        self.columns = columns
+        # Puntos fuera del catálogo, interpolados fuera del bucle de eventos al consultarlos (`fetch`)
+        self.extra: Dict[Tuple[float, float], np.ndarray] = {}
+
+
+class GridForecastTable:
+    """
+    Predicción en rejilla ya interpolada en cada playa
+
+    Los puntos (playas) se registran al arrancar; al cargar una emisión se
+    interpolan todos de una vez y cada consulta es un acceso al array del paso
+    vigente, sin E/S. Los puntos fuera del catálogo se interpolan con `fetch`
+    en el ejecutor la primera vez que se piden. Los suscriptores (`add_listener`) reciben los puntos cuyo
+    paso vigente cambia, por una emisión nueva o porque avanza la hora.
+    """
+
+    def __init__(self, max_points: Optional[int] = None):
+        self.max_points = max_points if max_points is not None else int(os.getenv('WEATHER_GRID_MAX_POINTS', 10000))
+        self._points: Dict[Tuple[float, float], int] = {}
+        self._state: Optional[_GridState] = None
+        self._listeners: List[Callable[[List[Tuple[float, float]]], None]] = []
+        # Paso vigente en el último aviso a los suscriptores
+        self._notified_step: Optional[int] = None
+        self.loaded_at: Optional[datetime] = None
+        self.last_interpolation: Optional[float] = None
+        self.loads = 0
+
+    def add_listener(self, listener: Callable[[List[Tuple[float, float]]], None]):
+        """
+        Registra una función que recibe los puntos cuyos datos cambian
+        """
+        self._listeners.append(listener)
+
+    @classmethod
+    def load(cls, beaches: Iterable = ()) -> 'GridForecastTable':
+        table = cls()
+        table.register_points((beach.lat, beach.lng) for beach in beaches)
+        return table
+
+    @staticmethod
+    def _key(lat: float, lon: float) -> Tuple[float, float]:
+        return (round(lat, 4), round(lon, 4))
+
+    @property
+    def grid(self) -> Optional[ForecastGrid]:
+        return self._state.grid if self._state is not None else None
+
+    @property
+    def source(self) -> Optional[str]:
+        return self._state.grid.model if self._state is not None else None
+
+    def register_points(self, points: Iterable[Tuple[float, float]]):
+        """
+        Añade puntos al conjunto que se interpola con cada emisión
+        """
+        for lat, lon in points:
+            self._points.setdefault(self._key(lat, lon), len(self._points))
+        if self._state is not None:
+            self.install(self._state.grid)
+
+    def install(self, grid: ForecastGrid):
+        """
+        Interpola todos los puntos registrados en la rejilla y la pone en servicio
+        """
+        self.activate(self.prepare(grid))
+
+    def prepare(self, grid: ForecastGrid) -> _GridState:
+        """
+        Interpola todos los puntos registrados sin poner la rejilla en servicio
+
+        Es la parte que lee del disco; se puede llamar desde otro hilo.
+        """
+        started = time.perf_counter()
+        keys = list(self._points)
+        coordinates = np.array(keys, dtype=np.float64).reshape(-1, 2)
+        values = grid.derive(coordinates[:, 0], coordinates[:, 1])
+        self.last_interpolation = time.perf_counter() - started
+        return _GridState(grid, values, {key: column for column, key in enumerate(keys)})
+
+    def activate(self, state: _GridState):
+        """
+        Pone en servicio una rejilla ya interpolada y avisa de los puntos que cambian
+
+        Los suscriptores se llaman desde aquí: debe llamarse en el hilo del bucle de eventos.
+        """
+        previous = self._state
+        # Sustitución en una sola asignación: las consultas ven la emisión anterior o la nueva
+        self._state = state
+        self.loaded_at = datetime.now(timezone.utc)
+        self.loads += 1
+        self._notify(previous, self._notified_step, state, state.grid.step_index())
+
+    def check_step(self):
+        """
+        Avisa de los puntos que cambian si el paso vigente ha avanzado desde el último aviso
+        """
+        state = self._state
+        if state is None:
+            return
+        step = state.grid.step_index()
+        if step != self._notified_step:
+            self._notify(state, self._notified_step, state, step)
+
+    def _notify(self, previous: Optional[_GridState], previous_step: Optional[int],
+                state: _GridState, step: Optional[int]):
+        self._notified_step = step
+        if not self._listeners:
+            return
+        keys = list(state.columns)
+        if previous is None and step is None:
+            changed = []
+        elif previous is None or previous_step is None or step is None or previous.columns != state.columns:
+            changed = keys
+        else:
+            # Compara los campos del paso vigente punto a punto (NaN igual a NaN)
+            old = previous.values[:, previous_step, :]
+            new = state.values[:, step, :]
+            same = (old == new) | (np.isnan(old) & np.isnan(new))
+            changed = [keys[column] for column in np.flatnonzero(~same.all(axis=0))]
+        if not changed:
+            return
+        for listener in self._listeners:
+            try:
+                listener(changed)
+            except Exception as e:
+                print(f"Error in forecast grid listener: {e}")
+
+    @staticmethod
+    def _column(state: _GridState, key: Tuple[float, float]) -> Optional[np.ndarray]:
+        column = state.columns.get(key)
+        if column is not None:
+            return state.values[:, :, column]
+        return state.extra.get(key)
+
+    def lookup(self, lat: float, lon: float, when: Optional[datetime] = None):
+        """
+        WeatherData del paso vigente en el punto (None sin rejilla, fuera de ella o expirada)
+
+        Sin E/S: un punto fuera del catálogo que aún no se ha pedido con `fetch` da None.
+        """
+        state = self._state
+        if state is None:
+            return None
+        values = self._column(state, self._key(lat, lon))
+        return self._weather(state, values, when) if values is not None else None
+
+    async def fetch(self, lat: float, lon: float, when: Optional[datetime] = None):
+        """
+        Como `lookup`, pero interpola en el ejecutor los puntos fuera del catálogo
+
+        La interpolación lee la rejilla del disco (memmap); se guarda en la emisión
+        vigente (hasta `max_points` puntos) y las consultas siguientes no leen nada.
+        """
+        state = self._state
+        if state is None:
+            return None
+        key = self._key(lat, lon)
+        values = self._column(state, key)
+        if values is None:
+            loop = asyncio.get_running_loop()
+            values = await loop.run_in_executor(
+                None, lambda: state.grid.derive(np.array([key[0]]), np.array([key[1]]))[:, :, 0]
+            )
+            if len(state.extra) < self.max_points:
+                state.extra[key] = values
+        return self._weather(state, values, when)
+
+    @staticmethod
+    def _weather(state: _GridState, values: np.ndarray, when: Optional[datetime]) -> Optional[WeatherData]:
+        step = state.grid.step_index(when)
+        if step is None:
+            return None
+        row = values[:, step].tolist()
+        if row[0] != row[0]:  # NaN: fuera de la rejilla o celda enmascarada
+            return None
+        # Variables enmascaradas solo en parte de la rejilla: valor por defecto y se indican en `missing`
+        missing = tuple(name for name, value in zip(FIELDS[1:], row[1:]) if value != value)
+        if missing:
+            row = [FIELD_DEFAULTS[name] if name in missing else value for name, value in zip(FIELDS, row)]
+        temperature, humidity, wind_speed, wind_degrees, pressure, visibility, uv_index, condition = row
+
+        return WeatherData(
+            temperature_air=temperature,
+            temperature_water=None,
+            humidity=int(humidity),
+            wind_speed=wind_speed,
+            wind_direction=CARDINALS[int((wind_degrees + 11.25) // 22.5) % 16],
+            wave_height=None,
+            visibility=visibility,
+            uv_index=int(uv_index),
+            conditions=CONDITIONS[int(condition)],
+            pressure=pressure,
+            timestamp=state.grid.local_times[step],
+            missing=missing
+        )
+
+    def stats(self) -> Dict:
+        state = self._state
+        stats = {
+            'loaded': state is not None,
+            'points': len(self._points),
+            'extra_points': len(state.extra) if state is not None else 0,
+            'loads': self.loads,
+            'loaded_at': self.loaded_at.isoformat() if self.loaded_at else None,
+            'interpolation_ms': round(self.last_interpolation * 1000, 2) if self.last_interpolation is not None else None
+        }
+        if state is not None:
+            stats.update(state.grid.stats())
+            stats['points_covered'] = int((~np.isnan(state.values[0, 0])).sum()) if state.values.shape[1] else 0
+            stats['current_step'] = state.grid.step_index()
+        return stats
+
+
+class GridForecastIngestor:
+    """
+    Tarea asyncio que vigila el directorio de la rejilla (WEATHER_GRID_PATH)
+
+    Cuando cambia la emisión (`issued` o fecha de `meta.json`) abre la nueva
+    rejilla e interpola todas las playas fuera del bucle de eventos. Sin
+    WEATHER_GRID_PATH no hace nada y la tabla queda vacía.
+    """
+
+    def __init__(self, table: GridForecastTable, path: Optional[str] = None, interval: Optional[float] = None):
+        self.table = table
+        self.path = path or os.getenv('WEATHER_GRID_PATH')
+        self.interval = interval if interval is not None else float(os.getenv('WEATHER_GRID_REFRESH_INTERVAL', 300))
+        self._task: Optional[asyncio.Task] = None
+        self._version: Optional[Tuple] = None
+        self.runs = 0
+        self.failed = 0
+        self.last_error: Optional[str] = None
+
+    async def start(self):
+        if not self.path:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                self.last_error = str(e)
+                print(f"Error loading forecast grid: {e}")
+            await asyncio.sleep(self.interval)
+
+    def _current_version(self) -> Tuple:
+        meta_path = os.path.join(self.path, 'meta.json')
+        with open(meta_path, encoding='utf-8') as f:
+            issued = json.load(f).get('issued')
+        return issued, os.path.getmtime(meta_path)
+
+    async def run_once(self) -> bool:
+        """
+        Carga la rejilla si hay una emisión nueva; devuelve si se ha cargado
+        """
+        self.runs += 1
+        version = self._current_version()
+        if version == self._version and self.table.grid is not None:
+            self.table.check_step()
+            return False
+
+        def load() -> _GridState:
+            return self.table.prepare(ForecastGrid(self.path))
+
+        # Apertura e interpolación leen del disco: fuera del bucle de eventos
+        # (run_in_executor y no asyncio.to_thread, que no existe en Python 3.8)
+        loop = asyncio.get_running_loop()
+        state = await loop.run_in_executor(None, load)
+        # La puesta en servicio avisa a los suscriptores: ya en el bucle de eventos
+        self.table.activate(state)
+        self._version = version
+        self.last_error = None
+        return True
+
+    def stats(self) -> Dict:
+        stats = self.table.stats()
+        stats.update({
+            'path': self.path,
+            'running': self._task is not None and not self._task.done(),
+            'runs': self.runs,
+            'failed': self.failed,
+            'last_error': self.last_error
+        })
+        return stats
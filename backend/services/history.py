@@ -0,0 +1,481 @@
+"""
+Historical observation store for Beach Monitor Spain
+Persists every beach observation with a batched async writer and serves range queries,
+keeping hourly and daily rollups per beach and per province up to date as rows arrive
+"""
+
+import asyncio
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import (
+    Column, Float, Index, Integer, MetaData, PrimaryKeyConstraint, String, Table, create_engine, func, select
+)
+
+from services.local_time import madrid_day_starts, madrid_local
+
+DEFAULT_HISTORY_URL = 'sqlite:///' + os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'history.db'
+)
+
+# Métricas guardadas por observación: columna -> ruta en el payload de la API
+METRICS = {
+    'air_temperature': ('temperature', 'air'),
+    'water_temperature': ('temperature', 'water'),
+    'wind_speed': ('wind', 'speed'),
+    'wave_height': ('waves', 'height'),
+    'humidity': ('humidity',),
+    'pressure': ('pressure',),
+    'uv_index': ('uv_index',),
+}
+
+# Horas UTC (iguales a las de Madrid) y días naturales en hora de Madrid
+RESOLUTIONS = {'raw': None, 'hour': 3600, 'day': 86400}
+ROLLUP_RESOLUTIONS = {name: size for name, size in RESOLUTIONS.items() if size}
+ROLLUP_SCOPES = ('beach', 'province')
+
+# Funciones escalares de mínimo/máximo para el upsert de agregados, por motor
+_UPSERT_DIALECTS = {
+    'sqlite': ('min', 'max'),
+    'postgresql': ('least', 'greatest'),
+}
+
+# Marca de fin en la cola del escritor: la tarea guarda el lote pendiente y termina
+_STOP = object()
+
+metadata = MetaData()
+
+observations = Table(
+    'weather_observations', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('beach_id', Integer, nullable=False),
+    Column('station', String(16)),
+    Column('source', String(32)),
+    # Segundos Unix (UTC): permite agrupar por hora/día con aritmética entera en cualquier motor
+    Column('observed_at', Integer, nullable=False),
+    *(Column(name, Float) for name in METRICS),
+    Index('ix_observations_beach_time', 'beach_id', 'observed_at'),
+    Index('ix_observations_station_time', 'station', 'observed_at'),
+)
+
+# Agregados incrementales: se guardan suma y recuento (no la media) para poder acumular
+rollups = Table(
+    'weather_rollups', metadata,
+    Column('scope', String(8), nullable=False),
+    Column('scope_id', Integer, nullable=False),
+    Column('resolution', String(8), nullable=False),
+    Column('bucket', Integer, nullable=False),
+    Column('samples', Integer, nullable=False),
+    *(column for name in METRICS for column in (
+        Column(f'{name}_count', Integer, nullable=False),
+        Column(f'{name}_sum', Float, nullable=False),
+        Column(f'{name}_min', Float),
+        Column(f'{name}_max', Float),
+    )),
+    PrimaryKeyConstraint('scope', 'scope_id', 'resolution', 'bucket'),
+)
+
+
+def _metric(payload: Dict, path: Tuple[str, ...]) -> Optional[float]:
+    value = payload
+    for part in path:
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+def observation_row(beach_id: int, station: Optional[str], payload: Dict) -> Dict:
+    """
+    Convierte el payload meteorológico de una playa en una fila de la tabla
+    """
+    row = {
+        'beach_id': beach_id,
+        'station': station,
+        'source': payload.get('source'),
+        'observed_at': int(datetime.fromisoformat(payload['timestamp']).timestamp()),
+    }
+    for name, path in METRICS.items():
+        row[name] = _metric(payload, path)
+    return row
+
+
+def bucket_starts(timestamps, resolution: str) -> np.ndarray:
+    """
+    Inicio (segundos Unix) del cubo de cada instante: hora, o día natural en Madrid
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    if resolution == 'day':
+        return madrid_day_starts(timestamps)
+    return timestamps - timestamps % RESOLUTIONS[resolution]
+
+
+def rollup_rows(rows: List[Dict], province_of: Dict[int, int],
+                resolutions: Iterable[str] = tuple(ROLLUP_RESOLUTIONS)) -> List[Dict]:
+    """
+    Reduce un lote de observaciones a filas de agregados (por playa y provincia, hora y día)
+
+    Las observaciones se ordenan por (ámbito, cubo) y cada grupo se reduce de
+    una vez con `reduceat`; los valores ausentes (NaN) no cuentan.
+    """
+    if not rows:
+        return []
+
+    observed_at = np.fromiter((row['observed_at'] for row in rows), dtype=np.int64, count=len(rows))
+    values = np.array(
+        [[np.nan if row[name] is None else row[name] for name in METRICS] for row in rows], dtype=np.float64
+    )
+    present = ~np.isnan(values)
+    filled = np.where(present, values, 0.0)
+    scope_ids = {
+        'beach': np.fromiter((row['beach_id'] for row in rows), dtype=np.int64, count=len(rows)),
+        'province': np.fromiter((province_of.get(row['beach_id'], -1) for row in rows), dtype=np.int64, count=len(rows)),
+    }
+
+    result = []
+    for resolution in resolutions:
+        buckets = bucket_starts(observed_at, resolution)
+        for scope in ROLLUP_SCOPES:
+            ids = scope_ids[scope]
+            selected = np.flatnonzero(ids >= 0)
+            if not len(selected):
+                continue
+            order = selected[np.lexsort((buckets[selected], ids[selected]))]
+            group_ids, group_buckets = ids[order], buckets[order]
+            starts = np.flatnonzero(np.r_[
+                True, (group_ids[1:] != group_ids[:-1]) | (group_buckets[1:] != group_buckets[:-1])
+            ])
+
+            samples = np.diff(np.r_[starts, len(order)])
+            counts = np.add.reduceat(present[order].astype(np.int64), starts, axis=0)
+            sums = np.add.reduceat(filled[order], starts, axis=0)
+            # fmin/fmax ignoran NaN salvo que todo el grupo sea NaN
+            mins = np.fmin.reduceat(values[order], starts, axis=0)
+            maxs = np.fmax.reduceat(values[order], starts, axis=0)
+
+            for g, start in enumerate(starts):
+                row = {
+                    'scope': scope,
+                    'scope_id': int(group_ids[start]),
+                    'resolution': resolution,
+                    'bucket': int(group_buckets[start]),
+                    'samples': int(samples[g]),
+                }
+                for m, name in enumerate(METRICS):
+                    count = int(counts[g, m])
+                    row[f'{name}_count'] = count
+                    row[f'{name}_sum'] = float(sums[g, m])
+                    row[f'{name}_min'] = float(mins[g, m]) if count else None
+                    row[f'{name}_max'] = float(maxs[g, m]) if count else None
+                result.append(row)
+    return result
+
+
+def _rollup_stats(row, name: str) -> Dict:
+    count = row[f'{name}_count']
+    return {
+        'mean': round(row[f'{name}_sum'] / count, 2) if count else None,
+        'min': row[f'{name}_min'],
+        'max': row[f'{name}_max'],
+    }
+
+
+class HistoryStore:
+    """
+    Acceso síncrono (SQLAlchemy Core) a la serie histórica de observaciones
+
+    Cada inserción actualiza en la misma transacción los agregados horarios y
+    diarios por playa y por provincia (`province_of` asocia playa -> provincia).
+    """
+
+    def __init__(self, url: Optional[str] = None, province_of: Optional[Dict[int, int]] = None):
+        self.url = url or os.getenv('HISTORY_DATABASE_URL', DEFAULT_HISTORY_URL)
+        self.engine = create_engine(self.url, future=True)
+        self.province_of = province_of or {}
+        self.rollups_enabled = self.engine.dialect.name in _UPSERT_DIALECTS
+        if not self.rollups_enabled:
+            print(f"Weather rollups disabled: unsupported database {self.engine.dialect.name}")
+
+    def create_schema(self):
+        metadata.create_all(self.engine)
+        if self.rollups_enabled:
+            self._backfill_rollups()
+
+    def _backfill_rollups(self, chunk_size: int = 5000):
+        """
+        Calcula los agregados de las observaciones guardadas antes de existir la tabla de agregados
+
+        También rehace los diarios agrupados por día UTC (versiones anteriores) por días de Madrid.
+        """
+        with self.engine.begin() as conn:
+            if conn.execute(select(rollups.c.bucket).limit(1)).first() is None:
+                resolutions = tuple(ROLLUP_RESOLUTIONS)
+            else:
+                day = conn.execute(select(rollups.c.bucket).where(rollups.c.resolution == 'day').limit(1)).scalar()
+                if day is None or int(bucket_starts(day, 'day')) == day:
+                    return
+                resolutions = ('day',)
+                conn.execute(rollups.delete().where(rollups.c.resolution == 'day'))
+            result = conn.execution_options(yield_per=chunk_size).execute(
+                select(observations).order_by(observations.c.id)
+            )
+            for chunk in result.mappings().partitions(chunk_size):
+                self._merge_rollups(conn, rollup_rows([dict(row) for row in chunk], self.province_of, resolutions))
+
+    def insert_many(self, rows: List[Dict]):
+        if not rows:
+            return
+        with self.engine.begin() as conn:
+            conn.execute(observations.insert(), rows)
+            if self.rollups_enabled:
+                self._merge_rollups(conn, rollup_rows(rows, self.province_of))
+
+    def _merge_rollups(self, conn, rows: List[Dict]):
+        """
+        Acumula los agregados del lote sobre los existentes (upsert atómico)
+        """
+        if not rows:
+            return
+        if self.engine.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        least, greatest = (getattr(func, name) for name in _UPSERT_DIALECTS[self.engine.dialect.name])
+
+        statement = insert(rollups)
+        new = statement.excluded
+        current = rollups.c
+        updates = {'samples': current.samples + new.samples}
+        for name in METRICS:
+            count, total, low, high = (f'{name}_count', f'{name}_sum', f'{name}_min', f'{name}_max')
+            updates[count] = current[count] + new[count]
+            updates[total] = current[total] + new[total]
+            # Con NULL en un lado se queda el otro valor
+            updates[low] = least(func.coalesce(current[low], new[low]), func.coalesce(new[low], current[low]))
+            updates[high] = greatest(func.coalesce(current[high], new[high]), func.coalesce(new[high], current[high]))
+
+        conn.execute(
+            statement.on_conflict_do_update(index_elements=['scope', 'scope_id', 'resolution', 'bucket'], set_=updates),
+            rows
+        )
+
+    def query_rollups(self, scope: str, scope_id: int, start: int, end: int, resolution: str = 'day',
+                      limit: int = 5000) -> List:
+        """
+        Filas de agregados de una playa o provincia con cubo entre `start` y `end`
+        """
+        query = (
+            select(rollups)
+            .where(
+                (rollups.c.scope == scope)
+                & (rollups.c.scope_id == scope_id)
+                & (rollups.c.resolution == resolution)
+                & (rollups.c.bucket >= int(bucket_starts(start, resolution)))
+                & (rollups.c.bucket < end)
+            )
+            .order_by(rollups.c.bucket)
+            .limit(limit)
+        )
+        with self.engine.connect() as conn:
+            return [row._mapping for row in conn.execute(query)]
+
+    def province_summary(self, province_id: int, start: int, end: int, resolution: str = 'day',
+                         limit: int = 5000) -> List[Dict]:
+        """
+        Resumen (media, mínimo y máximo de cada métrica) de una provincia por hora o día
+        """
+        return [
+            {
+                'timestamp': madrid_local(row['bucket']).isoformat(),
+                'bucket': row['bucket'],
+                'samples': row['samples'],
+                **{name: _rollup_stats(row, name) for name in METRICS},
+            }
+            for row in self.query_rollups('province', province_id, start, end, resolution, limit)
+        ]
+
+    def query_series(self, beach_id: int, start: int, end: int, resolution: str = 'raw',
+                     limit: int = 5000) -> List[Dict]:
+        """
+        Serie de una playa entre `start` y `end` (segundos Unix)
+
+        'hour' y 'day' se leen de los agregados precalculados; si no están
+        disponibles se agrupa por horas en la base de datos sobre el rango del
+        índice (beach_id, observed_at). Las horas de `timestamp` son de Madrid.
+        """
+        bucket_size = RESOLUTIONS[resolution]
+        if bucket_size is not None and self.rollups_enabled:
+            return [
+                {
+                    'timestamp': madrid_local(row['bucket']).isoformat(),
+                    'bucket': row['bucket'],
+                    'samples': row['samples'],
+                    **{name: _rollup_stats(row, name)['mean'] for name in METRICS},
+                }
+                for row in self.query_rollups('beach', beach_id, start, end, resolution, limit)
+            ]
+
+        condition = (
+            (observations.c.beach_id == beach_id)
+            & (observations.c.observed_at >= start)
+            & (observations.c.observed_at < end)
+        )
+
+        with self.engine.connect() as conn:
+            if bucket_size is None:
+                query = (
+                    select(observations.c.observed_at, observations.c.source,
+                           *(observations.c[name] for name in METRICS))
+                    .where(condition)
+                    .order_by(observations.c.observed_at)
+                    .limit(limit)
+                )
+                return [
+                    dict(row._mapping, timestamp=madrid_local(row.observed_at).isoformat())
+                    for row in conn.execute(query)
+                ]
+
+            # Por horas en la base de datos; los días de Madrid (con cambio de hora) se juntan aquí
+            hour = (observations.c.observed_at - observations.c.observed_at % RESOLUTIONS['hour']).label('bucket')
+            query = (
+                select(hour, func.count().label('samples'), *(column for name in METRICS for column in (
+                    func.count(observations.c[name]).label(f'{name}_count'),
+                    func.sum(observations.c[name]).label(f'{name}_sum'),
+                )))
+                .where(condition)
+                .group_by(hour)
+                .order_by(hour)
+            )
+            if resolution == 'hour':
+                query = query.limit(limit)
+            groups = [dict(row._mapping) for row in conn.execute(query)]
+
+        if resolution == 'day':
+            days = {}
+            for group, day in zip(groups, bucket_starts([group['bucket'] for group in groups], 'day').tolist()):
+                current = days.setdefault(day, dict(group, bucket=day, samples=0, **{
+                    key: 0 for name in METRICS for key in (f'{name}_count', f'{name}_sum')
+                }))
+                current['samples'] += group['samples']
+                for name in METRICS:
+                    current[f'{name}_count'] += group[f'{name}_count']
+                    current[f'{name}_sum'] += group[f'{name}_sum'] or 0.0
+            groups = list(days.values())[:limit]
+        return [
+            {
+                'timestamp': madrid_local(group['bucket']).isoformat(),
+                'bucket': group['bucket'],
+                'samples': group['samples'],
+                **{
+                    name: group[f'{name}_sum'] / group[f'{name}_count'] if group[f'{name}_count'] else None
+                    for name in METRICS
+                },
+            }
+            for group in groups
+        ]
+
+
+class ObservationWriter:
+    """
+    Escritor asíncrono por lotes: las peticiones encolan y una tarea inserta en bloque
+    """
+
+    def __init__(self, store: HistoryStore, batch_size: Optional[int] = None,
+                 flush_interval: Optional[float] = None, max_queue: int = 10000):
+        self.store = store
+        self.batch_size = batch_size or int(os.getenv('HISTORY_BATCH_SIZE', 200))
+        self.flush_interval = flush_interval or float(os.getenv('HISTORY_FLUSH_INTERVAL', 5))
+        self.max_queue = max_queue
+        # La cola se crea en start(): en Python < 3.10 queda ligada al bucle que exista al crearla
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Última observación guardada por playa, para no repetir valores servidos desde caché
+        self._last_seen: Dict[int, str] = {}
+        self.written = 0
+        self.dropped = 0
+
+    def record(self, beach_id: int, station: Optional[str], payload: Dict):
+        """
+        Encola una observación si es nueva para esa playa (no bloquea)
+        """
+        timestamp = payload.get('timestamp')
+        if not timestamp or self._last_seen.get(beach_id) == timestamp:
+            return
+        if self._queue is None:
+            # Escritor sin arrancar (o ya parado)
+            self.dropped += 1
+            return
+        self._last_seen[beach_id] = timestamp
+        try:
+            self._queue.put_nowait(observation_row(beach_id, station, payload))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.store.create_schema)
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Detiene la tarea sin perder el lote que esté acumulando y guarda lo que quede en la cola
+        """
+        if self._task is not None:
+            if not self._task.done():
+                # Sin cancelar: la tarea puede tener un lote a medio llenar fuera de la cola
+                await self._queue.put(_STOP)
+                await self._task
+            self._task = None
+        await self.flush()
+        self._queue = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stopping = False
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._write(batch)
+            if stopping:
+                return
+
+    async def flush(self):
+        batch = []
+        while self._queue is not None and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        await self._write(batch)
+
+    async def _write(self, batch: List[Dict]):
+        if not batch:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.store.insert_many, batch)
+            self.written += len(batch)
+        except Exception as e:
+            print(f"Error writing weather history: {e}")
+            self.dropped += len(batch)
+
+    def stats(self) -> Dict:
+        return {
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'written': self.written,
+            'dropped': self.dropped
+        }
@@ -0,0 +1,154 @@
+"""
+HTTP response helpers for Beach Monitor Spain
+JSON rendering (orjson or standard), selective gzip, and ETag / Last-Modified
+validators with 304 handling and Cache-Control headers for read endpoints
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Iterable, Optional, Type
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson es opcional
+    orjson = None
+
+# Serializador de las respuestas: 'orjson' (por defecto si está instalado) o 'json'
+JSON_RENDERER = os.getenv('API_JSON_RESPONSE', 'orjson').lower()
+if JSON_RENDERER == 'orjson' and orjson is None:
+    JSON_RENDERER = 'json'
+
+
+def json_response_class() -> Type[JSONResponse]:
+    """
+    Clase de respuesta por defecto de la app según API_JSON_RESPONSE
+    """
+    return ORJSONResponse if JSON_RENDERER == 'orjson' else JSONResponse
+
+
+def render_json(payload: Any) -> bytes:
+    """
+    Serializa un payload interno (dicts, listas, tipos básicos y datetime)
+
+    Con orjson se evita el paso genérico por `jsonable_encoder`.
+    """
+    if JSON_RENDERER == 'orjson':
+        return orjson.dumps(payload)
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    """
+    GZip para respuestas grandes, excepto los canales SSE (se retendrían los eventos)
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, exclude_prefixes: Iterable[str] = ('/api/stream',)):
+        super().__init__(app, minimum_size=minimum_size)
+        self.exclude_prefixes = tuple(exclude_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'].startswith(self.exclude_prefixes):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+def make_etag(version: str, data: Any = None) -> str:
+    """
+    ETag débil: versión del catálogo más, si se indica, un resumen del contenido
+    """
+    if data is None:
+        return f'W/"{version}"'
+    digest = hashlib.blake2b(data if isinstance(data, bytes) else render_json(data), digest_size=8).hexdigest()
+    return f'W/"{version}-{digest}"'
+
+
+def observation_time(payloads: Iterable[dict]) -> Optional[datetime]:
+    """
+    Hora (UTC) de la observación más reciente de una lista de payloads meteorológicos
+    """
+    latest = None
+    for payload in payloads:
+        timestamp = payload.get('timestamp') if isinstance(payload, dict) else None
+        if not timestamp:
+            continue
+        try:
+            observed = datetime.fromisoformat(timestamp)
+        except ValueError:
+            continue
+        # Las marcas sin zona son hora local del servidor
+        observed = observed.astimezone(timezone.utc)
+        if latest is None or observed > latest:
+            latest = observed
+    return latest
+
+
+def _utc(value: datetime) -> datetime:
+    # Sin zona se toma como hora local del servidor; en segundos, la precisión de las cabeceras HTTP
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == '*':
+        return True
+    # Comparación débil (RFC 7232): se ignora el prefijo W/
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """
+    Evalúa If-None-Match (prioritario) e If-Modified-Since
+    """
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return _utc(last_modified) <= since
+    return False
+
+
+def conditional_json(request: Request, payload: Any, version: str, max_age: int,
+                     etag_data: Any = None, last_modified: Optional[datetime] = None,
+                     etag: Optional[str] = None) -> Response:
+    """
+    Respuesta JSON con ETag, Last-Modified y Cache-Control, o 304 si el cliente ya la tiene
+
+    Sin `etag` explícito, se calcula a partir de la versión del catálogo y del
+    contenido (`etag_data`, por defecto el propio cuerpo). `last_modified` debe
+    llevar zona horaria; sin ella se toma como hora local del servidor.
+    """
+    body = render_json(payload)
+    if etag is None:
+        etag = make_etag(version, body if etag_data is None else etag_data)
+
+    headers = {'ETag': etag, 'Cache-Control': f'public, max-age={max_age}'}
+    if last_modified is not None:
+        last_modified = _utc(last_modified)
+        headers['Last-Modified'] = format_datetime(last_modified, usegmt=True)
+
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type='application/json', headers=headers)
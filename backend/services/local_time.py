@@ -0,0 +1,77 @@
+"""
+Spanish official time for Beach Monitor Spain
+Europe/Madrid offsets from the EU summer-time rule, without a time zone database
+(zoneinfo is not available on Python 3.8 and slim images ship no tzdata)
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+
+import numpy as np
+
+CET = 3600
+CEST = 7200
+DAY = 86400
+
+
+def _last_sunday(year: int, month: int) -> datetime:
+    # Marzo y octubre tienen 31 días
+    last = datetime(year, month, 31, tzinfo=timezone.utc)
+    return last - timedelta(days=(last.weekday() + 1) % 7)
+
+
+def _summer_time(year: int) -> Tuple[int, int]:
+    """
+    Inicio y fin del horario de verano (segundos Unix): último domingo de marzo y de octubre a la 01:00 UTC
+    """
+    start = _last_sunday(year, 3).replace(hour=1)
+    end = _last_sunday(year, 10).replace(hour=1)
+    return int(start.timestamp()), int(end.timestamp())
+
+
+def madrid_offsets(timestamps) -> np.ndarray:
+    """
+    Diferencia con UTC (segundos) de la hora de Madrid en cada instante (segundos Unix)
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    years = timestamps.astype('datetime64[s]').astype('datetime64[Y]').astype(np.int64) + 1970
+    offsets = np.full(timestamps.shape, CET, dtype=np.int64)
+    for year in np.unique(years):
+        start, end = _summer_time(int(year))
+        offsets[(years == year) & (timestamps >= start) & (timestamps < end)] = CEST
+    return offsets
+
+
+def madrid_day_starts(timestamps) -> np.ndarray:
+    """
+    Inicio (segundos Unix) del día natural en Madrid al que pertenece cada instante
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    local = timestamps + madrid_offsets(timestamps)
+    midnight = local - local % DAY
+    # La medianoche local son las 22:00 o las 23:00 UTC del día anterior, nunca en un cambio de hora (01:00 UTC)
+    return midnight - madrid_offsets(midnight - CEST)
+
+
+def madrid_time(value: datetime) -> datetime:
+    """
+    Hora de Madrid con zona horaria
+
+    Un `value` sin zona se toma como hora local de Madrid (así da AEMET sus
+    fechas de elaboración); en la hora repetida de octubre se elige la de verano.
+    """
+    if value.tzinfo is None:
+        start, end = _summer_time(value.year)
+        wall = int(value.replace(tzinfo=timezone.utc).timestamp())
+        # Por hora de reloj: de 02:00 a 03:00 en marzo y de 03:00 a 02:00 en octubre
+        offset = CEST if start + CET <= wall < end + CEST else CET
+        return value.replace(tzinfo=timezone(timedelta(seconds=offset)))
+    offset = int(madrid_offsets(int(value.timestamp())))
+    return value.astimezone(timezone(timedelta(seconds=offset)))
+
+
+def madrid_local(timestamp: int) -> datetime:
+    """
+    Hora local de Madrid sin zona de un instante (segundos Unix), como los `timestamp` de la API
+    """
+    return madrid_time(datetime.fromtimestamp(timestamp, timezone.utc)).replace(tzinfo=None)
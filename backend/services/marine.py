@@ -0,0 +1,609 @@
+"""
+Marine conditions for Beach Monitor Spain
+AEMET coastal-zone bulletins and buoy observations, parsed once per bulletin
+into a zone table with O(1) per-beach lookups
+"""
+
+import asyncio
+import csv
+import io
+import json
+import os
+import re
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+
+from services.rate_limit import BATCH, QuotaExceeded, request_priority
+from services.resilience import ProviderUnavailable
+from services.spatial import GridIndex
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+DEFAULT_ZONES_PATH = os.path.join(DATA_DIR, 'marine_zones.json')
+DEFAULT_SAMPLES_DIR = os.path.join(DATA_DIR, 'marine_samples')
+
+# Escala Douglas: término del boletín → altura significativa (m), de más a menos específico
+DOUGLAS = (
+    ('mar muy gruesa', (4.0, 6.0)),
+    ('fuerte marejada', (1.25, 2.5)),
+    ('marejadilla', (0.1, 0.5)),
+    ('marejada', (0.5, 1.25)),
+    ('mar gruesa', (2.5, 4.0)),
+    ('gruesa', (2.5, 4.0)),
+    ('arbolada', (6.0, 9.0)),
+    ('montañosa', (9.0, 14.0)),
+    ('rizada', (0.0, 0.1)),
+    ('calma', (0.0, 0.0)),
+)
+
+DIRECTIONS = {
+    'norte': 'N', 'noreste': 'NE', 'nordeste': 'NE', 'este': 'E', 'sureste': 'SE', 'sudeste': 'SE',
+    'sur': 'S', 'suroeste': 'SW', 'sudoeste': 'SW', 'oeste': 'W', 'noroeste': 'NW',
+    # Nombres locales de los vientos
+    'tramontana': 'N', 'gregal': 'NE', 'levante': 'E', 'siroco': 'SE', 'jaloque': 'SE',
+    'lebeche': 'SW', 'poniente': 'W', 'mistral': 'NW', 'maestral': 'NW',
+}
+
+# Velocidad media (km/h) de cada fuerza Beaufort
+BEAUFORT_KMH = (0, 3, 9, 15, 24, 34, 44, 56, 68, 82, 96, 110, 120)
+
+_DIRECTION_RE = '|'.join(sorted(DIRECTIONS, key=len, reverse=True))
+_WIND_RE = re.compile(rf'^\s*(?:componente\s+)?({_DIRECTION_RE}|variable)\s+(\d+)(?:\s+a\s+(\d+))?', re.IGNORECASE)
+_SWELL_RE = re.compile(
+    rf'mar de fondo del?\s+({_DIRECTION_RE})\s+de\s+(\d+(?:,\d+)?)(?:\s+a\s+(\d+(?:,\d+)?))?\s*m', re.IGNORECASE
+)
+
+
+class MarineZone:
+    """
+    Zona de aguas costeras de los boletines de AEMET
+    """
+
+    __slots__ = ('id', 'name', 'coast', 'provinces', 'lat', 'lng')
+
+    def __init__(self, data: Dict):
+        self.id = str(data['id'])
+        self.name = data['name']
+        self.coast = str(data['coast'])
+        self.provinces = tuple(data.get('provinces', ()))
+        self.lat = float(data['lat'])
+        self.lng = float(data['lng'])
+
+
+def load_zones(path: Optional[str] = None) -> List[MarineZone]:
+    """
+    Carga las zonas costeras (MARINE_ZONES_PATH o data/marine_zones.json)
+    """
+    path = path or os.getenv('MARINE_ZONES_PATH', DEFAULT_ZONES_PATH)
+    with open(path, encoding='utf-8') as f:
+        return [MarineZone(item) for item in json.load(f).get('zones', [])]
+
+
+def _number(text: str) -> float:
+    return float(text.replace(',', '.'))
+
+
+def parse_sea_state(text: str) -> Optional[float]:
+    """
+    Altura del mar de viento (m) según los términos Douglas del texto
+
+    Con un intervalo ("marejadilla a marejada") se usa el punto medio del rango completo.
+    """
+    lowered = text.lower()
+    ranges = []
+    for term, bounds in DOUGLAS:
+        if term in lowered:
+            ranges.append(bounds)
+            lowered = lowered.replace(term, ' ')
+    if not ranges:
+        return None
+    low = min(bounds[0] for bounds in ranges)
+    high = max(bounds[1] for bounds in ranges)
+    return round((low + high) / 2, 2)
+
+
+def parse_swell(text: str) -> Tuple[Optional[str], Optional[float]]:
+    """
+    Dirección y altura media (m) del mar de fondo, si el texto lo menciona
+    """
+    match = _SWELL_RE.search(text)
+    if not match:
+        return None, None
+    low = _number(match.group(2))
+    high = _number(match.group(3)) if match.group(3) else low
+    return DIRECTIONS[match.group(1).lower()], round((low + high) / 2, 2)
+
+
+def parse_wind(text: str) -> Tuple[Optional[str], Optional[int]]:
+    """
+    Dirección y fuerza Beaufort máxima del viento al principio del texto
+    """
+    match = _WIND_RE.match(text)
+    if not match:
+        return None, None
+    direction = match.group(1).lower()
+    force = int(match.group(3) or match.group(2))
+    return DIRECTIONS.get(direction, 'VAR'), min(force, len(BEAUFORT_KMH) - 1)
+
+
+def parse_zone_text(text: str) -> Dict:
+    """
+    Condiciones de una zona a partir del texto libre del boletín
+    """
+    wind_direction, wind_force = parse_wind(text)
+    sea_height = parse_sea_state(text)
+    swell_direction, swell_height = parse_swell(text)
+
+    conditions = {'forecast': text.strip()}
+    heights = [height for height in (sea_height, swell_height) if height is not None]
+    if heights:
+        conditions['wave_height'] = max(heights)
+    direction = swell_direction or (wind_direction if wind_direction != 'VAR' else None)
+    if direction:
+        conditions['wave_direction'] = direction
+    if wind_force is not None:
+        conditions['wind_direction'] = wind_direction
+        conditions['wind_force'] = wind_force
+        conditions['wind_speed'] = BEAUFORT_KMH[wind_force]
+    return conditions
+
+
+def _issued(data) -> Optional[str]:
+    document = data[0] if isinstance(data, list) and data else data
+    return document.get('origen', {}).get('elaborado') if isinstance(document, dict) else None
+
+
+def parse_coastal_bulletin(data: List[Dict]) -> Tuple[Optional[str], Dict[str, Dict]]:
+    """
+    Boletín de predicción costera de AEMET ('datos' de /prediccion/maritima/costera)
+
+    Devuelve (fecha de elaboración, {id de zona: condiciones}).
+    """
+    document = data[0] if isinstance(data, list) and data else data
+    if not isinstance(document, dict):
+        return None, {}
+    issued = _issued(document)
+    zones = {}
+    for area in document.get('prediccion', {}).get('zona', []):
+        subzones = area.get('subzona', [])
+        if isinstance(subzones, dict):
+            subzones = [subzones]
+        for subzone in subzones:
+            text = subzone.get('texto')
+            if isinstance(text, list):
+                text = ' '.join(text)
+            if subzone.get('id') is not None and text:
+                conditions = parse_zone_text(text)
+                conditions['issued'] = issued
+                zones[str(subzone['id'])] = conditions
+    return issued, zones
+
+
+class BuoyObservation:
+    """
+    Última observación de una boya (oleaje medido y temperatura del agua)
+    """
+
+    __slots__ = ('id', 'name', 'lat', 'lng', 'observed_at', 'wave_height', 'wave_period',
+                 'wave_direction', 'water_temperature')
+
+    def __init__(self, row: Dict):
+        self.id = row['estacion']
+        self.name = row.get('nombre', '')
+        self.lat = float(row['lat'])
+        self.lng = float(row['lon'])
+        self.observed_at = row.get('fecha')
+        self.wave_height = _optional_float(row.get('hm0'))
+        self.wave_period = _optional_float(row.get('tp'))
+        direction = _optional_float(row.get('dir_media'))
+        self.wave_direction = _cardinal(direction) if direction is not None else None
+        self.water_temperature = _optional_float(row.get('temp_agua'))
+
+
+def _optional_float(value: Optional[str]) -> Optional[float]:
+    if value is None or value.strip() in ('', '-', 'NaN'):
+        return None
+    return _number(value.strip())
+
+
+def _cardinal(degrees: float) -> str:
+    return ('N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW')[int((degrees % 360 + 22.5) // 45) % 8]
+
+
+def parse_buoy_file(text: str) -> List[BuoyObservation]:
+    """
+    Fichero CSV de boyas (estacion, nombre, lat, lon, fecha, hm0, tp, dir_media, temp_agua)
+    """
+    observations = []
+    for row in csv.DictReader(io.StringIO(text)):
+        try:
+            observations.append(BuoyObservation(row))
+        except (KeyError, ValueError):
+            print(f"Invalid buoy row: {row}")
+    return observations
+
+
+class MarineConditionsTable:
+    """
+    Tabla zona → condiciones y punto (playa) → condiciones ya combinadas
+
+    Cada playa se asigna una vez a su zona costera (por provincia o, si no, la
+    zona más cercana) y a la boya más cercana dentro de `buoy_radius_km`. Al
+    llegar un boletín o un fichero de boyas se recalcula la tabla por punto, de
+    modo que cada consulta es un acceso a diccionario. Como estos datos no pasan
+    por la caché, los puntos que cambian se avisan a los `listeners`.
+    """
+
+    def __init__(self, zones: List[MarineZone], buoy_radius_km: Optional[float] = None,
+                 zone_buoy_km: Optional[float] = None, zone_max_km: Optional[float] = None):
+        self.zones = {zone.id: zone for zone in zones}
+        self._zone_by_province = {province: zone for zone in zones for province in zone.provinces}
+        self._zone_index = GridIndex.build(((zone, zone.lat, zone.lng) for zone in zones), cell_deg=1.0)
+        self.buoy_radius_km = buoy_radius_km if buoy_radius_km is not None else float(os.getenv('MARINE_BUOY_RADIUS_KM', 50))
+        self.zone_buoy_km = zone_buoy_km if zone_buoy_km is not None else float(os.getenv('MARINE_ZONE_BUOY_KM', 250))
+        self.zone_max_km = zone_max_km if zone_max_km is not None else float(os.getenv('MARINE_ZONE_MAX_KM', 100))
+        self.max_points = int(os.getenv('MARINE_MAX_POINTS', 10000))
+
+        self._bulletins: Dict[str, Optional[str]] = {}
+        self._zone_conditions: Dict[str, Dict] = {}
+        self._buoys: Dict[str, BuoyObservation] = {}
+        self._buoy_index = GridIndex(cell_deg=0.5)
+        self._zone_water: Dict[str, float] = {}
+        # Punto (lat, lon redondeadas) → (zona, boya cercana) y condiciones combinadas
+        self._points: Dict[Tuple[float, float], Tuple[Optional[str], Optional[str]]] = {}
+        self._by_point: Dict[Tuple[float, float], Dict] = {}
+        # Funciones avisadas con los puntos (lat, lon) cuyas condiciones cambian en cada recálculo
+        self._listeners: List[Callable[[List[Tuple[float, float]]], None]] = []
+        self.updated_at: Optional[datetime] = None
+        self.rebuilds = 0
+
+    def add_listener(self, listener: Callable[[List[Tuple[float, float]]], None]):
+        """
+        Registra una función que recibe los puntos cuyas condiciones cambian
+        """
+        self._listeners.append(listener)
+
+    @classmethod
+    def load(cls, beaches: Iterable = ()) -> 'MarineConditionsTable':
+        table = cls(load_zones())
+        table.register_points((beach.lat, beach.lng, beach.province) for beach in beaches)
+        return table
+
+    @staticmethod
+    def _key(lat: float, lon: float) -> Tuple[float, float]:
+        return (round(lat, 4), round(lon, 4))
+
+    def _zone_for(self, lat: float, lon: float, province: Optional[str] = None) -> Optional[str]:
+        zone = self._zone_by_province.get(province) if province else None
+        if zone is None:
+            nearest = self._zone_index.nearest(lat, lon, 1, max_radius_km=self.zone_max_km)
+            zone = nearest[0][1] if nearest else None
+        return zone.id if zone is not None else None
+
+    def _buoy_for(self, lat: float, lon: float, radius_km: float) -> Optional[str]:
+        nearest = self._buoy_index.nearest(lat, lon, 1, max_radius_km=radius_km)
+        return nearest[0][1].id if nearest else None
+
+    def register_points(self, points: Iterable[Tuple[float, float, Optional[str]]]):
+        """
+        Asigna zona y boya a cada punto (lat, lon, provincia) y recalcula sus condiciones
+        """
+        for lat, lon, province in points:
+            key = self._key(lat, lon)
+            self._points[key] = (self._zone_for(lat, lon, province), self._buoy_for(lat, lon, self.buoy_radius_km))
+            self._by_point[key] = self._compose(*self._points[key])
+
+    def is_current(self, coast: str, issued: Optional[str]) -> bool:
+        """
+        Indica si esa emisión del boletín de la costa ya está incorporada
+        """
+        return issued is not None and self._bulletins.get(coast) == issued
+
+    def update_bulletin(self, coast: str, issued: Optional[str], zones: Dict[str, Dict], rebuild: bool = True):
+        """
+        Incorpora el boletín de una costa (con `rebuild=False` se recalcula después con `rebuild()`)
+        """
+        self._bulletins[coast] = issued
+        self._zone_conditions.update(zones)
+        if rebuild:
+            self.rebuild()
+
+    def update_buoys(self, observations: List[BuoyObservation], rebuild: bool = True):
+        """
+        Sustituye las observaciones de boyas y reasigna la boya más cercana de cada punto
+        """
+        self._buoys = {buoy.id: buoy for buoy in observations}
+        self._buoy_index = GridIndex.build(((buoy, buoy.lat, buoy.lng) for buoy in observations), cell_deg=0.5)
+        for key, (zone_id, _) in self._points.items():
+            self._points[key] = (zone_id, self._buoy_for(key[0], key[1], self.buoy_radius_km))
+        if rebuild:
+            self.rebuild()
+
+    def _zone_water_temperature(self, zone: MarineZone) -> Optional[float]:
+        # Temperatura del agua de la zona: la de la boya más cercana que la mida
+        for _, buoy in self._buoy_index.nearest(zone.lat, zone.lng, 3, max_radius_km=self.zone_buoy_km):
+            if buoy.water_temperature is not None:
+                return buoy.water_temperature
+        return None
+
+    def _compose(self, zone_id: Optional[str], buoy_id: Optional[str]) -> Optional[Dict]:
+        conditions = {}
+        zone = self._zone_conditions.get(zone_id) if zone_id else None
+        if zone is not None:
+            conditions = {key: zone[key] for key in ('wave_height', 'wave_direction') if key in zone}
+            if zone_id in self._zone_water:
+                conditions['water_temperature'] = self._zone_water[zone_id]
+            conditions['zone'] = zone_id
+            conditions['issued'] = zone.get('issued')
+        # La boya cercana (medida) prevalece sobre la predicción de la zona
+        buoy = self._buoys.get(buoy_id) if buoy_id else None
+        if buoy is not None:
+            for field in ('wave_height', 'wave_period', 'wave_direction', 'water_temperature'):
+                value = getattr(buoy, field)
+                if value is not None:
+                    conditions[field] = value
+            conditions['buoy'] = buoy.id
+        return conditions or None
+
+    def rebuild(self):
+        """
+        Recalcula las condiciones de todos los puntos registrados
+        """
+        self._zone_water = {}
+        for zone in self.zones.values():
+            water = self._zone_water_temperature(zone)
+            if water is not None:
+                self._zone_water[zone.id] = water
+        previous = self._by_point
+        self._by_point = {key: self._compose(zone_id, buoy_id) for key, (zone_id, buoy_id) in self._points.items()}
+        self.updated_at = datetime.now()
+        self.rebuilds += 1
+        changed = [key for key, conditions in self._by_point.items() if previous.get(key) != conditions]
+        if changed:
+            for listener in self._listeners:
+                try:
+                    listener(changed)
+                except Exception as e:
+                    print(f"Error in marine table listener: {e}")
+
+    def lookup(self, lat: float, lon: float) -> Optional[Dict]:
+        """
+        Condiciones del mar en un punto (None si ninguna zona ni boya lo cubre)
+        """
+        key = self._key(lat, lon)
+        try:
+            return self._by_point[key]
+        except KeyError:
+            pass
+        # Punto fuera del catálogo: se asigna una vez (hasta `max_points`)
+        if len(self._points) >= self.max_points:
+            return self._compose(self._zone_for(lat, lon), self._buoy_for(lat, lon, self.buoy_radius_km))
+        self.register_points(((lat, lon, None),))
+        return self._by_point[key]
+
+    def stats(self) -> Dict:
+        return {
+            'zones': len(self.zones),
+            'zones_with_forecast': len(self._zone_conditions),
+            'bulletins': dict(self._bulletins),
+            'buoys': len(self._buoys),
+            'points': len(self._points),
+            'points_covered': sum(1 for conditions in self._by_point.values() if conditions),
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'rebuilds': self.rebuilds
+        }
+
+
+class MarineIngestor:
+    """
+    Tarea asyncio que descarga periódicamente los boletines costeros y las boyas
+
+    Fuentes (MARINE_SOURCE): 'aemet' descarga de AEMET OpenData (y de
+    MARINE_BUOYS_URL si está definida); 'files' lee ficheros grabados de
+    MARINE_SAMPLES_DIR (costera_<costa>.json y boyas.csv); 'none' no ingiere y
+    se mantienen los datos simulados. Por defecto, 'aemet' si hay clave.
+
+    Con `manager` los boletines se descargan a través de su circuito de AEMET y
+    su límite de llamadas upstream simultáneas, igual que predicciones y avisos.
+    """
+
+    def __init__(self, table: MarineConditionsTable, aemet, marine, source: Optional[str] = None,
+                 samples_dir: Optional[str] = None, interval: Optional[float] = None, manager=None):
+        self.table = table
+        self.aemet = aemet
+        self.manager = manager
+        self.marine = marine
+        default_source = 'aemet' if aemet.api_key else 'none'
+        self.source = (source or os.getenv('MARINE_SOURCE', default_source)).lower()
+        self.samples_dir = samples_dir or os.getenv('MARINE_SAMPLES_DIR', DEFAULT_SAMPLES_DIR)
+        self.buoys_url = os.getenv('MARINE_BUOYS_URL')
+        self.interval = interval if interval is not None else float(os.getenv('MARINE_REFRESH_INTERVAL', 3600))
+        # Antigüedad (s) a partir de la cual los datos ingeridos se consideran desactualizados
+        self.stale_after = float(os.getenv('MARINE_STALE_AFTER', 86400))
+        self.coasts = sorted({zone.coast for zone in table.zones.values()})
+        self._task: Optional[asyncio.Task] = None
+        self._buoys_digest: Optional[int] = None
+        self.runs = 0
+        self.parsed = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.last_run: Optional[datetime] = None
+        self.last_duration: Optional[float] = None
+
+    async def start(self):
+        if self.source == 'none':
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in marine ingestion: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self):
+        """
+        Una pasada: boletín de cada costa y fichero de boyas
+        """
+        started = time.monotonic()
+        self.last_run = datetime.now()
+        if self.source == 'files':
+            bulletins, buoys = self._read_files()
+        else:
+            bulletins, buoys = await self._download()
+
+        changed = False
+        if buoys is not None and hash(buoys) != self._buoys_digest:
+            self.table.update_buoys(parse_buoy_file(buoys), rebuild=False)
+            self._buoys_digest = hash(buoys)
+            changed = True
+        for coast, data in bulletins.items():
+            # Solo se analiza cada emisión una vez
+            issued = _issued(data)
+            if self.table.is_current(coast, issued):
+                self.unchanged += 1
+                continue
+            issued, zones = parse_coastal_bulletin(data)
+            self.table.update_bulletin(coast, issued, zones, rebuild=False)
+            self.parsed += 1
+            changed = True
+        if changed:
+            self.table.rebuild()
+        self.runs += 1
+        self.last_duration = time.monotonic() - started
+
+    def _read_files(self) -> Tuple[Dict[str, List[Dict]], Optional[str]]:
+        bulletins = {}
+        for coast in self.coasts:
+            path = os.path.join(self.samples_dir, f'costera_{coast}.json')
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    bulletins[coast] = json.load(f)
+        buoys_path = os.path.join(self.samples_dir, 'boyas.csv')
+        buoys = None
+        if os.path.exists(buoys_path):
+            with open(buoys_path, encoding='utf-8') as f:
+                buoys = f.read()
+        return bulletins, buoys
+
+    async def _fetch(self, session: aiohttp.ClientSession, url: str) -> Tuple[int, Optional[List[Dict]]]:
+        """
+        Un boletín de AEMET; ProviderUnavailable si no responde (timeout, conexión, 5xx/429)
+        """
+        try:
+            status, data = await self.aemet._fetch_datos(session, url)
+        except (QuotaExceeded, ProviderUnavailable):
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise ProviderUnavailable(f"AEMET unreachable: {e!r}") from e
+        if status == 429:
+            self.aemet._throttled()
+        if status >= 500 or status == 429:
+            raise ProviderUnavailable(f"AEMET API error: {status}")
+        return status, data
+
+    async def _download(self) -> Tuple[Dict[str, List[Dict]], Optional[str]]:
+        bulletins = {}
+        # Descarga de fondo, pero sin ella no hay datos del mar: cupo de lote
+        with request_priority(BATCH):
+            async with self.aemet._session_scope() as session:
+                for coast in self.coasts:
+                    url = f"{self.aemet.base_url}/prediccion/maritima/costera/costa/{coast}"
+
+                    def fetch(url=url):
+                        return self._fetch(session, url)
+
+                    try:
+                        if self.manager is not None:
+                            # Circuito abierto o AEMET caído: None, sin llamar o tras registrar el fallo
+                            status, data = await self.manager._call_provider('aemet', fetch) or (0, None)
+                        else:
+                            status, data = await fetch()
+                    except QuotaExceeded:
+                        print(f"Marine bulletin {coast} skipped: no AEMET quota left")
+                        continue
+                    except Exception as e:
+                        print(f"Error downloading marine bulletin {coast}: {e!r}")
+                        status, data = 0, None
+                    if status == 200 and data:
+                        bulletins[coast] = data
+                        continue
+                    self.failed += 1
+                    if not status:
+                        # AEMET no responde: no se piden las demás costas en esta pasada
+                        print(f"AEMET unavailable, marine bulletins skipped from {coast}")
+                        break
+                    print(f"AEMET marine bulletin {coast} error: {status}")
+
+        buoys = None
+        if self.buoys_url:
+            try:
+                async with self.marine._session_scope() as session:
+                    async with session.get(self.buoys_url) as response:
+                        if response.status == 200:
+                            buoys = await response.text()
+                        else:
+                            print(f"Buoy file error: {response.status}")
+                            self.failed += 1
+            except Exception as e:
+                print(f"Error downloading buoy file: {e!r}")
+                self.failed += 1
+        return bulletins, buoys
+
+    def status(self) -> Dict:
+        """
+        Estado de la fuente marítima: 'simulated' sin ingesta, 'warning' si aún no hay
+        datos, 'stale' si los últimos superan `stale_after` segundos y si no 'active'
+        """
+        table = self.table.stats()
+        issued = [value for value in table['bulletins'].values() if value]
+        loaded = table['zones_with_forecast'] > 0 or table['buoys'] > 0
+        age = (datetime.now() - self.table.updated_at).total_seconds() if self.table.updated_at else None
+        if self.source == 'none':
+            state = 'simulated'
+        elif not loaded:
+            state = 'warning'
+        elif age is not None and age > self.stale_after:
+            state = 'stale'
+        else:
+            state = 'active'
+        return {
+            'status': state,
+            'source': self.source,
+            'last_bulletin': max(issued) if issued else None,
+            'zones_loaded': table['zones_with_forecast'],
+            'zones': table['zones'],
+            'buoys': table['buoys'],
+            'age_seconds': round(age) if age is not None else None,
+            'last_run': self.last_run.isoformat() if self.last_run else None
+        }
+
+    def stats(self) -> Dict:
+        stats = self.table.stats()
+        stats.update({
+            'source': self.source,
+            'running': self._task is not None and not self._task.done(),
+            'runs': self.runs,
+            'bulletins_parsed': self.parsed,
+            'bulletins_unchanged': self.unchanged,
+            'failed': self.failed,
+            'last_run': self.last_run.isoformat() if self.last_run else None,
+            'last_duration': round(self.last_duration, 3) if self.last_duration is not None else None
+        })
+        return stats
@@ -0,0 +1,266 @@
+"""
+Live weather push hub for Beach Monitor Spain
+Fans out per-beach weather deltas to Server-Sent Events subscribers when the cache changes
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from services.cache import dumps
+from services.rate_limit import BATCH, request_priority
+
+# Campos que cambian en cada lectura aunque el tiempo sea el mismo
+_VOLATILE_FIELDS = {'timestamp'}
+
+
+def diff_payload(old: Dict, new: Dict) -> Dict:
+    """
+    Devuelve solo los campos (anidados) de `new` que difieren de `old`
+    """
+    changes = {}
+    for key, value in new.items():
+        previous = old.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            nested = diff_payload(previous, value)
+            if nested:
+                changes[key] = nested
+        elif key not in old or previous != value:
+            changes[key] = value
+    return changes
+
+
+def sse_event(event: str, data: Dict) -> bytes:
+    return b'event: ' + event.encode() + b'\ndata: ' + dumps(data) + b'\n\n'
+
+
+class Subscriber:
+    """
+    Conexión SSE suscrita a un conjunto de playas
+    """
+
+    __slots__ = ('beach_ids', 'queue', 'closed')
+
+    def __init__(self, beach_ids: Tuple[int, ...], queue_size: int):
+        self.beach_ids = beach_ids
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+
+    def push(self, event: Optional[bytes]) -> bool:
+        """
+        Encola un evento; si el cliente no lo consume a tiempo se cierra la conexión
+        """
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.close()
+            return False
+
+    def close(self):
+        # El cliente (EventSource) se reconecta y recibe un snapshot nuevo
+        if self.closed:
+            return
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class WeatherPushHub:
+    """
+    Reparte los cambios de la caché meteorológica entre los suscriptores
+
+    Cada clave de caché se asocia a las playas que dependen de ella (estación
+    AEMET, centroide del grupo en OpenWeatherMap y coordenadas en marino). Al
+    cambiar una clave, sus grupos de estación se recalculan solo desde memoria
+    (sin llamar a los proveedores ni gastar cupo) tras una breve espera para
+    agrupar cambios, y cada suscriptor recibe solo los campos que han cambiado
+    en sus playas. Las tablas ingeridas que no pasan por la caché (mar,
+    rejilla) avisan con `points_changed`.
+    """
+
+    def __init__(self, manager, repository, queue_size: Optional[int] = None,
+                 debounce: Optional[float] = None, max_subscribers: Optional[int] = None):
+        self.manager = manager
+        self.repository = repository
+        self.queue_size = queue_size or int(os.getenv('PUSH_QUEUE_SIZE', 64))
+        self.debounce = debounce if debounce is not None else float(os.getenv('PUSH_DEBOUNCE', 0.5))
+        self.max_subscribers = max_subscribers or int(os.getenv('PUSH_MAX_SUBSCRIBERS', 10000))
+        self._subscribers: Dict[int, Set[Subscriber]] = {}
+        self._count = 0
+        self._last: Dict[int, Dict] = {}
+        self._dirty: Set[int] = set()
+        # Se crea en start(): en Python < 3.10 queda ligado al bucle que exista al crearlo
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._groups: Dict[int, List] = {}
+        self._key_index: Dict[Tuple, Tuple[int, ...]] = {}
+        self._point_index: Dict[Tuple, Tuple[int, ...]] = {}
+        self.publishes = 0
+        self.events_sent = 0
+        self.disconnected = 0
+        self.last_publish_seconds: Optional[float] = None
+        self._build_index()
+        manager.add_listener(self._on_cache_update)
+
+    def _build_index(self):
+        key_index: Dict[Tuple, Set[int]] = {}
+        point_index: Dict[Tuple, Set[int]] = {}
+        for beach in self.repository.all():
+            point_index.setdefault(self.manager._coord_key(beach.lat, beach.lng), set()).add(beach.id)
+        self._point_index = {key: tuple(ids) for key, ids in point_index.items()}
+        for group in self.manager.group_by_station(self.repository.all()):
+            beach_ids = [beach.id for beach in group.beaches]
+            for beach in group.beaches:
+                self._groups[beach.id] = group.beaches
+                for source in ('openweather', 'marine'):
+                    key_index.setdefault((source,) + self.manager._coord_key(beach.lat, beach.lng), set()).add(beach.id)
+            if group.station:
+                key_index.setdefault(('aemet', group.station), set()).update(beach_ids)
+            key_index.setdefault(('openweather',) + self.manager._coord_key(group.lat, group.lon), set()).update(beach_ids)
+        self._key_index = {key: tuple(ids) for key, ids in key_index.items()}
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            if self._dirty:
+                self._wakeup.set()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._wakeup = None
+        for subscribers in list(self._subscribers.values()):
+            for subscriber in subscribers:
+                subscriber.close()
+
+    def is_full(self) -> bool:
+        return self._count >= self.max_subscribers
+
+    def subscribe(self, beach_ids: Iterable[int]) -> Optional[Subscriber]:
+        """
+        Registra un suscriptor; devuelve None si se ha alcanzado el límite
+        """
+        if self.is_full():
+            return None
+        subscriber = Subscriber(tuple(beach_ids), self.queue_size)
+        for beach_id in subscriber.beach_ids:
+            self._subscribers.setdefault(beach_id, set()).add(subscriber)
+        self._count += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        for beach_id in subscriber.beach_ids:
+            subscribers = self._subscribers.get(beach_id)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[beach_id]
+        self._count -= 1
+
+    async def snapshot(self, beach_ids: Iterable[int]) -> Dict[int, Dict]:
+        """
+        Estado inicial de un suscriptor; sirve de referencia para los cambios si no había otra
+        """
+        current = await self._current(beach_ids)
+        for beach_id, payload in current.items():
+            self._last.setdefault(beach_id, payload)
+        return current
+
+    async def _current(self, beach_ids: Iterable[int]) -> Dict[int, Dict]:
+        # Tiempo actual (desde caché) calculado por grupos de estación completos;
+        # lo que falte se pide con cupo de lote
+        beach_ids = list(beach_ids)
+        with request_priority(BATCH):
+            table = await self.manager.get_station_weather_table(self._expand(beach_ids))
+        return {beach_id: table[beach_id] for beach_id in beach_ids if beach_id in table}
+
+    def _cached(self, beach_ids: Iterable[int]) -> Dict[int, Dict]:
+        # Lo mismo solo con lo que hay en memoria: publicar no debe llamar a los proveedores
+        beach_ids = list(beach_ids)
+        table = self.manager.cached_station_weather_table(self._expand(beach_ids))
+        return {beach_id: table[beach_id] for beach_id in beach_ids if beach_id in table}
+
+    def _expand(self, beach_ids: Iterable[int]) -> List:
+        # Se recalcula el grupo completo para que las claves coincidan con las del pre-calentamiento
+        beaches = {}
+        for beach_id in beach_ids:
+            for beach in self._groups.get(beach_id, ()):
+                beaches[beach.id] = beach
+        return list(beaches.values())
+
+    def _on_cache_update(self, cache_key: Tuple):
+        self._mark_dirty(self._key_index.get(cache_key, ()))
+
+    def points_changed(self, points: Iterable[Tuple[float, float]]):
+        """
+        Aviso de una tabla ingerida: han cambiado las condiciones en esos puntos (lat, lon)
+        """
+        for lat, lon in points:
+            self._mark_dirty(self._point_index.get(self.manager._coord_key(lat, lon), ()))
+
+    def _mark_dirty(self, beach_ids: Iterable[int]):
+        watched = [beach_id for beach_id in beach_ids if beach_id in self._subscribers]
+        if watched:
+            self._dirty.update(watched)
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self.debounce)
+            self._wakeup.clear()
+            dirty, self._dirty = self._dirty, set()
+            try:
+                await self.publish([beach_id for beach_id in dirty if beach_id in self._subscribers])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error publishing weather updates: {e}")
+
+    async def publish(self, beach_ids: List[int]):
+        """
+        Calcula los cambios de cada playa y los envía a sus suscriptores
+
+        Solo con los datos ya en memoria; una playa sin ellos se publica cuando llegan.
+        """
+        if not beach_ids:
+            return
+        started = time.perf_counter()
+        current = self._cached(beach_ids)
+        self.publishes += 1
+        for beach_id, payload in current.items():
+            changes = diff_payload(self._last.get(beach_id, {}), payload)
+            self._last[beach_id] = payload
+            if not changes.keys() - _VOLATILE_FIELDS:
+                continue
+
+            event = sse_event('delta', {'beach_id': beach_id, 'changes': changes})
+            for subscriber in list(self._subscribers.get(beach_id, ())):
+                if subscriber.push(event):
+                    self.events_sent += 1
+                else:
+                    self.disconnected += 1
+        self.last_publish_seconds = time.perf_counter() - started
+
+    def stats(self) -> Dict:
+        return {
+            'running': self._task is not None and not self._task.done(),
+            'subscribers': self._count,
+            'max_subscribers': self.max_subscribers,
+            'beaches_watched': len(self._subscribers),
+            'publishes': self.publishes,
+            'events_sent': self.events_sent,
+            'disconnected': self.disconnected,
+            'last_publish_ms': round(self.last_publish_seconds * 1000, 2) if self.last_publish_seconds is not None else None
+        }
@@ -0,0 +1,194 @@
+"""
+Upstream quota management for Beach Monitor Spain
+Token buckets per provider with priority classes (user-facing, batch, pre-warm)
+"""
+
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+PREWARM = 'prewarm'
+PRIORITIES = (INTERACTIVE, BATCH, PREWARM)
+
+# Prioridad de la petición en curso (las tareas creadas dentro la heredan)
+_priority: ContextVar[str] = ContextVar('upstream_priority', default=INTERACTIVE)
+
+
+# Segundos esperando cupo en la llamada upstream en curso (lista compartida con las tareas hijas)
+_quota_wait: ContextVar[Optional[List[float]]] = ContextVar('upstream_quota_wait', default=None)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+@contextmanager
+def request_priority(priority: str):
+    """
+    Marca las llamadas upstream hechas dentro del bloque con una clase de prioridad
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+@contextmanager
+def quota_wait_meter():
+    """
+    Acumula en la lista devuelta los segundos de espera de cupo dentro del bloque
+
+    Sirve para descontar de la duración de una llamada upstream la espera propia,
+    que no es latencia del proveedor.
+    """
+    waited = [0.0]
+    token = _quota_wait.set(waited)
+    try:
+        yield waited
+    finally:
+        _quota_wait.reset(token)
+
+
+class QuotaExceeded(Exception):
+    """
+    No queda cupo para la prioridad de la petición: se descarta sin llamar al proveedor
+    """
+
+    def __init__(self, message: str, priority: str = INTERACTIVE):
+        super().__init__(message)
+        self.priority = priority
+
+
+def outranks(priority: str, other: str) -> bool:
+    return PRIORITIES.index(priority) < PRIORITIES.index(other)
+
+
+@dataclass
+class QuotaConfig:
+    """
+    Cupo de un proveedor: `per_minute` peticiones HTTP con ráfagas de hasta `burst`
+
+    Cada prioridad solo puede gastar mientras queden más fichas que su reserva
+    (fracción de `burst` guardada para las clases superiores) y espera como
+    mucho `max_wait` segundos a que se repongan; si no, se descarta.
+    """
+    per_minute: float = 60.0
+    burst: float = 20.0
+    reserve_batch: float = 0.25
+    reserve_prewarm: float = 0.5
+    wait_interactive: float = 2.0
+    wait_batch: float = 5.0
+    wait_prewarm: float = 0.0
+
+    @classmethod
+    def from_env(cls, provider: str, per_minute: float, burst: float) -> 'QuotaConfig':
+        prefix = f'WEATHER_QUOTA_{provider.upper()}'
+        return cls(
+            per_minute=float(os.getenv(f'{prefix}_PER_MINUTE', per_minute)),
+            burst=float(os.getenv(f'{prefix}_BURST', burst)),
+            reserve_batch=float(os.getenv('WEATHER_QUOTA_RESERVE_BATCH', cls.reserve_batch)),
+            reserve_prewarm=float(os.getenv('WEATHER_QUOTA_RESERVE_PREWARM', cls.reserve_prewarm)),
+            wait_interactive=float(os.getenv('WEATHER_QUOTA_WAIT_INTERACTIVE', cls.wait_interactive)),
+            wait_batch=float(os.getenv('WEATHER_QUOTA_WAIT_BATCH', cls.wait_batch)),
+            wait_prewarm=float(os.getenv('WEATHER_QUOTA_WAIT_PREWARM', cls.wait_prewarm)),
+        )
+
+
+class TokenBucket:
+    """
+    Cubo de fichas compartido por todas las peticiones a un proveedor
+    """
+
+    def __init__(self, name: str, config: Optional[QuotaConfig] = None):
+        self.name = name
+        self.config = config or QuotaConfig()
+        self.rate = self.config.per_minute / 60.0
+        self.tokens = self.config.burst
+        self._updated = time.monotonic()
+        self.reserves = {
+            INTERACTIVE: 0.0,
+            BATCH: self.config.reserve_batch * self.config.burst,
+            PREWARM: self.config.reserve_prewarm * self.config.burst,
+        }
+        self.max_wait = {
+            INTERACTIVE: self.config.wait_interactive,
+            BATCH: self.config.wait_batch,
+            PREWARM: self.config.wait_prewarm,
+        }
+        self.granted = {priority: 0 for priority in PRIORITIES}
+        self.queued = {priority: 0 for priority in PRIORITIES}
+        self.shed = {priority: 0 for priority in PRIORITIES}
+        self.throttled = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.config.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, cost: float = 1.0, priority: Optional[str] = None) -> bool:
+        """
+        Gasta `cost` fichas si la prioridad lo permite, sin esperar
+        """
+        priority = priority or current_priority()
+        self._refill()
+        if self.tokens - cost >= self.reserves[priority]:
+            self.tokens -= cost
+            self.granted[priority] += 1
+            return True
+        return False
+
+    async def acquire(self, cost: float = 1.0, priority: Optional[str] = None):
+        """
+        Gasta `cost` fichas, esperando a que se repongan como mucho `max_wait` de la prioridad
+
+        Lanza QuotaExceeded si no hay cupo a tiempo.
+        """
+        priority = priority or current_priority()
+        if self.try_acquire(cost, priority):
+            return
+        started = time.monotonic()
+        deadline = started + self.max_wait[priority]
+        self.queued[priority] += 1
+        try:
+            while True:
+                wait = (cost + self.reserves[priority] - self.tokens) / self.rate if self.rate > 0 else float('inf')
+                if time.monotonic() + wait > deadline:
+                    self.shed[priority] += 1
+                    raise QuotaExceeded(f"{self.name} quota exhausted for {priority} requests", priority)
+                await asyncio.sleep(wait)
+                if self.try_acquire(cost, priority):
+                    return
+        finally:
+            waited = _quota_wait.get()
+            if waited is not None:
+                waited[0] += time.monotonic() - started
+
+    def drain(self):
+        """
+        El proveedor ha respondido 429: se vacía el cubo para frenar hasta que se reponga
+        """
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+        self.throttled += 1
+
+    def stats(self) -> Dict:
+        self._refill()
+        return {
+            'remaining': round(self.tokens, 2),
+            'burst': self.config.burst,
+            'per_minute': self.config.per_minute,
+            'available': {
+                priority: max(0, int(self.tokens - self.reserves[priority])) for priority in PRIORITIES
+            },
+            'granted': dict(self.granted),
+            'queued': dict(self.queued),
+            'shed': dict(self.shed),
+            'throttled': self.throttled
+        }
@@ -0,0 +1,304 @@
+"""
+Provider resilience for Beach Monitor Spain
+Circuit breakers with error-rate and latency thresholds and half-open probes,
+and hedged requests across providers for tail latency
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class ProviderUnavailable(Exception):
+    """
+    El proveedor no ha respondido (timeout, conexión o error 5xx/429): cuenta como fallo del circuito
+    """
+
+
+@dataclass
+class BreakerConfig:
+    """
+    Umbrales del circuito (ventana de las últimas `window` llamadas)
+    """
+    failure_rate: float = 0.5
+    slow_call_seconds: float = 3.0
+    slow_rate: float = 0.5
+    window: int = 20
+    min_calls: int = 5
+    open_seconds: float = 30.0
+    half_open_probes: int = 1
+
+    @classmethod
+    def from_env(cls) -> 'BreakerConfig':
+        return cls(
+            failure_rate=float(os.getenv('WEATHER_BREAKER_FAILURE_RATE', cls.failure_rate)),
+            slow_call_seconds=float(os.getenv('WEATHER_BREAKER_SLOW_SECONDS', cls.slow_call_seconds)),
+            slow_rate=float(os.getenv('WEATHER_BREAKER_SLOW_RATE', cls.slow_rate)),
+            window=int(os.getenv('WEATHER_BREAKER_WINDOW', cls.window)),
+            min_calls=int(os.getenv('WEATHER_BREAKER_MIN_CALLS', cls.min_calls)),
+            open_seconds=float(os.getenv('WEATHER_BREAKER_OPEN_SECONDS', cls.open_seconds)),
+            half_open_probes=int(os.getenv('WEATHER_BREAKER_HALF_OPEN_PROBES', cls.half_open_probes)),
+        )
+
+
+class CircuitBreaker:
+    """
+    Circuito por proveedor
+
+    Cerrado: se registran resultado y duración de cada llamada. Si en la ventana
+    la proporción de fallos o de llamadas lentas supera su umbral, se abre y las
+    llamadas se rechazan sin esperar. Pasado `open_seconds` pasa a semiabierto y
+    deja pasar `half_open_probes` sondas: si salen bien se cierra, si no se
+    vuelve a abrir.
+    """
+
+    def __init__(self, name: str, config: Optional[BreakerConfig] = None):
+        self.name = name
+        self.config = config or BreakerConfig()
+        self.state = CLOSED
+        self._calls: Deque[Tuple[bool, bool]] = deque(maxlen=self.config.window)
+        self._opened_at = 0.0
+        self._probes = 0
+        self.latency_ewma: Optional[float] = None
+        self.total_calls = 0
+        self.total_failures = 0
+        self.rejected = 0
+        self.opened = 0
+
+    def allow(self) -> bool:
+        """
+        Indica si se puede llamar al proveedor (en semiabierto reserva una sonda)
+        """
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.config.open_seconds:
+                self.rejected += 1
+                return False
+            self.state = HALF_OPEN
+            self._probes = 0
+        if self.state == HALF_OPEN:
+            if self._probes >= self.config.half_open_probes:
+                self.rejected += 1
+                return False
+            self._probes += 1
+        return True
+
+    def release(self):
+        """
+        Devuelve una sonda reservada que finalmente no llegó a llamar al proveedor
+        """
+        if self.state == HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def record(self, success: bool, duration: float):
+        self.total_calls += 1
+        if not success:
+            self.total_failures += 1
+        self.latency_ewma = duration if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * duration
+        slow = duration >= self.config.slow_call_seconds
+
+        if self.state == HALF_OPEN:
+            if success and not slow:
+                self._close()
+            else:
+                self._open()
+            return
+
+        self._calls.append((success, slow))
+        if len(self._calls) >= self.config.min_calls:
+            failure_rate, slow_rate = self._rates()
+            if failure_rate >= self.config.failure_rate or slow_rate >= self.config.slow_rate:
+                self._open()
+
+    def _rates(self) -> Tuple[float, float]:
+        if not self._calls:
+            return 0.0, 0.0
+        failures = sum(1 for success, _ in self._calls if not success)
+        slow = sum(1 for _, is_slow in self._calls if is_slow)
+        return failures / len(self._calls), slow / len(self._calls)
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self.opened += 1
+
+    def _close(self):
+        self.state = CLOSED
+        self._calls.clear()
+
+    def available(self) -> bool:
+        """
+        Indica, sin reservar sonda, si ahora mismo se aceptaría una llamada
+        """
+        if self.state == OPEN:
+            return time.monotonic() - self._opened_at >= self.config.open_seconds
+        if self.state == HALF_OPEN:
+            return self._probes < self.config.half_open_probes
+        return True
+
+    def stats(self) -> Dict:
+        failure_rate, slow_rate = self._rates()
+        return {
+            'state': self.state,
+            'failure_rate': round(failure_rate, 3),
+            'slow_rate': round(slow_rate, 3),
+            'latency_ewma_ms': round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+            'calls': self.total_calls,
+            'failures': self.total_failures,
+            'rejected': self.rejected,
+            'opened': self.opened
+        }
+
+
+@dataclass
+class HedgeConfig:
+    """
+    Cuándo lanzar la petición de respaldo: si el proveedor principal no ha
+    respondido en el percentil `percentile` de sus latencias recientes
+    """
+    enabled: bool = False
+    percentile: float = 0.95
+    min_delay: float = 0.05
+    initial_delay: float = 1.0
+    min_samples: int = 20
+    window: int = 200
+
+    @classmethod
+    def from_env(cls) -> 'HedgeConfig':
+        return cls(
+            enabled=os.getenv('WEATHER_HEDGE_ENABLED', 'false').lower() == 'true',
+            percentile=float(os.getenv('WEATHER_HEDGE_PERCENTILE', cls.percentile)),
+            min_delay=float(os.getenv('WEATHER_HEDGE_MIN_DELAY', cls.min_delay)),
+            initial_delay=float(os.getenv('WEATHER_HEDGE_INITIAL_DELAY', cls.initial_delay)),
+            min_samples=int(os.getenv('WEATHER_HEDGE_MIN_SAMPLES', cls.min_samples)),
+            window=int(os.getenv('WEATHER_HEDGE_WINDOW', cls.window)),
+        )
+
+
+class LatencyTracker:
+    """
+    Latencias de las últimas `window` llamadas correctas a un proveedor
+    """
+
+    def __init__(self, window: int):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._sorted: Optional[list] = None
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, duration: float):
+        self._samples.append(duration)
+        self._sorted = None
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._samples)
+        index = min(len(self._sorted) - 1, int(q * len(self._sorted)))
+        return self._sorted[index]
+
+
+class RequestHedger:
+    """
+    Peticiones con respaldo entre dos proveedores
+
+    Se llama al principal y, si no responde dentro de su percentil de latencia,
+    se lanza también el secundario; gana el primer resultado válido y el otro
+    se cancela. Si el principal responde a tiempo sin datos se pasa al
+    secundario de forma secuencial, como sin respaldo.
+    """
+
+    def __init__(self, config: Optional[HedgeConfig] = None):
+        self.config = config or HedgeConfig()
+        self._latencies: Dict[str, LatencyTracker] = {}
+        self.requests = 0
+        self.hedged = 0
+        self.primary_wins = 0
+        self.secondary_wins = 0
+        self.no_result = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.enabled
+
+    def observe(self, source: str, duration: float):
+        """
+        Registra la duración de una llamada upstream correcta
+        """
+        tracker = self._latencies.get(source)
+        if tracker is None:
+            tracker = self._latencies[source] = LatencyTracker(self.config.window)
+        tracker.record(duration)
+
+    def delay(self, source: str) -> float:
+        """
+        Espera antes de lanzar el respaldo (valor inicial hasta tener `min_samples`)
+        """
+        tracker = self._latencies.get(source)
+        if tracker is None or len(tracker) < self.config.min_samples:
+            return self.config.initial_delay
+        return max(self.config.min_delay, tracker.percentile(self.config.percentile))
+
+    async def run(self, primary: str, first: Callable[[], Awaitable],
+                  secondary: str, second: Callable[[], Awaitable]) -> Tuple[Any, Optional[str]]:
+        """
+        Devuelve (valor, proveedor) del primer resultado válido, o (None, None)
+        """
+        self.requests += 1
+        tasks = {asyncio.ensure_future(first()): primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.delay(primary))
+            if done:
+                value = self._result(done.pop(), primary)
+                if value:
+                    return value, primary
+                value = await second()
+                return (value, secondary) if value else (None, None)
+
+            self.hedged += 1
+            tasks[asyncio.ensure_future(second())] = secondary
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    value = self._result(task, tasks[task])
+                    if value:
+                        if tasks[task] == primary:
+                            self.primary_wins += 1
+                        else:
+                            self.secondary_wins += 1
+                        return value, tasks[task]
+            self.no_result += 1
+            return None, None
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def _result(self, task: asyncio.Future, source: str):
+        if task.exception() is not None:
+            print(f"Error in hedged {source} request: {task.exception()}")
+            return None
+        return task.result()
+
+    def stats(self) -> Dict:
+        return {
+            'enabled': self.config.enabled,
+            'percentile': self.config.percentile,
+            'requests': self.requests,
+            'hedged': self.hedged,
+            'hedge_rate': round(self.hedged / self.requests, 3) if self.requests else 0.0,
+            'primary_wins': self.primary_wins,
+            'secondary_wins': self.secondary_wins,
+            'no_result': self.no_result,
+            'win_rate': round(self.secondary_wins / self.hedged, 3) if self.hedged else 0.0,
+            'delay_ms': {source: round(self.delay(source) * 1000, 1) for source in self._latencies}
+        }
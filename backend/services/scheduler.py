@@ -0,0 +1,179 @@
+"""
+Background refresh scheduler for Beach Monitor Spain
+Pre-warms the weather cache for every station before users ask for it
+"""
+
+import asyncio
+import os
+import random
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from services.rate_limit import PREWARM, QuotaExceeded, request_priority
+
+
+class ProviderPacer:
+    """
+    Reparte las peticiones de un proveedor para no superar `rpm` por minuto
+    """
+
+    def __init__(self, rpm: float):
+        self.interval = 60.0 / rpm if rpm > 0 else 0.0
+        self._next_slot = 0.0
+
+    async def wait(self, cost: int = 1):
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval * cost
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class WeatherRefreshScheduler:
+    """
+    Tarea asyncio que recorre todas las estaciones del catálogo con un intervalo
+    con jitter y refresca en caché las que caducarían antes del siguiente ciclo
+    """
+
+    def __init__(self, manager, repository, interval: Optional[float] = None, jitter: Optional[float] = None):
+        self.manager = manager
+        self.repository = repository
+        self.interval = interval if interval is not None else float(os.getenv('WEATHER_PREWARM_INTERVAL', 300))
+        self.jitter = jitter if jitter is not None else float(os.getenv('WEATHER_PREWARM_JITTER', 0.1))
+        # Presupuesto por proveedor; AEMET cuesta dos peticiones por lectura (salto a 'datos')
+        self.pacers = {
+            'aemet': ProviderPacer(float(os.getenv('WEATHER_PREWARM_RPM_AEMET', 40))),
+            'openweather': ProviderPacer(float(os.getenv('WEATHER_PREWARM_RPM_OPENWEATHER', 50))),
+        }
+        self._task: Optional[asyncio.Task] = None
+        self.cycles = 0
+        self.refreshed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.shed = 0
+        self.last_cycle_started: Optional[datetime] = None
+        self.last_cycle_duration: Optional[float] = None
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        # Arranque escalonado para que varios workers no coincidan
+        await asyncio.sleep(random.uniform(0, self.interval * self.jitter))
+        while True:
+            try:
+                await self.run_cycle()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in weather prewarm cycle: {e}")
+            await asyncio.sleep(self.interval * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def _groups(self) -> List:
+        return self.manager.group_by_station(self.repository.all())
+
+    async def run_cycle(self):
+        """
+        Recorre todas las estaciones (en orden aleatorio) y las playas para datos marinos
+        """
+        started = time.monotonic()
+        self.last_cycle_started = datetime.now()
+        # Se refresca lo que caducaría antes del próximo ciclo
+        horizon = self.interval * (1 + self.jitter)
+
+        groups = self._groups()
+        random.shuffle(groups)
+        # El pre-calentamiento usa el cupo de menor prioridad y cede ante usuarios y lotes
+        with request_priority(PREWARM):
+            for group in groups:
+                # Las playas que la rejilla ya cubre no necesitan proveedor atmosférico
+                if not all(self.manager.grid_weather(beach.lat, beach.lng, primary_only=True)
+                           for beach in group.beaches):
+                    await self._refresh_group(group, horizon)
+                for beach in group.beaches:
+                    # Los datos marítimos ingeridos no pasan por la caché
+                    if self.manager.marine.lookup(beach.lat, beach.lng):
+                        continue
+                    remaining = self.manager.cache_remaining('marine', beach.lat, beach.lng)
+                    if remaining is None or remaining < horizon:
+                        await self.manager.refresh('marine', beach.lat, beach.lng, min_remaining=horizon)
+
+        self.cycles += 1
+        self.last_cycle_duration = time.monotonic() - started
+
+    async def _refresh_group(self, group, horizon: float):
+        for source in self.manager.provider_order():
+            if source == 'aemet' and not group.station:
+                continue
+            remaining = self.manager.cache_remaining(source, group.lat, group.lon, group.station)
+            if remaining is not None and remaining >= horizon:
+                self.skipped += 1
+                return
+
+            await self.pacers[source].wait(cost=2 if source == 'aemet' else 1)
+            try:
+                value = await self.manager.refresh(
+                    source, group.lat, group.lon, group.station, group.fallback_stations, group.municipality_code,
+                    min_remaining=horizon
+                )
+            except QuotaExceeded:
+                # Sin cupo de pre-calentamiento: se deja para el siguiente ciclo
+                self.shed += 1
+                value = None
+            except Exception as e:
+                print(f"Error prewarming {source} for {group.key}: {e}")
+                value = None
+            if value is not None:
+                self.refreshed += 1
+                return
+        self.failed += 1
+
+    def stats(self) -> Dict:
+        """
+        Métricas de cobertura (estaciones con datos frescos) y retraso
+        """
+        groups = self._groups()
+        fresh = 0
+        max_age = 0.0
+        lag = 0.0
+        for group in groups:
+            best = None
+            for source in ('aemet', 'openweather'):
+                remaining = self.manager.cache_remaining(source, group.lat, group.lon, group.station)
+                if remaining is not None and (best is None or remaining > best[0]):
+                    best = (remaining, self.manager.cache_ttls[source])
+            if best is None:
+                continue
+            remaining, ttl = best
+            max_age = max(max_age, ttl - remaining)
+            if remaining > 0:
+                fresh += 1
+            else:
+                lag = max(lag, -remaining)
+
+        return {
+            'running': self._task is not None and not self._task.done(),
+            'interval_seconds': self.interval,
+            'stations': len(groups),
+            'coverage': round(fresh / len(groups), 3) if groups else 0.0,
+            'max_age_seconds': round(max_age, 1),
+            'lag_seconds': round(lag, 1),
+            'cycles': self.cycles,
+            'refreshed': self.refreshed,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'shed': self.shed,
+            'last_cycle_started': self.last_cycle_started.isoformat() if self.last_cycle_started else None,
+            'last_cycle_duration': round(self.last_cycle_duration, 3) if self.last_cycle_duration is not None else None
+        }
@@ -0,0 +1,139 @@
+"""
+Response models for Beach Monitor Spain
+Typed Pydantic schemas of the weather payloads served by the API (OpenAPI documentation)
+
+The endpoints build these payloads from trusted internal data and return them
+already serialized, so FastAPI does not re-validate them against the models.
+"""
+
+from typing import Dict, List, Optional, Union
+
+from pydantic import BaseModel
+
+
+class Coordinates(BaseModel):
+    lat: float
+    lng: float
+
+
+class Temperature(BaseModel):
+    air: Optional[float] = None
+    water: Optional[float] = None
+    feels_like: Optional[float] = None
+
+
+class Wind(BaseModel):
+    speed: Optional[float] = None
+    direction: Optional[str] = None
+    gusts: Optional[float] = None
+
+
+class Waves(BaseModel):
+    height: Optional[float] = None
+    period: Optional[float] = None
+    direction: Optional[str] = None
+
+
+class WeatherPayload(BaseModel):
+    temperature: Temperature
+    wind: Wind
+    waves: Waves
+    conditions: Optional[str] = None
+    humidity: Optional[float] = None
+    pressure: Optional[float] = None
+    visibility: Optional[float] = None
+    uv_index: Optional[float] = None
+    timestamp: str
+    source: Optional[str] = None
+    missing: List[str] = []
+
+
+class BeachWeather(WeatherPayload):
+    beach_id: int
+    coordinates: Optional[Coordinates] = None
+
+
+class BeachWeatherError(BaseModel):
+    beach_id: int
+    error: str
+
+
+class BatchWeather(BaseModel):
+    beaches: List[Union[BeachWeather, BeachWeatherError]]
+    total: int
+
+
+class ProvinceBeachesWeather(BaseModel):
+    province_id: int
+    beaches: List[BeachWeather]
+    total: int
+    stations: int
+
+
+class MetricSummary(BaseModel):
+    mean: Optional[float] = None
+    min: Optional[float] = None
+    max: Optional[float] = None
+    beaches: int
+
+
+class WorstWaves(BaseModel):
+    beach_id: int
+    height: float
+
+
+class AlertCounts(BaseModel):
+    thresholds: Dict[str, float]
+    by_metric: Dict[str, int]
+    beaches: int
+
+
+class ProvinceWeatherSummary(BaseModel):
+    province_id: int
+    province_name: str
+    beaches: int
+    beaches_with_data: int
+    metrics: Dict[str, MetricSummary]
+    worst_waves: Optional[WorstWaves] = None
+    alerts: AlertCounts
+    sources: Dict[str, int]
+    timestamp: Optional[str] = None
+
+
+class DailyForecast(BaseModel):
+    date: str
+    temperature_max: Optional[float] = None
+    temperature_min: Optional[float] = None
+    feels_like_max: Optional[float] = None
+    feels_like_min: Optional[float] = None
+    humidity_max: Optional[float] = None
+    humidity_min: Optional[float] = None
+    precipitation_probability: Optional[float] = None
+    wind_speed: Optional[float] = None
+    gusts: Optional[float] = None
+    uv_index: Optional[float] = None
+    wind_direction: Optional[str] = None
+    conditions: Optional[str] = None
+
+
+class HourlyForecast(BaseModel):
+    time: str
+    temperature: Optional[float] = None
+    feels_like: Optional[float] = None
+    humidity: Optional[float] = None
+    precipitation: Optional[float] = None
+    precipitation_probability: Optional[float] = None
+    wind_speed: Optional[float] = None
+    gusts: Optional[float] = None
+    wind_direction: Optional[str] = None
+    conditions: Optional[str] = None
+
+
+class BeachForecast(BaseModel):
+    beach_id: int
+    municipality_code: str
+    municipality: Optional[str] = None
+    issued: Dict[str, Optional[str]]
+    daily: List[DailyForecast]
+    hourly: List[HourlyForecast]
+    source: str
@@ -0,0 +1,147 @@
+"""
+Spatial index for Beach Monitor Spain
+Uniform lat/lng grid for nearest, radius and bounding-box queries
+"""
+
+import math
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Distancia ortodrómica en km entre dos puntos
+    """
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GridIndex:
+    """
+    Índice espacial de celdas de `cell_deg` grados
+
+    Cada celda guarda los puntos (lat, lng, item) que caen en ella; las consultas
+    solo recorren las celdas que pueden contener resultados.
+    """
+
+    def __init__(self, cell_deg: float = 0.25):
+        self.cell_deg = cell_deg
+        self._cells: Dict[Tuple[int, int], List[Tuple[float, float, Any]]] = {}
+        self._size = 0
+        self._bounds: Optional[List[int]] = None  # [min_row, min_col, max_row, max_col]
+
+    @classmethod
+    def build(cls, points: Iterable[Tuple[Any, float, float]], cell_deg: float = 0.25) -> 'GridIndex':
+        index = cls(cell_deg)
+        for item, lat, lng in points:
+            index.insert(item, lat, lng)
+        return index
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg))
+
+    def insert(self, item: Any, lat: float, lng: float):
+        row, col = self._cell(lat, lng)
+        self._cells.setdefault((row, col), []).append((lat, lng, item))
+        self._size += 1
+        if self._bounds is None:
+            self._bounds = [row, col, row, col]
+        else:
+            bounds = self._bounds
+            bounds[0] = min(bounds[0], row)
+            bounds[1] = min(bounds[1], col)
+            bounds[2] = max(bounds[2], row)
+            bounds[3] = max(bounds[3], col)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def bbox(self, min_lat: float, min_lng: float, max_lat: float, max_lng: float) -> List[Any]:
+        """
+        Elementos dentro del rectángulo (sin cruzar el antimeridiano)
+        """
+        min_row, min_col = self._cell(min_lat, min_lng)
+        max_row, max_col = self._cell(max_lat, max_lng)
+        if self._bounds is not None:
+            min_row, min_col = max(min_row, self._bounds[0]), max(min_col, self._bounds[1])
+            max_row, max_col = min(max_row, self._bounds[2]), min(max_col, self._bounds[3])
+
+        results = []
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                for lat, lng, item in self._cells.get((row, col), ()):
+                    if min_lat <= lat <= max_lat and min_lng <= lng <= max_lng:
+                        results.append(item)
+        return results
+
+    def within(self, lat: float, lng: float, radius_km: float) -> List[Tuple[float, Any]]:
+        """
+        Elementos a menos de `radius_km`, ordenados por distancia: [(km, item)]
+        """
+        dlat = radius_km / KM_PER_DEGREE
+        dlng = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(min(89.0, abs(lat) + dlat))), 1e-6))
+        results = []
+        for row in range(math.floor((lat - dlat) / self.cell_deg), math.floor((lat + dlat) / self.cell_deg) + 1):
+            for col in range(math.floor((lng - dlng) / self.cell_deg), math.floor((lng + dlng) / self.cell_deg) + 1):
+                for plat, plng, item in self._cells.get((row, col), ()):
+                    distance = haversine_km(lat, lng, plat, plng)
+                    if distance <= radius_km:
+                        results.append((distance, item))
+        results.sort(key=lambda pair: pair[0])
+        return results
+
+    def nearest(self, lat: float, lng: float, k: int = 1,
+                max_radius_km: Optional[float] = None) -> List[Tuple[float, Any]]:
+        """
+        Los `k` elementos más cercanos, ordenados por distancia: [(km, item)]
+
+        Recorre anillos de celdas alrededor del punto y se detiene en cuanto
+        ninguna celda sin visitar puede contener un candidato más cercano.
+        """
+        if self._bounds is None or k <= 0:
+            return []
+
+        center_row, center_col = self._cell(lat, lng)
+        min_row, min_col, max_row, max_col = self._bounds
+        max_ring = max(abs(center_row - min_row), abs(center_row - max_row),
+                       abs(center_col - min_col), abs(center_col - max_col))
+
+        candidates: List[Tuple[float, Any]] = []
+        for ring in range(max_ring + 1):
+            for row, col in self._ring_cells(center_row, center_col, ring):
+                for plat, plng, item in self._cells.get((row, col), ()):
+                    candidates.append((haversine_km(lat, lng, plat, plng), item))
+
+            # Distancia mínima a cualquier celda fuera del anillo actual
+            lat_edge = min(89.0, abs(lat) + (ring + 1) * self.cell_deg)
+            reach_km = ring * self.cell_deg * KM_PER_DEGREE * math.cos(math.radians(lat_edge))
+            if max_radius_km is not None and reach_km > max_radius_km:
+                break
+            if len(candidates) >= k:
+                candidates.sort(key=lambda pair: pair[0])
+                del candidates[k:]
+                if candidates[-1][0] <= reach_km:
+                    break
+
+        candidates.sort(key=lambda pair: pair[0])
+        if max_radius_km is not None:
+            candidates = [pair for pair in candidates if pair[0] <= max_radius_km]
+        return candidates[:k]
+
+    @staticmethod
+    def _ring_cells(row: int, col: int, ring: int) -> Iterable[Tuple[int, int]]:
+        if ring == 0:
+            yield (row, col)
+            return
+        for c in range(col - ring, col + ring + 1):
+            yield (row - ring, c)
+            yield (row + ring, c)
+        for r in range(row - ring + 1, row + ring):
+            yield (r, col - ring)
+            yield (r, col + ring)
@@ -0,0 +1,70 @@
+"""
+AEMET station inventory for Beach Monitor Spain
+Loads the station list from a local file and resolves the nearest stations to a point
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from services.spatial import GridIndex
+
+DEFAULT_STATIONS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'aemet_stations.json'
+)
+
+
+class Station:
+    """
+    Estación de observación convencional de AEMET
+    """
+
+    __slots__ = ('id', 'name', 'province', 'lat', 'lng')
+
+    def __init__(self, data: Dict):
+        self.id = data['id']
+        self.name = data['name']
+        self.province = data.get('province', '')
+        self.lat = float(data['lat'])
+        self.lng = float(data['lng'])
+
+    def to_dict(self) -> Dict:
+        return {'id': self.id, 'name': self.name, 'province': self.province, 'lat': self.lat, 'lng': self.lng}
+
+
+class StationInventory:
+    """
+    Inventario de estaciones AEMET indexado espacialmente
+    """
+
+    def __init__(self, stations: List[Station], version: str = '', modified_at: Optional[datetime] = None):
+        self.version = version
+        self.modified_at = modified_at
+        self._by_id: Dict[str, Station] = {station.id: station for station in stations}
+        self.spatial = GridIndex.build(((station, station.lat, station.lng) for station in stations), cell_deg=0.5)
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> 'StationInventory':
+        """
+        Carga el inventario (AEMET_STATIONS_PATH o data/aemet_stations.json)
+        """
+        path = path or os.getenv('AEMET_STATIONS_PATH', DEFAULT_STATIONS_PATH)
+        with open(path, 'rb') as f:
+            raw = f.read()
+        data = json.loads(raw)
+        return cls(
+            [Station(item) for item in data.get('stations', [])],
+            version=hashlib.sha1(raw).hexdigest()[:12],
+            modified_at=datetime.fromtimestamp(os.path.getmtime(path), timezone.utc)
+        )
+
+    def get(self, station_id: str) -> Optional[Station]:
+        return self._by_id.get(station_id)
+
+    def nearest(self, lat: float, lng: float, k: int = 3) -> List[Tuple[float, Station]]:
+        return self.spatial.nearest(lat, lng, k)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
@@ -0,0 +1,107 @@
+"""
+Province weather summary for Beach Monitor Spain
+Aggregates the cached weather of every member beach into one vectorized summary
+"""
+
+import os
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# Métricas agregadas, en el orden de columnas de `_metric_row`
+SUMMARY_METRICS = ('air_temperature', 'water_temperature', 'wind_speed', 'wave_height', 'uv_index')
+
+# Umbrales de aviso por métrica (una playa cuenta si los supera)
+ALERT_THRESHOLDS: Dict[str, float] = {
+    'air_temperature': float(os.getenv('SUMMARY_ALERT_AIR_TEMPERATURE', 35)),
+    'wind_speed': float(os.getenv('SUMMARY_ALERT_WIND_SPEED', 40)),
+    'wave_height': float(os.getenv('SUMMARY_ALERT_WAVE_HEIGHT', 2.0)),
+    'uv_index': float(os.getenv('SUMMARY_ALERT_UV_INDEX', 8)),
+}
+
+_WAVE_COLUMN = SUMMARY_METRICS.index('wave_height')
+_EMPTY: Dict = {}
+
+
+def has_atmospheric_data(payload: Dict) -> bool:
+    """
+    True si los datos atmosféricos son reales (no el respaldo con valores fijos)
+    """
+    return payload.get('source') != 'Fallback' and 'atmospheric' not in (payload.get('missing') or ())
+
+
+def _metric_row(payload: Dict) -> Tuple:
+    # None se convierte en NaN al crear el array; los componentes que no llegaron
+    # (`missing`) llevan valores por defecto y tampoco cuentan
+    missing = payload.get('missing') or ()
+    atmospheric = has_atmospheric_data(payload)
+    marine = 'marine' not in missing
+    temperature = payload.get('temperature') or _EMPTY
+    return (
+        temperature.get('air') if atmospheric else None,
+        temperature.get('water') if marine else None,
+        (payload.get('wind') or _EMPTY).get('speed') if atmospheric else None,
+        (payload.get('waves') or _EMPTY).get('height') if marine else None,
+        payload.get('uv_index') if atmospheric and 'uv_index' not in missing else None,
+    )
+
+
+def summarize_beaches(payloads: Dict[int, Dict], thresholds: Optional[Dict[str, float]] = None) -> Dict:
+    """
+    Resume el tiempo de varias playas ({beach_id: datos}) en una sola pasada vectorizada
+
+    Devuelve media, mínimo y máximo de cada métrica, la playa con mayor oleaje y
+    cuántas playas superan cada umbral de aviso. Los valores ausentes no cuentan,
+    ni los de respaldo: `beaches_with_data` solo cuenta playas con datos
+    atmosféricos reales.
+    """
+    thresholds = ALERT_THRESHOLDS if thresholds is None else thresholds
+    beach_ids = np.fromiter(payloads.keys(), dtype=np.int64, count=len(payloads))
+    values = np.array(
+        [_metric_row(payload) for payload in payloads.values()], dtype=np.float64
+    ).reshape(len(payloads), len(SUMMARY_METRICS))
+
+    present = ~np.isnan(values)
+    counts = present.sum(axis=0)
+    sums = np.where(present, values, 0.0).sum(axis=0)
+    # Solo se reducen los valores presentes; una columna sin datos queda en ±inf
+    mins = np.fmin.reduce(values, axis=0, initial=np.inf, where=present)
+    maxs = np.fmax.reduce(values, axis=0, initial=-np.inf, where=present)
+
+    limits = np.array([thresholds.get(name, np.inf) for name in SUMMARY_METRICS], dtype=np.float64)
+    over = present & (np.where(present, values, -np.inf) > limits)
+
+    metrics = {}
+    for m, name in enumerate(SUMMARY_METRICS):
+        count = int(counts[m])
+        metrics[name] = {
+            'mean': round(float(sums[m] / count), 2) if count else None,
+            'min': float(mins[m]) if count else None,
+            'max': float(maxs[m]) if count else None,
+            'beaches': count,
+        }
+
+    worst_waves = None
+    if counts[_WAVE_COLUMN]:
+        waves = np.where(present[:, _WAVE_COLUMN], values[:, _WAVE_COLUMN], -np.inf)
+        worst = int(np.argmax(waves))
+        worst_waves = {'beach_id': int(beach_ids[worst]), 'height': float(waves[worst])}
+
+    sources: Dict[str, int] = {}
+    with_data = 0
+    for payload in payloads.values():
+        source = payload.get('source') or 'unknown'
+        sources[source] = sources.get(source, 0) + 1
+        with_data += has_atmospheric_data(payload)
+
+    return {
+        'beaches_with_data': with_data,
+        'metrics': metrics,
+        'worst_waves': worst_waves,
+        'alerts': {
+            'thresholds': {name: thresholds[name] for name in SUMMARY_METRICS if name in thresholds},
+            'by_metric': {name: int(over[:, m].sum()) for m, name in enumerate(SUMMARY_METRICS) if name in thresholds},
+            'beaches': int(over.any(axis=1).sum()),
+        },
+        'sources': sources,
+    }
@@ -4,17 +4,185 @@ Integrates with AEMET and OpenWeatherMap APIs for real-time weather data
 """
 
 import os
+import time
 import requests
 import asyncio
 import aiohttp
-from typing import Dict, Optional, List
-from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, List, Tuple
+from datetime import datetime, timezone
 import json
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
 from dotenv import load_dotenv
+from services.cache import RedisCacheTier, TTLCache
+from services.rate_limit import (PREWARM, QuotaConfig, QuotaExceeded, TokenBucket, current_priority, outranks,
+                                 quota_wait_meter, request_priority)
+from services.resilience import BreakerConfig, CircuitBreaker, HedgeConfig, ProviderUnavailable, RequestHedger
 
 load_dotenv()
 
+@dataclass
+class HTTPClientConfig:
+    """
+    Configuración del pool de conexiones HTTP compartido por cada proveedor
+    """
+    limit: int = 100
+    limit_per_host: int = 20
+    keepalive_timeout: float = 30.0
+    dns_cache_ttl: int = 300
+    connect_timeout: float = 3.0
+    read_timeout: float = 5.0
+    total_timeout: float = 10.0
+    # Tiempo máximo por componente de la respuesta (atmosférico, UV, marítimo)
+    atmospheric_timeout: float = 10.0
+    uv_timeout: float = 2.0
+    marine_timeout: float = 3.0
+
+    @classmethod
+    def from_env(cls) -> 'HTTPClientConfig':
+        return cls(
+            limit=int(os.getenv('WEATHER_HTTP_LIMIT', cls.limit)),
+            limit_per_host=int(os.getenv('WEATHER_HTTP_LIMIT_PER_HOST', cls.limit_per_host)),
+            keepalive_timeout=float(os.getenv('WEATHER_HTTP_KEEPALIVE', cls.keepalive_timeout)),
+            dns_cache_ttl=int(os.getenv('WEATHER_HTTP_DNS_TTL', cls.dns_cache_ttl)),
+            connect_timeout=float(os.getenv('WEATHER_HTTP_CONNECT_TIMEOUT', cls.connect_timeout)),
+            read_timeout=float(os.getenv('WEATHER_HTTP_READ_TIMEOUT', cls.read_timeout)),
+            total_timeout=float(os.getenv('WEATHER_HTTP_TOTAL_TIMEOUT', cls.total_timeout)),
+            atmospheric_timeout=float(os.getenv('WEATHER_TIMEOUT_ATMOSPHERIC', cls.atmospheric_timeout)),
+            uv_timeout=float(os.getenv('WEATHER_TIMEOUT_UV', cls.uv_timeout)),
+            marine_timeout=float(os.getenv('WEATHER_TIMEOUT_MARINE', cls.marine_timeout)),
+        )
+
+    def client_timeout(self) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(
+            total=self.total_timeout, sock_connect=self.connect_timeout, sock_read=self.read_timeout
+        )
+
+def encode_cached_value(value):
+    """
+    Serializa un valor de caché (WeatherData o dict marino) para Redis
+    """
+    if isinstance(value, WeatherData):
+        data = dict(value.__dict__)
+        data['timestamp'] = value.timestamp.isoformat()
+        return {'weather': data}
+    return {'raw': value}
+
+def decode_cached_value(payload):
+    if 'weather' in payload:
+        data = dict(payload['weather'])
+        data['timestamp'] = datetime.fromisoformat(data['timestamp'])
+        data['missing'] = tuple(data.get('missing', ()))
+        return WeatherData(**data)
+    return payload['raw']
+
+@dataclass
+class StationGroup:
+    """
+    Playas que comparten estación AEMET y el punto con el que se consultan
+    """
+    key: Hashable
+    station: Optional[str]
+    lat: float
+    lon: float
+    fallback_stations: Tuple[str, ...]
+    municipality_code: Optional[str]
+    beaches: List
+
+class SingleFlight:
+    """
+    Agrupa peticiones concurrentes con la misma clave en una única llamada upstream
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.executions = 0
+
+    async def do(self, key: Hashable, fetcher: Callable[[], Awaitable]):
+        """
+        Ejecuta `fetcher` salvo que ya haya una llamada en curso para `key`,
+        en cuyo caso espera su resultado
+        """
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fetcher())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        # shield: cancelar a un llamante no cancela la petición compartida
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # evita avisos de excepción no recuperada
+
+    def stats(self) -> Dict:
+        coalesced = self.calls - self.executions
+        return {
+            'calls': self.calls,
+            'upstream_calls': self.executions,
+            'coalesced': coalesced,
+            'in_flight': len(self._inflight),
+            'coalescing_ratio': round(coalesced / self.calls, 3) if self.calls else 0.0
+        }
+
+class PooledHTTPService:
+    """
+    Base para servicios que reutilizan una sesión aiohttp de larga duración
+    """
+
+    session: Optional[aiohttp.ClientSession] = None
+    timeout: aiohttp.ClientTimeout = HTTPClientConfig().client_timeout()
+    # Cupo de peticiones del proveedor (compartido por todas las peticiones)
+    quota: Optional[TokenBucket] = None
+
+    async def open_session(self, config: HTTPClientConfig):
+        """
+        Abre la sesión compartida (debe llamarse con el event loop en marcha)
+        """
+        if self.session is not None and not self.session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=config.limit,
+            limit_per_host=config.limit_per_host,
+            keepalive_timeout=config.keepalive_timeout,
+            ttl_dns_cache=config.dns_cache_ttl,
+            use_dns_cache=True,
+        )
+        self.timeout = config.client_timeout()
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def close_session(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    async def _spend(self, cost: int = 1):
+        """
+        Gasta cupo antes de una petición HTTP (QuotaExceeded si no queda para su prioridad)
+        """
+        if self.quota is not None:
+            await self.quota.acquire(cost)
+
+    def _throttled(self):
+        if self.quota is not None:
+            self.quota.drain()
+
+    @asynccontextmanager
+    async def _session_scope(self):
+        """
+        Devuelve la sesión compartida o, si no se ha abierto, una temporal
+        """
+        if self.session is not None and not self.session.closed:
+            yield self.session
+        else:
+            async with aiohttp.ClientSession(timeout=self.timeout) as session:
+                yield session
+
 @dataclass
 class WeatherData:
     temperature_air: float
@@ -28,8 +196,10 @@ class WeatherData:
     conditions: str
     pressure: float
     timestamp: datetime
+    # Componentes que no llegaron a tiempo (p. ej. 'uv_index')
+    missing: Tuple[str, ...] = ()
 
-class AEMETService:
+class AEMETService(PooledHTTPService):
     """
     Servicio para integrar con la API de AEMET (Agencia Estatal de Meteorología)
     """
@@ -37,82 +207,111 @@ class AEMETService:
     def __init__(self):
         self.api_key = os.getenv('AEMET_API_KEY')
         self.base_url = 'https://opendata.aemet.es/opendata/api'
+        # ForecastStore que recibe la predicción municipal completa cuando se descarga aquí
+        self.forecasts = None
         
-    async def get_coastal_weather(self, province_code: str) -> Optional[WeatherData]:
+    async def get_coastal_weather(self, province_code: str, fallback_stations: Tuple[str, ...] = (),
+                                  municipality_code: Optional[str] = None) -> Optional[WeatherData]:
         """
         Obtiene datos meteorológicos costeros de AEMET
+
+        Si la estación no existe (404) se prueban en orden `fallback_stations`
+        (las siguientes más cercanas) y, por último, la predicción del municipio.
+        Lanza ProviderUnavailable si AEMET no responde (timeout, conexión, 5xx/429).
         """
         if not self.api_key:
             print("Warning: AEMET API key not configured")
             return None
             
         try:
-            async with aiohttp.ClientSession() as session:
-                # Usamos el endpoint de observación convencional más reciente
-                url = f"{self.base_url}/observacion/convencional/datos/estacion/{province_code}"
-                headers = {'api_key': self.api_key}
-                
-                async with session.get(url, headers=headers) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if 'datos' in data:
-                            # Obtenemos los datos reales con content-type específico
-                            datos_url = data['datos']
-                            async with session.get(datos_url) as data_response:
-                                if data_response.status == 200:
-                                    # AEMET puede devolver text/plain, manejamos ambos casos
-                                    try:
-                                        weather_data = await data_response.json()
-                                        return self._parse_aemet_data(weather_data)
-                                    except:
-                                        # Si no es JSON válido, usamos texto
-                                        text_data = await data_response.text()
-                                        try:
-                                            import json
-                                            weather_data = json.loads(text_data)
-                                            return self._parse_aemet_data(weather_data)
-                                        except:
-                                            print(f"AEMET data parsing error for station {province_code}")
-                                            return None
-                        else:
-                            print(f"AEMET API response missing 'datos' field")
+            async with self._session_scope() as session:
+                for station in (province_code,) + tuple(s for s in fallback_stations if s != province_code):
+                    # Usamos el endpoint de observación convencional más reciente
+                    url = f"{self.base_url}/observacion/convencional/datos/estacion/{station}"
+                    status, weather_data = await self._fetch_datos(session, url)
+                    
+                    if status == 200 and weather_data:
+                        try:
+                            return self._parse_aemet_data(weather_data)
+                        except (TypeError, ValueError, KeyError, IndexError):
+                            print(f"AEMET data parsing error for station {station}")
                             return None
-                    elif response.status == 404:
-                        print(f"AEMET station {province_code} not found, trying alternative")
-                        # Intentar con estación alternativa o datos generales
-                        return await self._get_alternative_aemet_data(session)
+                    elif status == 404:
+                        print(f"AEMET station {station} not found, trying next nearest")
+                    elif status >= 500 or status == 429:
+                        if status == 429:
+                            self._throttled()
+                        raise ProviderUnavailable(f"AEMET API error: {status}")
                     else:
-                        print(f"AEMET API error: {response.status}")
+                        print(f"AEMET API error: {status}")
                         return None
+                
+                # Ninguna estación cercana tiene datos: predicción del municipio
+                if municipality_code:
+                    return await self._get_alternative_aemet_data(session, municipality_code)
+                return None
                         
+        except (ProviderUnavailable, QuotaExceeded):
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise ProviderUnavailable(f"AEMET unreachable: {e!r}") from e
         except Exception as e:
             print(f"Error fetching AEMET data: {e}")
             return None
     
-    async def _get_alternative_aemet_data(self, session: aiohttp.ClientSession) -> Optional[WeatherData]:
+    async def _fetch_datos(self, session: aiohttp.ClientSession, url: str) -> Tuple[int, Optional[List[Dict]]]:
+        """
+        Petición en dos pasos de AEMET OpenData: la respuesta trae la URL 'datos' con el contenido
+
+        Devuelve (estado, datos). AEMET a veces indica el error en el campo 'estado'
+        del cuerpo con HTTP 200, así que se usa ese valor cuando está presente.
+        El cupo de los dos saltos se reserva de una vez.
+        """
+        await self._spend(cost=2)
+        headers = {'api_key': self.api_key}
+        async with session.get(url, headers=headers) as response:
+            if response.status != 200:
+                return response.status, None
+            data = await response.json(content_type=None)
+        
+        if 'datos' not in data:
+            status = int(data.get('estado', 0) or 0)
+            if status != 404:
+                print(f"AEMET API response missing 'datos' field")
+            return status, None
+        
+        async with session.get(data['datos']) as data_response:
+            if data_response.status != 200:
+                return data_response.status, None
+            # AEMET puede devolver text/plain (ISO-8859-15), así que parseamos el texto
+            text_data = await data_response.text()
+            try:
+                return 200, json.loads(text_data)
+            except ValueError:
+                print(f"AEMET data parsing error for {url}")
+                return 200, None
+    
+    async def _get_alternative_aemet_data(self, session: aiohttp.ClientSession,
+                                          municipality_code: str) -> Optional[WeatherData]:
         """
         Obtiene datos meteorológicos generales cuando la estación específica no está disponible
         """
         try:
             # Usar el endpoint de predicción por municipios como alternativa
-            url = f"{self.base_url}/prediccion/especifica/municipio/diaria/29067"  # Málaga como ejemplo
-            headers = {'api_key': self.api_key}
-            
-            async with session.get(url, headers=headers) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if 'datos' in data:
-                        async with session.get(data['datos']) as data_response:
-                            if data_response.status == 200:
-                                try:
-                                    pred_data = await data_response.json()
-                                    return self._parse_aemet_prediction_data(pred_data)
-                                except:
-                                    text_data = await data_response.text()
-                                    import json
-                                    pred_data = json.loads(text_data)
-                                    return self._parse_aemet_prediction_data(pred_data)
+            url = f"{self.base_url}/prediccion/especifica/municipio/diaria/{municipality_code}"
+            status, pred_data = await self._fetch_datos(session, url)
+            if status == 200 and pred_data:
+                # La respuesta trae la predicción de toda la semana: se guarda para /forecast
+                if self.forecasts is not None:
+                    self.forecasts.update(municipality_code, daily=pred_data)
+                return self._parse_aemet_prediction_data(pred_data)
+            if status >= 500 or status == 429:
+                if status == 429:
+                    self._throttled()
+                raise ProviderUnavailable(f"AEMET API error: {status}")
             return None
+        except (ProviderUnavailable, QuotaExceeded, aiohttp.ClientError, asyncio.TimeoutError):
+            raise
         except Exception as e:
             print(f"Error fetching alternative AEMET data: {e}")
             return None
@@ -205,8 +404,19 @@ class AEMETService:
             uv_index=0,  # No disponible en datos básicos
             conditions=self._translate_weather_state(latest.get('prec', '')),
             pressure=float(latest.get('pres', 0)),
-            timestamp=datetime.now()
+            timestamp=self._observation_time(latest.get('fint'))
         )
+
+    @staticmethod
+    def _observation_time(fint: Optional[str]) -> datetime:
+        """
+        Hora local (sin zona) de la observación: 'fint' de AEMET, en UTC; la actual si no viene
+        """
+        try:
+            observed = datetime.strptime(str(fint)[:19], '%Y-%m-%dT%H:%M:%S')
+        except ValueError:
+            return datetime.now()
+        return observed.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
     
     def _translate_weather_state(self, state: str) -> str:
         """
@@ -222,26 +432,37 @@ class AEMETService:
         }
         return translations.get(state, 'Despejado')
 
-class OpenWeatherMapService:
+class OpenWeatherMapService(PooledHTTPService):
     """
     Servicio para integrar con OpenWeatherMap API como alternativa
     """
     
     def __init__(self):
         self.api_key = os.getenv('OPENWEATHER_API_KEY')
+        self.uv_timeout = HTTPClientConfig.uv_timeout
         self.base_url = 'https://api.openweathermap.org/data/2.5'
         
     async def get_weather_by_coordinates(self, lat: float, lon: float) -> Optional[WeatherData]:
         """
         Obtiene datos meteorológicos por coordenadas
+
+        El índice UV se pide a la vez que el tiempo actual y se espera como mucho
+        `uv_timeout`; si no llega, se marca en `missing`.
+        Lanza ProviderUnavailable si OpenWeatherMap no responde (timeout, conexión, 5xx/429).
         """
         if not self.api_key:
             print("Warning: OpenWeatherMap API key not configured")
             return None
             
+        uv_task = None
         try:
-            async with aiohttp.ClientSession() as session:
+            async with self._session_scope() as session:
+                # Índice UV en paralelo (no depende del tiempo actual)
+                uv_task = asyncio.ensure_future(self._get_uv_index(session, lat, lon))
+                uv_deadline = time.monotonic() + self.uv_timeout
+
                 # Datos actuales
+                await self._spend()
                 current_url = f"{self.base_url}/weather"
                 params = {
                     'lat': lat,
@@ -255,23 +476,41 @@ class OpenWeatherMapService:
                     if response.status == 200:
                         data = await response.json()
                         
-                        # También obtenemos datos UV
-                        uv_data = await self._get_uv_index(session, lat, lon)
+                        try:
+                            uv_data = await asyncio.wait_for(uv_task, max(0.0, uv_deadline - time.monotonic()))
+                        except asyncio.TimeoutError:
+                            print(f"Timeout getting UV index for {lat}, {lon}")
+                            uv_data = None
                         
-                        return self._parse_openweather_data(data, uv_data)
+                        weather = self._parse_openweather_data(data, uv_data)
+                        if uv_data is None:
+                            weather.missing = ('uv_index',)
+                        return weather
+                    elif response.status >= 500 or response.status == 429:
+                        if response.status == 429:
+                            self._throttled()
+                        raise ProviderUnavailable(f"OpenWeatherMap API error: {response.status}")
                     else:
                         print(f"OpenWeatherMap API error: {response.status}")
                         return None
                         
+        except (ProviderUnavailable, QuotaExceeded):
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise ProviderUnavailable(f"OpenWeatherMap unreachable: {e!r}") from e
         except Exception as e:
             print(f"Error fetching OpenWeatherMap data: {e}")
             return None
+        finally:
+            if uv_task is not None and not uv_task.done():
+                uv_task.cancel()
     
     async def _get_uv_index(self, session: aiohttp.ClientSession, lat: float, lon: float) -> Optional[Dict]:
         """
         Obtiene índice UV
         """
         try:
+            await self._spend()
             uv_url = f"{self.base_url}/uvi"
             params = {
                 'lat': lat,
@@ -283,7 +522,7 @@ class OpenWeatherMapService:
                 if response.status == 200:
                     return await response.json()
                 return None
-        except:
+        except Exception:
             return None
     
     def _parse_openweather_data(self, data: Dict, uv_data: Optional[Dict] = None) -> WeatherData:
@@ -308,7 +547,8 @@ class OpenWeatherMapService:
             uv_index=int(uv_data.get('value', 0)) if uv_data else 0,
             conditions=weather.get('description', 'Despejado'),
             pressure=main.get('pressure', 0),
-            timestamp=datetime.now()
+            # 'dt': hora de la observación (segundos Unix)
+            timestamp=datetime.fromtimestamp(data['dt']) if isinstance(data.get('dt'), (int, float)) else datetime.now()
         )
     
     def _degrees_to_cardinal(self, degrees: float) -> str:
@@ -320,7 +560,7 @@ class OpenWeatherMapService:
         index = round(degrees / 22.5) % 16
         return directions[index]
 
-class MarineWeatherService:
+class MarineWeatherService(PooledHTTPService):
     """
     Servicio especializado para datos marítimos (oleaje, temperatura del agua)
     """
@@ -329,12 +569,27 @@ class MarineWeatherService:
         self.marine_api_key = os.getenv('MARINE_API_KEY')
         # Puente Navegante español para datos marítimos
         self.base_url = 'https://api.puertos.es/v1'
+        # Boletines costeros y boyas ingeridos (services.marine.MarineIngestor)
+        self.table = None
         
+    def lookup(self, lat: float, lon: float) -> Optional[Dict]:
+        """
+        Condiciones ingeridas para el punto (acceso a diccionario), o None
+        """
+        if self.table is None:
+            return None
+        return self.table.lookup(lat, lon)
+
     async def get_sea_conditions(self, lat: float, lon: float) -> Dict:
         """
         Obtiene condiciones del mar (oleaje, temperatura del agua)
+
+        Usa los boletines y boyas ingeridos; si no cubren el punto, datos simulados.
         """
         try:
+            conditions = self.lookup(lat, lon)
+            if conditions:
+                return conditions
             # Simulamos datos realistas basados en coordenadas españolas
             return self._simulate_sea_conditions(lat, lon)
         except Exception as e:
@@ -366,68 +621,621 @@ class MarineWeatherService:
             'wave_direction': random.choice(['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW'])
         }
 
+# Nombre público de cada proveedor atmosférico en las respuestas
+SOURCE_NAMES = {'aemet': 'AEMET', 'openweather': 'OpenWeatherMap'}
+
 class WeatherServiceManager:
     """
     Gestor principal que coordina todos los servicios meteorológicos
     """
     
-    def __init__(self):
+    def __init__(self, http_config: Optional[HTTPClientConfig] = None):
         self.aemet = AEMETService()
         self.openweather = OpenWeatherMapService()
         self.marine = MarineWeatherService()
+        self.http_config = http_config or HTTPClientConfig.from_env()
+        self.openweather.uv_timeout = self.http_config.uv_timeout
+
+        # Caché por fuente: clave = (proveedor, estación) o (proveedor, lat, lon redondeadas)
+        self.cache = TTLCache(
+            max_entries=int(os.getenv('WEATHER_CACHE_MAX_ENTRIES', 2048)),
+            stale_seconds=float(os.getenv('WEATHER_CACHE_STALE_SECONDS', 600))
+        )
+        self.cache_ttls = {
+            'aemet': float(os.getenv('WEATHER_CACHE_TTL_AEMET', 600)),
+            'openweather': float(os.getenv('WEATHER_CACHE_TTL_OPENWEATHER', 600)),
+            'marine': float(os.getenv('WEATHER_CACHE_TTL_MARINE', 1800)),
+        }
+        self.coord_precision = int(os.getenv('WEATHER_CACHE_COORD_PRECISION', 2))
+        # Segunda capa compartida entre workers (WEATHER_CACHE_BACKEND=redis)
+        self.shared_cache: Optional[RedisCacheTier] = None
+        self.shared_cache_wait = float(os.getenv('WEATHER_CACHE_LOCK_WAIT', 5))
+        self._refresh_tasks: Dict[Hashable, asyncio.Task] = {}
+        self.singleflight = SingleFlight()
+        # Circuito por proveedor: un proveedor caído se salta sin esperar su timeout
+        breaker_config = BreakerConfig.from_env()
+        self.breakers = {source: CircuitBreaker(source, breaker_config) for source in self.cache_ttls}
+        # Respaldo opcional: si el principal tarda más que su percentil, se lanza el otro en paralelo
+        self.hedger = RequestHedger(HedgeConfig.from_env())
+        # Cupo por clave de API (AEMET cuenta los dos saltos de cada lectura). Ráfaga más
+        # reposición de un minuto no superan el límite publicado (AEMET ~50/min, OWM 60/min)
+        self.quotas: Dict[str, TokenBucket] = {}
+        if os.getenv('WEATHER_QUOTA_ENABLED', 'true').lower() == 'true':
+            self.quotas = {
+                'aemet': TokenBucket('aemet', QuotaConfig.from_env('aemet', per_minute=40, burst=10)),
+                'openweather': TokenBucket('openweather', QuotaConfig.from_env('openweather', per_minute=45, burst=15)),
+            }
+            self.aemet.quota = self.quotas['aemet']
+            self.openweather.quota = self.quotas['openweather']
+        # Predicción en rejilla ya interpolada por playa (GridForecastTable, WEATHER_GRID_PATH):
+        # 'primary' responde desde ella sin red, 'fallback' solo si fallan AEMET y OpenWeatherMap
+        self.grid = None
+        self.grid_mode = os.getenv('WEATHER_GRID_MODE', 'primary').lower()
+        # Límite global de peticiones upstream simultáneas (todas las peticiones de la API).
+        # El semáforo se crea en startup(): en Python < 3.10 queda ligado al bucle que exista al crearlo
+        self.max_concurrency = int(os.getenv('WEATHER_MAX_CONCURRENCY', 50))
+        self.upstream_semaphore: Optional[asyncio.Semaphore] = None
+        # Funciones avisadas cada vez que cambia una entrada de la caché local
+        self._listeners: List[Callable[[Tuple], None]] = []
+
+    def add_listener(self, listener: Callable[[Tuple], None]):
+        """
+        Registra una función que recibe la clave de caché de cada valor nuevo
+        """
+        self._listeners.append(listener)
+
+    def _store(self, cache_key: Tuple, value, ttl: float, age: float = 0.0):
+        self.cache.set(cache_key, value, ttl, age=age)
+        for listener in self._listeners:
+            try:
+                listener(cache_key)
+            except Exception as e:
+                print(f"Error in cache listener: {e}")
+
+    async def startup(self):
+        """
+        Abre una sesión HTTP persistente por proveedor (arranque de FastAPI)
+        """
+        for service in (self.aemet, self.openweather, self.marine):
+            await service.open_session(self.http_config)
+        self.upstream_semaphore = asyncio.Semaphore(self.max_concurrency)
+        if os.getenv('WEATHER_CACHE_BACKEND', 'memory').lower() == 'redis' and self.shared_cache is None:
+            self.shared_cache = RedisCacheTier.from_url(
+                os.getenv('REDIS_URL', 'redis://localhost:6379'),
+                encode=encode_cached_value,
+                decode=decode_cached_value,
+                stale_seconds=self.cache.stale_seconds
+            )
+
+    async def shutdown(self):
+        """
+        Cierra las sesiones HTTP (parada de FastAPI)
+        """
+        for task in list(self._refresh_tasks.values()):
+            task.cancel()
+        for service in (self.aemet, self.openweather, self.marine):
+            await service.close_session()
+        self.upstream_semaphore = None
+        if self.shared_cache is not None:
+            await self.shared_cache.close()
+            self.shared_cache = None
+
+    def _coord_key(self, lat: float, lon: float) -> Tuple[float, float]:
+        return (round(lat, self.coord_precision), round(lon, self.coord_precision))
+
+    async def _cached(self, source: str, key: Tuple, fetcher: Callable[[], Awaitable]):
+        """
+        Lectura a través de la caché con stale-while-revalidate
+
+        Un valor caducado se devuelve inmediatamente y se refresca en segundo plano.
+        Si la llamada compartida a la que se une era de menor prioridad y se quedó
+        sin cupo, se repite con la prioridad propia.
+        """
+        cache_key = (source,) + key
+        entry = await self._cache_lookup(source, cache_key, fetcher)
+        if entry is not None:
+            return entry.value
+
+        try:
+            return await self.singleflight.do(cache_key, lambda: self._fetch_and_store(source, cache_key, fetcher))
+        except QuotaExceeded as e:
+            if not outranks(current_priority(), e.priority):
+                print(f"{source} request shed: {e}")
+                return None
+            try:
+                return await self.singleflight.do(cache_key, lambda: self._fetch_and_store(source, cache_key, fetcher))
+            except QuotaExceeded as e:
+                print(f"{source} request shed: {e}")
+                return None
+
+    async def _cache_lookup(self, source: str, cache_key: Tuple, fetcher: Callable[[], Awaitable]):
+        """
+        Entrada de la caché local o de Redis, sin llamar al proveedor (None si no está)
+
+        Una entrada caducada se devuelve igualmente y se refresca en segundo plano.
+        """
+        entry = self.cache.get(cache_key)
+        if entry is None and self.shared_cache is not None:
+            entry = await self._load_shared(cache_key)
+        if entry is not None and not entry.is_fresh():
+            self._schedule_refresh(source, cache_key, fetcher)
+        return entry
+
+    async def _load_shared(self, cache_key: Tuple):
+        """
+        Lee la clave de Redis y la copia a la caché local conservando su antigüedad
+        """
+        shared = await self.shared_cache.get(cache_key)
+        if shared is None:
+            return None
+        value, age, ttl = shared
+        self._store(cache_key, value, ttl, age=age)
+        return self.cache.peek(cache_key)
+
+    async def _fetch_and_store(self, source: str, cache_key: Tuple, fetcher: Callable[[], Awaitable]):
+        """
+        Llamada upstream compartida: se guarda en caché aunque el llamante haya abandonado
+
+        Con Redis, solo el worker que obtiene el lock de la clave llama al proveedor;
+        los demás esperan a que el valor aparezca en Redis.
+        """
+        token = None
+        if self.shared_cache is not None:
+            token = await self.shared_cache.acquire_lock(cache_key)
+            if token is None:
+                value = await self._wait_for_shared(cache_key)
+                if value is not None:
+                    return value
+
+        try:
+            value = await self._call_provider(source, fetcher)
+            if value is not None:
+                self._store(cache_key, value, self.cache_ttls[source])
+                if self.shared_cache is not None:
+                    await self.shared_cache.set(cache_key, value, self.cache_ttls[source])
+            return value
+        finally:
+            if token is not None:
+                await self.shared_cache.release_lock(cache_key, token)
+
+    async def _call_provider(self, source: str, fetcher: Callable[[], Awaitable]):
+        """
+        Llamada upstream a través del circuito del proveedor
+
+        Con el circuito abierto devuelve None sin llamar; los fallos del proveedor
+        (ProviderUnavailable) se registran y también devuelven None. Una llamada
+        descartada por falta de cupo (QuotaExceeded) no cuenta en el circuito y se propaga.
+
+        La duración registrada es solo la del proveedor: no cuenta la espera por un
+        hueco del semáforo upstream ni la espera de cupo propio dentro de `fetcher`.
+        Una llamada cancelada tampoco cuenta y devuelve su sonda si la tenía.
+        """
+        breaker = self.breakers[source]
+        if not breaker.allow():
+            return None
+        try:
+            async with self._upstream_slots():
+                start = time.monotonic()
+                with quota_wait_meter() as waited:
+
+                    def elapsed() -> float:
+                        # Esperas de cupo en tareas paralelas pueden sumar más que el tiempo transcurrido
+                        return max(0.0, time.monotonic() - start - waited[0])
+
+                    try:
+                        value = await fetcher()
+                    except QuotaExceeded:
+                        breaker.release()
+                        raise
+                    except ProviderUnavailable as e:
+                        breaker.record(False, elapsed())
+                        print(f"{source} unavailable: {e}")
+                        return None
+                    except Exception:
+                        breaker.record(False, elapsed())
+                        raise
+                    duration = elapsed()
+        except asyncio.CancelledError:
+            # Cancelada (cliente desconectado, respaldo descartado, timeout del llamante): no es
+            # éxito ni fallo del proveedor, pero la sonda semiabierta reservada debe devolverse
+            breaker.release()
+            raise
+        breaker.record(True, duration)
+        if source in SOURCE_NAMES:
+            self.hedger.observe(source, duration)
+        return value
+
+    def _upstream_slots(self) -> asyncio.Semaphore:
+        # Uso sin startup() (scripts, benchmarks): se crea en el bucle en curso
+        if self.upstream_semaphore is None:
+            self.upstream_semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.upstream_semaphore
+
+    def provider_order(self) -> List[str]:
+        """
+        Proveedores atmosféricos por salud observada (AEMET primero a igualdad)
+
+        Un proveedor con el circuito abierto pasa al final; cuando le toca sonda
+        (semiabierto) vuelve a su sitio para que la sonda llegue a hacerse.
+        """
+        return sorted(('aemet', 'openweather'), key=lambda source: not self.breakers[source].available())
+
+    async def _wait_for_shared(self, cache_key: Tuple):
+        """
+        Espera a que otro worker publique un valor fresco en Redis
+        """
+        deadline = time.monotonic() + self.shared_cache_wait
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+            entry = await self._load_shared(cache_key)
+            if entry is not None and entry.is_fresh():
+                return entry.value
+        return None
+
+    def _schedule_refresh(self, source: str, cache_key: Tuple, fetcher: Callable[[], Awaitable]):
+        if cache_key in self._refresh_tasks:
+            return
+        task = asyncio.create_task(self._refresh(source, cache_key, fetcher))
+        self._refresh_tasks[cache_key] = task
+        task.add_done_callback(lambda _: self._refresh_tasks.pop(cache_key, None))
+
+    async def _refresh(self, source: str, cache_key: Tuple, fetcher: Callable[[], Awaitable]):
+        # Nadie espera este refresco: usa el cupo de menor prioridad
+        try:
+            with request_priority(PREWARM):
+                await self.singleflight.do(cache_key, lambda: self._fetch_and_store(source, cache_key, fetcher))
+        except QuotaExceeded:
+            pass
+        except Exception as e:
+            print(f"Error refreshing cached {source} data: {e}")
         
-    async def get_complete_weather_data(self, lat: float, lon: float, province_code: str = None) -> Dict:
+    def _source_request(self, source: str, lat: float, lon: float, station: Optional[str] = None,
+                        fallback_stations: Tuple[str, ...] = (),
+                        municipality_code: Optional[str] = None) -> Tuple[Tuple, Callable[[], Awaitable]]:
         """
-        Obtiene datos meteorológicos completos combinando múltiples fuentes
+        Clave de caché y función de descarga de una fuente para una ubicación
+        """
+        if source == 'aemet':
+            return (station,), lambda: self.aemet.get_coastal_weather(station, fallback_stations, municipality_code)
+        if source == 'openweather':
+            return self._coord_key(lat, lon), lambda: self.openweather.get_weather_by_coordinates(lat, lon)
+        return self._coord_key(lat, lon), lambda: self.marine.get_sea_conditions(lat, lon)
+
+    async def refresh(self, source: str, lat: float, lon: float, station: Optional[str] = None,
+                      fallback_stations: Tuple[str, ...] = (), municipality_code: Optional[str] = None,
+                      min_remaining: Optional[float] = None):
+        """
+        Fuerza una lectura upstream de la fuente y la guarda en caché (pre-calentamiento)
+
+        Con `min_remaining`, si Redis ya tiene un valor que vive al menos ese tiempo
+        (refrescado por otro worker) se reutiliza sin llamar al proveedor.
+        """
+        key, fetcher = self._source_request(source, lat, lon, station, fallback_stations, municipality_code)
+        cache_key = (source,) + key
+        if min_remaining is not None and self.shared_cache is not None:
+            entry = await self._load_shared(cache_key)
+            if entry is not None and entry.ttl - entry.age() >= min_remaining:
+                return entry.value
+        return await self.singleflight.do(cache_key, lambda: self._fetch_and_store(source, cache_key, fetcher))
+
+    def cache_remaining(self, source: str, lat: float, lon: float, station: Optional[str] = None) -> Optional[float]:
+        """
+        Segundos de vida que le quedan a la entrada en caché (negativo si caducó, None si no existe)
+        """
+        key = (station,) if source == 'aemet' else self._coord_key(lat, lon)
+        entry = self.cache.peek((source,) + key)
+        if entry is None:
+            return None
+        return entry.ttl - entry.age()
+
+    def grid_weather(self, lat: float, lon: float, primary_only: bool = False) -> Optional[WeatherData]:
+        """
+        Datos del paso vigente de la rejilla en el punto (None sin rejilla o fuera de ella)
+
+        Sin E/S: solo los puntos ya interpolados (catálogo y los pedidos antes con
+        `fetch_grid_weather`).
         """
+        if self.grid is None or (primary_only and self.grid_mode != 'primary'):
+            return None
         try:
-            # Intentar AEMET primero (fuente oficial española)
-            weather_data = None
-            if province_code:
-                weather_data = await self.aemet.get_coastal_weather(province_code)
-            
-            # Si AEMET no está disponible, usar OpenWeatherMap
-            if not weather_data:
-                weather_data = await self.openweather.get_weather_by_coordinates(lat, lon)
-            
-            # Obtener datos marítimos
-            sea_data = await self.marine.get_sea_conditions(lat, lon)
-            
-            # Combinar todos los datos
-            if weather_data:
-                return {
-                    'temperature': {
-                        'air': weather_data.temperature_air,
-                        'water': sea_data.get('water_temperature', 20),
-                        'feels_like': weather_data.temperature_air + 2  # Aproximación
-                    },
-                    'wind': {
-                        'speed': weather_data.wind_speed,
-                        'direction': weather_data.wind_direction,
-                        'gusts': weather_data.wind_speed * 1.3  # Aproximación
-                    },
-                    'waves': {
-                        'height': sea_data.get('wave_height', 0.5),
-                        'period': sea_data.get('wave_period', 6),
-                        'direction': sea_data.get('wave_direction', 'W')
-                    },
-                    'conditions': weather_data.conditions,
-                    'humidity': weather_data.humidity,
-                    'pressure': weather_data.pressure,
-                    'visibility': weather_data.visibility,
-                    'uv_index': weather_data.uv_index,
-                    'timestamp': weather_data.timestamp.isoformat(),
-                    'source': 'AEMET' if province_code else 'OpenWeatherMap'
-                }
+            return self.grid.lookup(lat, lon)
+        except Exception as e:
+            # Una rejilla defectuosa no debe tumbar la consulta: se pasa a los proveedores
+            print(f"Error reading forecast grid at {lat}, {lon}: {e}")
+            return None
+
+    async def fetch_grid_weather(self, lat: float, lon: float, primary_only: bool = False) -> Optional[WeatherData]:
+        """
+        Como `grid_weather`, interpolando en el ejecutor los puntos fuera del catálogo
+        """
+        if self.grid is None or (primary_only and self.grid_mode != 'primary'):
+            return None
+        try:
+            return await self.grid.fetch(lat, lon)
+        except Exception as e:
+            print(f"Error reading forecast grid at {lat}, {lon}: {e}")
+            return None
+
+    async def _get_atmospheric_data(self, lat: float, lon: float, station: Optional[str] = None,
+                                    fallback_stations: Tuple[str, ...] = (),
+                                    municipality_code: Optional[str] = None) -> Tuple[Optional[WeatherData], Optional[str]]:
+        """
+        Obtiene los datos atmosféricos (AEMET y, si falla, OpenWeatherMap) y la fuente usada
+
+        El orden se adapta a la salud de cada proveedor: uno con el circuito
+        abierto solo aporta lo que tenga en caché y se pasa al siguiente sin esperar.
+        Con el respaldo activado y ambos proveedores disponibles, el segundo se
+        lanza en paralelo si el primero tarda más de lo habitual (salvo que el
+        primero esté en caché); si ninguno da datos se sigue con el orden normal.
+        Con rejilla en modo 'primary' no se llama a ningún proveedor para los
+        puntos que cubre.
+        """
+        weather_data = await self.fetch_grid_weather(lat, lon, primary_only=True)
+        if weather_data is not None:
+            return weather_data, self.grid.source
+
+        candidates = {}
+        for source in self.provider_order():
+            if source == 'aemet':
+                if station:
+                    candidates['aemet'] = self._source_request('aemet', lat, lon, station, fallback_stations,
+                                                               municipality_code)
             else:
-                # Datos de fallback
-                return self._get_fallback_data(sea_data)
-                
+                candidates['openweather'] = self._source_request('openweather', lat, lon)
+
+        if self.hedger.enabled and len(candidates) == 2 and all(b.available() for b in self.breakers.values()):
+            (primary, (primary_key, primary_fetcher)), (secondary, (secondary_key, secondary_fetcher)) = candidates.items()
+            # Un acierto de caché no es una petición al proveedor: ni respaldo ni estadísticas del hedger
+            entry = await self._cache_lookup(primary, (primary,) + primary_key, primary_fetcher)
+            if entry is not None and entry.value:
+                return entry.value, SOURCE_NAMES[primary]
+            try:
+                weather_data, source = await self.hedger.run(
+                    primary, lambda: self._cached(primary, primary_key, primary_fetcher),
+                    secondary, lambda: self._cached(secondary, secondary_key, secondary_fetcher)
+                )
+            except Exception as e:
+                print(f"Error in hedged weather request: {e}")
+                weather_data = None
+            if weather_data:
+                return weather_data, SOURCE_NAMES.get(source)
+
+        for source, request in candidates.items():
+            weather_data = await self._cached(source, *request)
+            if weather_data:
+                return weather_data, SOURCE_NAMES[source]
+
+        weather_data = await self.fetch_grid_weather(lat, lon)
+        if weather_data is not None:
+            return weather_data, self.grid.source
+        return None, None
+
+    async def _get_sea_data(self, lat: float, lon: float) -> Dict:
+        # Con datos ingeridos la consulta es un acceso a la tabla, sin pasar por la caché
+        conditions = self.marine.lookup(lat, lon)
+        if conditions:
+            return conditions
+        return await self._cached('marine', *self._source_request('marine', lat, lon)) or {}
+
+    def _combine(self, weather_data: Optional[WeatherData], sea_data: Dict, source: Optional[str],
+                 missing: Tuple[str, ...] = ()) -> Dict:
+        """
+        Combina datos atmosféricos y marítimos en la respuesta de la API
+
+        `missing` lista los componentes que no llegaron (se rellenan con valores por defecto).
+        """
+        if not weather_data:
+            # Datos de fallback
+            return self._get_fallback_data(sea_data, ('atmospheric',) + tuple(missing))
+
+        return {
+            'temperature': {
+                'air': weather_data.temperature_air,
+                'water': sea_data.get('water_temperature', 20),
+                'feels_like': weather_data.temperature_air + 2  # Aproximación
+            },
+            'wind': {
+                'speed': weather_data.wind_speed,
+                'direction': weather_data.wind_direction,
+                'gusts': weather_data.wind_speed * 1.3  # Aproximación
+            },
+            'waves': {
+                'height': sea_data.get('wave_height', 0.5),
+                'period': sea_data.get('wave_period', 6),
+                'direction': sea_data.get('wave_direction', 'W')
+            },
+            'conditions': weather_data.conditions,
+            'humidity': weather_data.humidity,
+            'pressure': weather_data.pressure,
+            'visibility': weather_data.visibility,
+            'uv_index': weather_data.uv_index,
+            'timestamp': weather_data.timestamp.isoformat(),
+            'source': source,
+            'missing': list(weather_data.missing) + list(missing)
+        }
+
+    async def _component(self, name: str, awaitable: Awaitable, timeout: Optional[float]) -> Tuple[Any, bool]:
+        """
+        Espera un componente de la respuesta como mucho `timeout` segundos
+
+        Devuelve (valor, True) o (None, False) si tarda demasiado o falla. La llamada
+        upstream compartida no se cancela: sigue en segundo plano y llena la caché.
+        """
+        try:
+            return await asyncio.wait_for(awaitable, timeout), True
+        except asyncio.TimeoutError:
+            print(f"Timeout getting {name} data")
+        except Exception as e:
+            print(f"Error getting {name} data: {e}")
+        return None, False
+
+    async def get_complete_weather_data(self, lat: float, lon: float, province_code: str = None,
+                                        fallback_stations: Tuple[str, ...] = (),
+                                        municipality_code: Optional[str] = None) -> Dict:
+        """
+        Obtiene datos meteorológicos completos combinando múltiples fuentes
+
+        Los datos atmosféricos y marítimos se piden en paralelo, cada uno con su
+        tiempo máximo; los que no llegan se rellenan y se listan en `missing`.
+        """
+        try:
+            (atmospheric, _), (sea_data, sea_ok) = await asyncio.gather(
+                self._component(
+                    'atmospheric',
+                    self._get_atmospheric_data(lat, lon, province_code, fallback_stations, municipality_code),
+                    self.http_config.atmospheric_timeout
+                ),
+                self._component('marine', self._get_sea_data(lat, lon), self.http_config.marine_timeout)
+            )
+            weather_data, source = atmospheric or (None, None)
+            return self._combine(weather_data, sea_data or {}, source, () if sea_ok else ('marine',))
+
         except Exception as e:
             print(f"Error getting weather data: {e}")
-            return self._get_fallback_data({})
-    
-    def _get_fallback_data(self, sea_data: Dict) -> Dict:
+            return self._get_fallback_data({}, ('atmospheric', 'marine'))
+
+    def group_by_station(self, beaches: List) -> List[StationGroup]:
+        """
+        Agrupa playas por estación AEMET (o coordenadas, si no tienen estación)
+
+        El punto de consulta del grupo es el centroide de sus playas.
+        """
+        members: Dict[Hashable, List] = {}
+        for beach in beaches:
+            key = beach.aemet_station or self._coord_key(beach.lat, beach.lng)
+            members.setdefault(key, []).append(beach)
+
+        return [
+            StationGroup(
+                key=key,
+                station=group[0].aemet_station,
+                lat=sum(b.lat for b in group) / len(group),
+                lon=sum(b.lng for b in group) / len(group),
+                fallback_stations=tuple(group[0].stations[1:]),
+                municipality_code=group[0].municipality_code,
+                beaches=group
+            )
+            for key, group in members.items()
+        ]
+
+    async def get_station_weather_table(self, beaches: List, concurrency: Optional[int] = None,
+                                        timeout: Optional[float] = None) -> Dict[int, Dict]:
+        """
+        Obtiene el tiempo de varias playas con una sola llamada upstream por estación AEMET
+
+        Las playas (registros `Beach` del catálogo) se agrupan por `aemet_station`; cada estación se consulta una vez
+        (OpenWeatherMap, si hace falta, en el centroide del grupo) y el resultado se
+        proyecta en memoria sobre todas sus playas. Devuelve {beach_id: datos}.
+
+        Las estaciones se consultan en paralelo (como mucho `concurrency` a la vez).
+        Si una estación supera `timeout` segundos o falla, sus playas reciben los
+        datos de respaldo con 'atmospheric' en `missing`: todas las playas pedidas
+        aparecen en el resultado.
+        """
+        semaphore = asyncio.Semaphore(concurrency) if concurrency else None
+        # Con rejilla 'primary' cada playa se lee en su propio punto y solo se agrupan las que no cubre
+        grid_by_beach = {}
+        for beach in beaches:
+            weather_data = self.grid_weather(beach.lat, beach.lng, primary_only=True)
+            if weather_data is not None:
+                grid_by_beach[beach.id] = weather_data
+        groups = self.group_by_station([beach for beach in beaches if beach.id not in grid_by_beach])
+
+        async def fetch_group(group: StationGroup):
+            station = group.station
+            args = (group.lat, group.lon, station, group.fallback_stations, group.municipality_code)
+            try:
+                if semaphore is None:
+                    return await asyncio.wait_for(self._get_atmospheric_data(*args), timeout)
+                async with semaphore:
+                    return await asyncio.wait_for(self._get_atmospheric_data(*args), timeout)
+            except asyncio.TimeoutError:
+                print(f"Timeout getting weather data for station {station}")
+            except Exception as e:
+                print(f"Error getting station weather data: {e}")
+            return None, None
+
+        # Datos marítimos: los ingeridos o ya en caché se leen directamente (sin crear
+        # una tarea por playa); el resto se pide a la vez que las estaciones
+        sea_by_beach = {}
+        sea_pending = []
+        for beach in beaches:
+            if (self.marine.lookup(beach.lat, beach.lng)
+                    or self.cache.peek(('marine',) + self._coord_key(beach.lat, beach.lng)) is not None):
+                sea_by_beach[beach.id] = (await self._get_sea_data(beach.lat, beach.lng), True)
+            else:
+                sea_pending.append(beach)
+        station_table, sea_table = await asyncio.gather(
+            asyncio.gather(*(fetch_group(group) for group in groups)),
+            asyncio.gather(*(
+                self._component('marine', self._get_sea_data(beach.lat, beach.lng), self.http_config.marine_timeout)
+                for beach in sea_pending
+            ))
+        )
+        sea_by_beach.update((beach.id, sea) for beach, sea in zip(sea_pending, sea_table))
+
+        results = {}
+        for beach in beaches:
+            if beach.id in grid_by_beach:
+                sea_data, sea_ok = sea_by_beach[beach.id]
+                results[beach.id] = self._combine(grid_by_beach[beach.id], sea_data or {}, self.grid.source,
+                                                  () if sea_ok else ('marine',))
+        for group, (weather_data, source) in zip(groups, station_table):
+            for beach in group.beaches:
+                sea_data, sea_ok = sea_by_beach[beach.id]
+                results[beach.id] = self._combine(weather_data, sea_data or {}, source, () if sea_ok else ('marine',))
+        return results
+
+    def _peek(self, source: str, key: Tuple):
+        # Valor en la caché local dentro del margen stale, sin estadísticas ni refresco
+        entry = self.cache.peek((source,) + key)
+        if entry is None or entry.age() >= entry.ttl + self.cache.stale_seconds:
+            return None
+        return entry.value
+
+    def cached_station_weather_table(self, beaches: List) -> Dict[int, Dict]:
+        """
+        Como `get_station_weather_table`, pero solo con lo que ya está en memoria
+
+        Lee la rejilla, la tabla marítima y la caché local sin llamar a los
+        proveedores, sin gastar cupo y sin programar refrescos. Las playas sin
+        datos atmosféricos en memoria no aparecen en el resultado.
+        """
+        results = {}
+        atmospheric = {}
+        remaining = []
+        for beach in beaches:
+            weather_data = self.grid_weather(beach.lat, beach.lng, primary_only=True)
+            if weather_data is not None:
+                atmospheric[beach.id] = (weather_data, self.grid.source)
+            else:
+                remaining.append(beach)
+        for group in self.group_by_station(remaining):
+            weather_data, source = None, None
+            for candidate in self.provider_order():
+                if candidate == 'aemet' and not group.station:
+                    continue
+                key = (group.station,) if candidate == 'aemet' else self._coord_key(group.lat, group.lon)
+                weather_data = self._peek(candidate, key)
+                if weather_data:
+                    source = SOURCE_NAMES[candidate]
+                    break
+            if not weather_data:
+                weather_data = self.grid_weather(group.lat, group.lon)
+                source = self.grid.source if weather_data is not None else None
+            if weather_data:
+                atmospheric.update((beach.id, (weather_data, source)) for beach in group.beaches)
+
+        for beach in beaches:
+            if beach.id not in atmospheric:
+                continue
+            sea_data = (self.marine.lookup(beach.lat, beach.lng)
+                        or self._peek('marine', self._coord_key(beach.lat, beach.lng)))
+            weather_data, source = atmospheric[beach.id]
+            results[beach.id] = self._combine(weather_data, sea_data or {}, source, () if sea_data else ('marine',))
+        return results
+
+    def _get_fallback_data(self, sea_data: Dict, missing: Tuple[str, ...] = ()) -> Dict:
         """
         Datos de respaldo cuando las APIs no están disponibles
         """
@@ -453,5 +1261,6 @@ class WeatherServiceManager:
             'visibility': 10,
             'uv_index': 6,
             'timestamp': datetime.now().isoformat(),
-            'source': 'Fallback'
+            'source': 'Fallback',
+            'missing': list(missing)
         }
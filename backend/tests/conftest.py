@@ -0,0 +1,54 @@
+"""
+Shared fixtures for the Beach Monitor Spain backend tests
+Catalogue beaches, the local AEMET/OpenWeatherMap stub server and managers pointed at it
+"""
+
+from typing import Optional
+
+import pytest
+
+from benchmarks.stub_server import StubServer
+from services.beach_repository import BeachRepository
+from services.resilience import BreakerConfig, CircuitBreaker
+from services.weather_service import HTTPClientConfig, WeatherServiceManager
+
+# Timeouts cortos: un proveedor colgado no debe alargar los tests
+HTTP_CONFIG = HTTPClientConfig(connect_timeout=0.5, read_timeout=0.5, total_timeout=1.0)
+
+
+@pytest.fixture(scope='session')
+def beaches():
+    return BeachRepository.load().all()
+
+
+@pytest.fixture
+async def stub():
+    server = StubServer()
+    await server.start()
+    yield server
+    await server.stop()
+
+
+@pytest.fixture
+async def make_manager():
+    """
+    Crea managers sin cupo apuntando a `base_url`; se cierran al terminar el test
+    """
+    managers = []
+
+    async def factory(base_url: str = 'http://127.0.0.1:9', breaker: Optional[BreakerConfig] = None) -> WeatherServiceManager:
+        manager = WeatherServiceManager(http_config=HTTP_CONFIG)
+        for service in (manager.aemet, manager.openweather):
+            service.api_key = 'test'
+            service.base_url = base_url
+            service.quota = None
+        manager.quotas = {}
+        if breaker is not None:
+            manager.breakers = {source: CircuitBreaker(source, breaker) for source in manager.cache_ttls}
+        await manager.startup()
+        managers.append(manager)
+        return manager
+
+    yield factory
+    for manager in managers:
+        await manager.shutdown()
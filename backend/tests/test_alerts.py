@@ -0,0 +1,189 @@
+"""
+Tests for the AEMET warnings (CAP) ingestion
+CAP parser, active-alert filtering and the beach/province index, against the recorded bulletin,
+and the vectorized point-in-polygon geometry against a scalar ray casting
+"""
+
+import os
+import random
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from services import geometry
+from services.alerts import DEFAULT_SAMPLES_DIR, AlertIngestor, WeatherAlert, active_alerts, parse_cap
+from services.geometry import MembershipBitmap, PointSet, points_in_ring
+from services.resilience import OPEN, BreakerConfig
+from services.weather_service import AEMETService
+
+AFFECTED_BEACHES = {1, 2, 4, 5, 61, 62, 63, 71, 72, 103, 104}
+# Contornos (lat, lon) abiertos: cóncavo, con aristas horizontales y verticales
+RINGS = [
+    [(0, 0), (0, 4), (4, 4), (4, 0)],
+    [(0, 0), (0, 6), (6, 6), (6, 4), (2, 4), (2, 2), (6, 2), (6, 0)],
+    [(1, 3), (5, 7), (7, 1), (4, 3)],
+]
+
+
+def read_sample(name: str) -> bytes:
+    with open(os.path.join(DEFAULT_SAMPLES_DIR, name), 'rb') as f:
+        return f.read()
+
+
+def recorded_alerts():
+    return [parse_cap(read_sample(name)) for name in sorted(os.listdir(DEFAULT_SAMPLES_DIR))]
+
+
+def test_parse_cap_message():
+    alert = parse_cap(read_sample('Z_CAP_C_LEMM_20250729080000_AFAZ611102C.xml'))
+    assert (alert.msg_type, alert.type, alert.level) == ('Alert', 'waves', 'orange')
+    assert alert.provinces() == ['Cádiz']
+    assert alert.onset == datetime(2025, 7, 29, 12, tzinfo=timezone(timedelta(hours=2)))
+    assert alert.expires == datetime(2025, 7, 30, 6, tzinfo=timezone(timedelta(hours=2)))
+    area, = alert.areas
+    assert area.zone == '611102C' and area.province_code == '11'
+    assert len(area.polygons) == 1 and len(area.polygons[0]) >= 3
+
+
+def test_every_recorded_message_parses():
+    alerts = recorded_alerts()
+    assert len(alerts) == 9
+    assert all(alert is not None and alert.areas for alert in alerts)
+    assert {alert.msg_type for alert in alerts} == {'Alert', 'Update', 'Cancel'}
+
+
+def test_active_alerts_drop_expired_and_cancelled():
+    alerts = recorded_alerts()
+    active = active_alerts(alerts, datetime(2025, 7, 29, 8, tzinfo=timezone.utc))
+    assert len(active) == 7
+    assert 'Cancel' not in {alert.msg_type for alert in active}
+    # El aviso de tormentas de Murcia caducó el día anterior
+    assert 'storm' not in {alert.type for alert in active}
+
+    cancel = WeatherAlert(id='cancel', msg_type='Cancel', references=[active[0].id], level='yellow', areas=[])
+    assert active[0] not in active_alerts(alerts + [cancel], datetime(2025, 7, 29, 8, tzinfo=timezone.utc))
+
+
+@pytest.fixture
+async def ingestor(beaches):
+    ingestor = AlertIngestor(beaches, AEMETService(), source='files')
+    assert await ingestor.run_once()
+    return ingestor
+
+
+async def test_index_by_beach_and_province(ingestor, beaches):
+    index = ingestor.index()
+    assert len(index.all()) == 7
+    assert {beach.id for beach in beaches if index.for_beach(beach.id)} == AFFECTED_BEACHES
+    assert index.for_beach(3) == []
+
+    malagueta = index.for_beach(1)
+    assert [(alert['type'], alert['level']) for alert in malagueta] == [('heat', 'yellow')]
+    province_ids = {beach.province_id for beach in beaches}
+    affected = {beach.province_id for beach in beaches if beach.id in AFFECTED_BEACHES}
+    assert {province for province in province_ids if index.for_province(province)} == affected
+
+
+async def test_same_bulletin_is_not_parsed_again(ingestor):
+    assert not await ingestor.run_once()
+    assert (ingestor.bulletins, ingestor.unchanged, ingestor.rebuilds) == (1, 1, 1)
+
+
+async def test_expiry_rebuilds_from_the_same_bitmap(ingestor):
+    index = ingestor.index()
+    membership = ingestor.membership
+    ingestor._rebuild(index.valid_until)
+    assert len(ingestor.index().all()) == 6
+    assert ingestor.membership is membership
+    assert ingestor.index().version != index.version
+
+
+async def test_download_from_aemet_tar(stub, make_manager, beaches):
+    manager = await make_manager(stub.base_url)
+    ingestor = AlertIngestor(beaches, manager.aemet, source='aemet', manager=manager)
+    assert await ingestor.run_once()
+    # Boletín de 2025 evaluado hoy: todos analizados, ninguno en vigor
+    assert ingestor.stats()['parsed'] == 9
+    assert ingestor.index().all() == []
+    assert stub.provider_requests['aemet'] == 2
+
+
+async def test_download_goes_through_the_aemet_breaker(stub, make_manager, beaches):
+    stub.faults = {'aemet': 'error'}
+    manager = await make_manager(stub.base_url, BreakerConfig(window=10, min_calls=3, open_seconds=60))
+    ingestor = AlertIngestor(beaches, manager.aemet, source='aemet', manager=manager)
+    for _ in range(5):
+        assert not await ingestor.run_once()
+    assert ingestor.failed == 5
+    assert manager.breakers['aemet'].state == OPEN
+    assert stub.provider_requests['aemet'] == 3
+
+
+def scalar_in_ring(lat: float, lon: float, ring) -> bool:
+    # Referencia escalar: rayo hacia el este, cruces con cada arista uno a uno
+    inside = False
+    for (lat1, lon1), (lat2, lon2) in zip(ring, ring[1:] + ring[:1]):
+        if (lat1 > lat) != (lat2 > lat) and lon < lon1 + (lat - lat1) * ((lon2 - lon1) / (lat2 - lat1)):
+            inside = not inside
+    return inside
+
+
+def boundary_points(ring):
+    # Vértices, puntos medios de las aristas y puntos a medio paso a ambos lados
+    points = set()
+    for (lat1, lon1), (lat2, lon2) in zip(ring, ring[1:] + ring[:1]):
+        points.add((lat1, lon1))
+        points.add(((lat1 + lat2) / 2, (lon1 + lon2) / 2))
+    grid = [step / 2 for step in range(-2, 17)]
+    points.update((lat, lon) for lat in grid for lon in grid)
+    return sorted(points)
+
+
+@pytest.mark.parametrize('ring', RINGS)
+def test_points_in_ring_match_scalar_ray_casting(ring):
+    points = boundary_points(ring)
+    lats, lons = np.array(points).T
+    expected = [scalar_in_ring(lat, lon, ring) for lat, lon in points]
+    assert points_in_ring(lats, lons, ring).tolist() == expected
+    # Cerrar el contorno repitiendo el primer vértice añade una arista vacía
+    assert points_in_ring(lats, lons, ring + ring[:1]).tolist() == expected
+    assert PointSet(lats, lons).contained([ring + ring[:1]]).tolist() == expected
+
+
+def test_points_on_shared_edges_belong_to_one_cell():
+    cells = [[(lat, lon), (lat, lon + 1), (lat + 1, lon + 1), (lat + 1, lon)] for lat in range(4) for lon in range(4)]
+    grid = [step / 2 for step in range(8)]
+    points = [(lat, lon) for lat in grid for lon in grid]
+    lats, lons = np.array(points).T
+    membership = MembershipBitmap.build(PointSet(lats, lons), [[cell] for cell in cells])
+    assert [len(membership.shapes_of(point)) for point in range(len(points))] == [1] * len(points)
+
+
+def test_membership_bitmap_matches_scalar_ray_casting(monkeypatch):
+    # Bloques pequeños para cruzar los límites de bloque de la comprobación vectorizada
+    monkeypatch.setattr(geometry, 'CHUNK_CELLS', 64)
+    generator = random.Random(11)
+    points = [(generator.choice((generator.uniform(-1, 8), generator.randrange(-1, 9))),
+               generator.choice((generator.uniform(-1, 8), generator.randrange(-1, 9)))) for _ in range(203)]
+    shapes = [[RINGS[0]], [RINGS[1], RINGS[2]], [RINGS[2] + RINGS[2][:1]], []]
+    membership = MembershipBitmap.build(PointSet(*zip(*points)), shapes)
+
+    expected = np.array([[any(scalar_in_ring(lat, lon, ring) for ring in rings) for lat, lon in points]
+                         for rings in shapes])
+    assert membership.shape == (len(shapes), len(points))
+    for shape in range(len(shapes)):
+        assert membership.row(shape).tolist() == expected[shape].tolist()
+        assert membership.members(shape).tolist() == np.flatnonzero(expected[shape]).tolist()
+    for point in range(len(points)):
+        assert membership.shapes_of(point) == np.flatnonzero(expected[:, point]).tolist()
+    assert membership.counts().tolist() == expected.sum(axis=1).tolist()
+
+
+def test_empty_point_set():
+    empty = np.array([], dtype=np.float64)
+    assert points_in_ring(empty, empty, RINGS[1]).tolist() == []
+    membership = MembershipBitmap.build(PointSet([], []), [[ring] for ring in RINGS])
+    assert membership.shape == (len(RINGS), 0)
+    assert membership.row(0).tolist() == [] and membership.members(2).tolist() == []
+    assert membership.counts().tolist() == [0] * len(RINGS)
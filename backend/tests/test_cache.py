@@ -0,0 +1,139 @@
+"""
+Tests for the two-tier weather cache
+In-process L1 (TTLCache) and the Redis L2 shared between workers, against fakeredis
+"""
+
+import asyncio
+from datetime import datetime
+
+import fakeredis
+import pytest
+
+from services.cache import RedisCacheTier, TTLCache
+from services.weather_service import WeatherData, decode_cached_value, encode_cached_value
+
+WEATHER = WeatherData(
+    temperature_air=24.3, temperature_water=21.0, humidity=61, wind_speed=15.1, wind_direction='SW',
+    wave_height=0.8, visibility=20.0, uv_index=7, conditions='Despejado', pressure=1014.2,
+    timestamp=datetime(2025, 7, 29, 12, 0), missing=('uv_index',)
+)
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def make_tier(server, **kwargs) -> RedisCacheTier:
+    client = fakeredis.aioredis.FakeRedis(server=server)
+    return RedisCacheTier(client, encode=encode_cached_value, decode=decode_cached_value, **kwargs)
+
+
+def test_ttl_cache_serves_stale_entries_within_margin(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('services.cache.time.monotonic', lambda: now[0])
+    cache = TTLCache(max_entries=2, stale_seconds=60)
+    cache.set('a', 1, ttl=10)
+
+    now[0] += 30
+    entry = cache.get('a')
+    assert entry.value == 1 and not entry.is_fresh()
+    now[0] += 60
+    assert cache.get('a') is None
+    assert (cache.hits, cache.stale_hits, cache.misses) == (0, 1, 1)
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(max_entries=2)
+    cache.set('a', 1, ttl=10)
+    cache.set('b', 2, ttl=10)
+    cache.get('a')
+    cache.set('c', 3, ttl=10)
+    assert cache.peek('b') is None and cache.peek('a') is not None
+    assert cache.evictions == 1
+
+
+async def test_redis_tier_round_trip(server):
+    tier = make_tier(server, stale_seconds=600)
+    await tier.set(('aemet', '6155A'), WEATHER, ttl=600)
+
+    value, age, ttl = await tier.get(('aemet', '6155A'))
+    assert value == WEATHER
+    assert 0 <= age < 1 and ttl == 600
+    # Redis expira la clave pasado el TTL más el margen stale
+    assert 1190 * 1000 < await tier.client.pttl('beachmon:aemet:6155A') <= 1200 * 1000
+    assert await tier.get(('aemet', 'missing')) is None
+    assert tier.stats() == {'backend': 'redis', 'hits': 1, 'misses': 1, 'errors': 0}
+
+
+async def test_redis_tier_keeps_raw_marine_payloads(server):
+    tier = make_tier(server)
+    await tier.set(('marine', 36.72, -4.42), {'wave_height': 0.7, 'water_temperature': 23.4}, ttl=1800)
+    value, _, _ = await tier.get(('marine', 36.72, -4.42))
+    assert value == {'wave_height': 0.7, 'water_temperature': 23.4}
+
+
+async def test_redis_lock_is_exclusive_and_released_only_by_owner(server):
+    first, second = make_tier(server), make_tier(server)
+    key = ('openweather', 36.72, -4.42)
+
+    token = await first.acquire_lock(key)
+    assert token is not None
+    assert await second.acquire_lock(key) is None
+    await second.release_lock(key, 'not-the-owner')
+    assert await second.acquire_lock(key) is None
+
+    await first.release_lock(key, token)
+    assert await second.acquire_lock(key) is not None
+    assert first.errors == second.errors == 0
+
+
+async def test_redis_errors_degrade_to_local_behaviour():
+    class BrokenClient:
+        def register_script(self, script):
+            return None
+
+        async def get(self, key):
+            raise ConnectionError('redis down')
+
+        async def set(self, *args, **kwargs):
+            raise ConnectionError('redis down')
+
+    tier = RedisCacheTier(BrokenClient(), encode=encode_cached_value, decode=decode_cached_value)
+    assert await tier.get(('aemet', '6155A')) is None
+    await tier.set(('aemet', '6155A'), WEATHER, ttl=600)
+    # Sin Redis cada worker refresca por su cuenta
+    assert await tier.acquire_lock(('aemet', '6155A')) is not None
+    assert tier.errors == 3
+
+
+async def test_workers_share_values_through_redis(server, make_manager):
+    first, second = await make_manager(), await make_manager()
+    first.shared_cache, second.shared_cache = make_tier(server), make_tier(server)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return WEATHER
+
+    assert await first._cached('aemet', ('6155A',), fetch) == WEATHER
+    # El segundo worker no tiene el valor en su caché local: lo lee de Redis sin llamar
+    assert await second._cached('aemet', ('6155A',), fetch) == WEATHER
+    assert len(calls) == 1
+    assert second.cache.peek(('aemet', '6155A')).ttl == second.cache_ttls['aemet']
+
+
+async def test_only_the_lock_holder_calls_the_provider(server, make_manager):
+    workers = [await make_manager() for _ in range(3)]
+    for worker in workers:
+        worker.shared_cache = make_tier(server)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.3)
+        return WEATHER
+
+    results = await asyncio.gather(*(worker._cached('aemet', ('6155A',), fetch) for worker in workers))
+    assert results == [WEATHER] * 3
+    assert len(calls) == 1
@@ -0,0 +1,47 @@
+"""
+Tests for the municipal forecast refresher
+Per-product download state and issue times, against the recorded samples and the stub server
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from services.forecast import ForecastRefresher, ForecastStore
+from services.resilience import ProviderUnavailable
+from services.weather_service import AEMETService
+
+MALAGA = '29067'
+
+
+async def test_issue_time_is_madrid_time():
+    refresher = ForecastRefresher(ForecastStore(), AEMETService(), [MALAGA], source='files')
+    entry = await refresher.refresh(MALAGA)
+    assert entry.issued == {'daily': '2025-07-29T08:25:13', 'hourly': '2025-07-29T08:52:40'}
+    # Hora de verano en Madrid, sea cual sea la zona del servidor
+    assert entry.issued_at == datetime(2025, 7, 29, 6, 52, 40, tzinfo=timezone.utc)
+    assert entry.issued_at.utcoffset() == timedelta(hours=2)
+
+
+async def test_partial_download_keeps_the_missing_product_due(stub, make_manager, monkeypatch):
+    manager = await make_manager(stub.base_url)
+    refresher = ForecastRefresher(ForecastStore(), manager.aemet, [MALAGA], source='aemet', manager=manager)
+    fetch = refresher._fetch
+
+    async def hourly_down(session, url):
+        if '/horaria/' in url:
+            raise ProviderUnavailable('AEMET API error: 500')
+        return await fetch(session, url)
+
+    monkeypatch.setattr(refresher, '_fetch', hourly_down)
+    entry = await refresher.refresh(MALAGA)
+    assert entry.daily is not None and entry.hourly is None
+    assert entry.fetched_at['daily'] is not None and entry.fetched_at['hourly'] is None
+    assert refresher.due_products(MALAGA) == ['hourly']
+    assert refresher.failed == 1
+
+    # Tras la espera por fallo solo se pide la predicción que falta
+    monkeypatch.setattr(refresher, '_fetch', fetch)
+    refresher.failure_ttl = 0
+    requests = stub.provider_requests['aemet']
+    entry = await refresher.refresh(MALAGA)
+    assert entry.hourly is not None and not refresher.due(MALAGA)
+    assert stub.provider_requests['aemet'] - requests == 2
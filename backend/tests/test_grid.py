@@ -0,0 +1,119 @@
+"""
+Tests for the gridded forecast
+Step selection, bilinear interpolation and masked or out-of-grid cells on a small grid written to a temporary directory
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from services.grid_forecast import ForecastGrid, GridForecastTable, save_grid
+
+FIRST = datetime(2025, 7, 29, 10, 0)
+STEPS = 3
+# Rejilla de 3 x 3 celdas de un grado: latitud 36-38, longitud -6 a -4
+LATS = np.array([36.0, 37.0, 38.0])
+LONS = np.array([-6.0, -5.0, -4.0])
+
+
+@pytest.fixture
+def grid(tmp_path):
+    grid_lat, grid_lon = np.meshgrid(LATS, LONS, indexing='ij')
+    steps = np.arange(STEPS)[:, None, None]
+    shape = (STEPS, len(LATS), len(LONS))
+    # Campo lineal: la interpolación bilineal lo reproduce exactamente
+    temperature = 20 + (grid_lat - 36) + 0.5 * (grid_lon + 6) + steps
+    temperature[:, 2, 2] = np.nan
+    humidity = np.full(shape, 70.0)
+    cloud_cover = np.full(shape, 60.0)
+    # Fila sin humedad ni nubosidad (máscara de otra variable)
+    humidity[:, 0, :] = np.nan
+    cloud_cover[:, 0, :] = np.nan
+    save_grid(str(tmp_path), {
+        'model': 'Prueba',
+        'issued': FIRST.isoformat(),
+        'lat': {'start': 36.0, 'step': 1.0, 'count': 3},
+        'lon': {'start': -6.0, 'step': 1.0, 'count': 3},
+        'steps': [(FIRST + timedelta(hours=hour)).isoformat() for hour in range(STEPS)],
+    }, {
+        'temperature': temperature,
+        'humidity': humidity,
+        'cloud_cover': cloud_cover,
+        'wind_u': np.full(shape, 0.0),
+        'wind_v': np.full(shape, -5.0),
+    })
+    return ForecastGrid(str(tmp_path))
+
+
+@pytest.fixture
+def table(grid):
+    table = GridForecastTable()
+    table.register_points([(36.5, -5.0), (37.5, -4.5), (38.0, -4.0), (36.0, -5.0), (40.0, 0.0)])
+    table.install(grid)
+    return table
+
+
+@pytest.mark.parametrize('when, step', [
+    (FIRST - timedelta(hours=1), 0),
+    (FIRST + timedelta(minutes=30), 0),
+    (FIRST + timedelta(hours=1), 1),
+    (FIRST + timedelta(hours=2, minutes=59), 2),
+    # Pasado el último paso más un intervalo, la predicción ha expirado
+    (FIRST + timedelta(hours=3), None),
+    # Con zona horaria se convierte a UTC: 13:30 en Madrid (CEST) son las 11:30 UTC
+    (datetime(2025, 7, 29, 13, 30, tzinfo=timezone(timedelta(hours=2))), 1),
+])
+def test_step_index(grid, when, step):
+    assert grid.step_index(when) == step
+
+
+def test_lookup_interpolates_the_current_step(table):
+    weather = table.lookup(36.5, -5.0, when=FIRST + timedelta(hours=1, minutes=10))
+    assert weather.temperature_air == 22.0
+    assert weather.humidity == 70 and weather.conditions == 'Nuboso'
+    # Viento del norte (v negativo sopla hacia el sur) de 5 m/s
+    assert weather.wind_speed == 18.0 and weather.wind_direction == 'N'
+    assert weather.missing == ()
+    assert weather.timestamp == table.grid.local_times[1]
+    assert table.lookup(36.5, -5.0, when=FIRST + timedelta(hours=3)) is None
+
+
+def test_masked_corner_weight_goes_to_the_others(table):
+    # Esquinas 21.5, 22.0 y 22.5 con la cuarta enmascarada: media de las tres
+    assert table.lookup(37.5, -4.5, when=FIRST).temperature_air == 22.0
+
+
+def test_masked_or_out_of_grid_cells(table):
+    assert table.lookup(38.0, -4.0, when=FIRST) is None
+    assert table.lookup(40.0, 0.0, when=FIRST) is None
+    assert table.stats()['points_covered'] == 3
+
+
+def test_masked_fields_use_defaults(table):
+    weather = table.lookup(36.0, -5.0, when=FIRST)
+    assert weather.temperature_air == 20.5
+    assert weather.humidity == 65 and weather.conditions == 'Despejado'
+    assert set(weather.missing) == {'humidity', 'condition'}
+
+
+async def test_fetch_interpolates_points_outside_the_catalogue(table):
+    assert table.lookup(37.0, -5.0, when=FIRST) is None
+    weather = await table.fetch(37.0, -5.0, when=FIRST)
+    assert weather.temperature_air == 21.5
+    # Guardado en la emisión vigente: ya no hace falta `fetch`
+    assert table.lookup(37.0, -5.0, when=FIRST).temperature_air == 21.5
+    assert await table.fetch(45.0, 10.0, when=FIRST) is None
+
+
+async def test_manager_survives_a_broken_grid(make_manager, table, monkeypatch):
+    manager = await make_manager()
+    manager.grid = table
+
+    def broken(*args, **kwargs):
+        raise ValueError('corrupt grid')
+
+    monkeypatch.setattr(table, 'lookup', broken)
+    monkeypatch.setattr(table, 'fetch', broken)
+    assert manager.grid_weather(36.5, -5.0) is None
+    assert await manager.fetch_grid_weather(36.5, -5.0) is None
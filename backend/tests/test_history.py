@@ -0,0 +1,234 @@
+"""
+Tests for the weather history
+Batched writer, observation store, rollups and range queries on a temporary SQLite database
+"""
+
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services.history import METRICS, HistoryStore, ObservationWriter, observation_row, rollup_rows, rollups
+from services.weather_service import AEMETService
+
+START = datetime(2025, 7, 29, 10, 0, tzinfo=timezone.utc)
+# Playas 1 y 2 en Málaga (29), playa 3 en Cádiz (11)
+PROVINCE_OF = {1: 29, 2: 29, 3: 11}
+# Horario de verano de 2025 en Madrid (UTC)
+SUMMER_2025 = (datetime(2025, 3, 30, 1, tzinfo=timezone.utc), datetime(2025, 10, 26, 1, tzinfo=timezone.utc))
+
+
+def payload(when: datetime, air: float, water=None, humidity=60) -> dict:
+    return {
+        'timestamp': when.isoformat(),
+        'source': 'AEMET',
+        'temperature': {'air': air, 'water': water},
+        'wind': {'speed': 10.0},
+        'waves': {'height': 0.5},
+        'humidity': humidity,
+        'pressure': 1013.0,
+        'uv_index': 7,
+    }
+
+
+def span(hours: int = 24):
+    start = int(START.timestamp())
+    return start - 86400, start + hours * 3600
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(f"sqlite:///{tmp_path / 'history.db'}", province_of=PROVINCE_OF)
+    store.create_schema()
+    yield store
+    store.engine.dispose()
+
+
+async def test_stop_writes_the_partial_batch(store):
+    writer = ObservationWriter(store, batch_size=100, flush_interval=60)
+    await writer.start()
+    for minute in range(3):
+        writer.record(1, 'C001', payload(START + timedelta(minutes=10 * minute), 24.0 + minute))
+    # La tarea ya ha sacado las filas de la cola y espera a completar el lote
+    for _ in range(5):
+        await asyncio.sleep(0)
+    assert writer.stats()['queued'] == 0 and writer.written == 0
+
+    await writer.stop()
+    assert writer.written == 3 and writer.dropped == 0
+    assert [row['air_temperature'] for row in store.query_series(1, *span())] == [24.0, 25.0, 26.0]
+
+
+async def test_full_batch_is_written_without_waiting(store):
+    writer = ObservationWriter(store, batch_size=2, flush_interval=60)
+    await writer.start()
+    writer.record(1, 'C001', payload(START, 24.0))
+    writer.record(2, 'C001', payload(START, 23.0))
+    for _ in range(100):
+        if writer.written:
+            break
+        await asyncio.sleep(0.01)
+    assert writer.written == 2
+    await writer.stop()
+
+
+async def test_repeated_observations_are_recorded_once(store):
+    writer = ObservationWriter(store, batch_size=100, flush_interval=60)
+    # Sin arrancar no hay cola: se descarta
+    writer.record(1, 'C001', payload(START, 24.0))
+    assert writer.dropped == 1
+    await writer.start()
+    for _ in range(3):
+        writer.record(1, 'C001', payload(START, 24.0))
+    writer.record(1, 'C001', {'source': 'AEMET'})
+    await writer.stop()
+    assert writer.written == 1
+    assert len(store.query_series(1, *span())) == 1
+
+
+def test_observation_row():
+    row = observation_row(1, 'C001', payload(START, 24.5, humidity='n/a'))
+    assert row['observed_at'] == int(START.timestamp())
+    assert row['air_temperature'] == 24.5 and row['wave_height'] == 0.5
+    assert row['water_temperature'] is None and row['humidity'] is None
+
+
+def test_hourly_rollups_match_the_raw_observations(store):
+    rows = [
+        observation_row(beach, 'C001', payload(START + timedelta(minutes=20 * step), 20.0 + step + beach))
+        for beach in (1, 2, 3) for step in range(6)
+    ]
+    store.insert_many(rows[:9])
+    store.insert_many(rows[9:])
+
+    series = store.query_series(1, *span(), resolution='hour')
+    assert [row['samples'] for row in series] == [3, 3]
+    assert [row['air_temperature'] for row in series] == [22.0, 25.0]
+    assert series[0]['bucket'] == int(START.timestamp())
+
+    # Sin agregados se agrupa en la base de datos con el mismo resultado
+    store.rollups_enabled = False
+    grouped = store.query_series(1, *span(), resolution='hour')
+    assert [(row['bucket'], row['samples'], row['air_temperature']) for row in grouped] == [
+        (row['bucket'], row['samples'], row['air_temperature']) for row in series
+    ]
+
+
+def test_province_summary(store):
+    store.insert_many([
+        observation_row(1, 'C001', payload(START, 24.0, water=21.0)),
+        observation_row(2, 'C002', payload(START + timedelta(minutes=30), 26.0)),
+        observation_row(3, 'C003', payload(START, 30.0)),
+    ])
+    (hour,) = store.province_summary(29, *span(), resolution='hour')
+    assert hour['samples'] == 2
+    assert hour['air_temperature'] == {'mean': 25.0, 'min': 24.0, 'max': 26.0}
+    # Los valores ausentes no cuentan
+    assert hour['water_temperature'] == {'mean': 21.0, 'min': 21.0, 'max': 21.0}
+    assert store.province_summary(11, *span(), resolution='hour')[0]['air_temperature']['mean'] == 30.0
+
+
+def test_rollups_are_backfilled_from_existing_observations(tmp_path):
+    store = HistoryStore(f"sqlite:///{tmp_path / 'history.db'}", province_of=PROVINCE_OF)
+    store.create_schema()
+    # Observaciones guardadas sin agregados (versión anterior)
+    store.rollups_enabled = False
+    store.insert_many([observation_row(1, 'C001', payload(START + timedelta(minutes=m), 24.0 + m)) for m in range(4)])
+    store.rollups_enabled = True
+    store.create_schema()
+    (hour,) = store.query_series(1, *span(), resolution='hour')
+    assert hour['samples'] == 4 and hour['air_temperature'] == 25.5
+    store.engine.dispose()
+
+
+def naive_day(timestamp: int) -> int:
+    # Referencia escalar: medianoche en Madrid con las fechas de cambio de hora de 2025
+    def offset(when: datetime) -> timedelta:
+        return timedelta(hours=2 if SUMMER_2025[0] <= when < SUMMER_2025[1] else 1)
+
+    when = datetime.fromtimestamp(timestamp, timezone.utc)
+    local = (when + offset(when)).replace(hour=0, minute=0, second=0)
+    return int((local - offset(local - timedelta(hours=2))).timestamp())
+
+
+def naive_rollups(rows):
+    groups = {}
+    for row in rows:
+        for resolution in ('hour', 'day'):
+            bucket = row['observed_at'] - row['observed_at'] % 3600 if resolution == 'hour' else naive_day(row['observed_at'])
+            for scope, scope_id in (('beach', row['beach_id']), ('province', PROVINCE_OF.get(row['beach_id']))):
+                if scope_id is None:
+                    continue
+                group = groups.setdefault((scope, scope_id, resolution, bucket), {'samples': 0})
+                group['samples'] += 1
+                for name in METRICS:
+                    values = group.setdefault(name, [])
+                    if row[name] is not None:
+                        values.append(row[name])
+    return groups
+
+
+def test_rollups_match_a_naive_reduction():
+    generator = random.Random(7)
+    # Alrededor de los dos cambios de hora y en pleno verano, con medianoches locales incluidas
+    days = (datetime(2025, 3, 29, tzinfo=timezone.utc), datetime(2025, 7, 29, tzinfo=timezone.utc),
+            datetime(2025, 10, 25, tzinfo=timezone.utc))
+    rows = []
+    for _ in range(600):
+        when = generator.choice(days) + timedelta(seconds=generator.randrange(3 * 86400))
+        row = {'beach_id': generator.choice((1, 2, 3, 4)), 'station': None, 'source': 'AEMET',
+               'observed_at': int(when.timestamp())}
+        for name in METRICS:
+            row[name] = None if generator.random() < 0.2 else round(generator.uniform(0, 40), 1)
+        rows.append(row)
+
+    result = {(row['scope'], row['scope_id'], row['resolution'], row['bucket']): row
+              for row in rollup_rows(rows, PROVINCE_OF)}
+    expected = naive_rollups(rows)
+    assert result.keys() == expected.keys()
+    for key, group in expected.items():
+        row = result[key]
+        assert row['samples'] == group['samples']
+        for name in METRICS:
+            values = group[name]
+            assert row[f'{name}_count'] == len(values)
+            assert row[f'{name}_sum'] == pytest.approx(sum(values))
+            assert row[f'{name}_min'] == (min(values) if values else None)
+            assert row[f'{name}_max'] == (max(values) if values else None)
+
+
+def test_days_are_madrid_days(store):
+    # 23:30 y 00:30 en Madrid (CEST) del 29 al 30 de julio
+    late, early = datetime(2025, 7, 29, 21, 30, tzinfo=timezone.utc), datetime(2025, 7, 29, 22, 30, tzinfo=timezone.utc)
+    store.insert_many([observation_row(1, 'C001', payload(late, 24.0)), observation_row(1, 'C001', payload(early, 22.0))])
+    days = store.query_series(1, *span(48), resolution='day')
+    assert [(row['timestamp'], row['air_temperature']) for row in days] == [
+        ('2025-07-29T00:00:00', 24.0), ('2025-07-30T00:00:00', 22.0)
+    ]
+    assert days[0]['bucket'] == int(datetime(2025, 7, 28, 22, tzinfo=timezone.utc).timestamp())
+
+    store.rollups_enabled = False
+    grouped = store.query_series(1, *span(48), resolution='day')
+    assert [(row['bucket'], row['samples'], row['air_temperature']) for row in grouped] == [
+        (row['bucket'], row['samples'], row['air_temperature']) for row in days
+    ]
+
+
+def test_utc_day_rollups_are_rebuilt(store):
+    store.insert_many([observation_row(1, 'C001', payload(datetime(2025, 7, 29, 22, 30, tzinfo=timezone.utc), 22.0))])
+    # Agregado diario por día UTC, como en versiones anteriores
+    with store.engine.begin() as conn:
+        conn.execute(rollups.update().where(rollups.c.resolution == 'day').values(
+            bucket=int(datetime(2025, 7, 29, tzinfo=timezone.utc).timestamp())
+        ))
+    store.create_schema()
+    (day,) = store.query_series(1, *span(48), resolution='day')
+    assert day['timestamp'] == '2025-07-30T00:00:00' and day['samples'] == 1
+    assert len(store.query_series(1, *span(48), resolution='hour')) == 1
+
+
+def test_observed_at_is_the_aemet_observation_time():
+    weather = AEMETService()._parse_aemet_data([{'fint': '2025-07-29T10:00:00', 'ta': 24.3, 'hr': 61}])
+    row = observation_row(1, 'C001', {'timestamp': weather.timestamp.isoformat()})
+    assert row['observed_at'] == int(datetime(2025, 7, 29, 10, tzinfo=timezone.utc).timestamp())
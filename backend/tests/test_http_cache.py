@@ -0,0 +1,84 @@
+"""
+Tests for the HTTP validators
+ETag and Last-Modified headers and 304 handling of conditional_json, with If-None-Match taking priority
+"""
+
+from datetime import datetime
+
+import pytest
+from fastapi import Request
+
+from services.http_cache import conditional_json, make_etag
+from services.local_time import madrid_time
+
+PAYLOAD = {'beach_id': 1, 'temperature': 24.3}
+# 'elaborado' de AEMET: hora de Madrid sin zona (08:52:40 CEST = 06:52:40 UTC)
+ISSUED = madrid_time(datetime(2025, 7, 29, 8, 52, 40))
+LAST_MODIFIED = 'Tue, 29 Jul 2025 06:52:40 GMT'
+
+
+def request(**headers) -> Request:
+    return Request({
+        'type': 'http', 'method': 'GET', 'path': '/',
+        'headers': [(name.replace('_', '-').encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+def respond(last_modified=ISSUED, **headers):
+    return conditional_json(request(**headers), PAYLOAD, 'v1', 300, last_modified=last_modified)
+
+
+def test_validators_and_cache_headers():
+    response = respond()
+    assert response.status_code == 200
+    assert response.headers['etag'] == make_etag('v1', PAYLOAD)
+    assert response.headers['last-modified'] == LAST_MODIFIED
+    assert response.headers['cache-control'] == 'public, max-age=300'
+
+
+@pytest.mark.parametrize('header, status', [
+    (make_etag('v1', PAYLOAD), 304),
+    # Comparación débil y listas de ETag
+    (make_etag('v1', PAYLOAD)[2:], 304),
+    (f'W/"otro", {make_etag("v1", PAYLOAD)}', 304),
+    ('*', 304),
+    (make_etag('v2', PAYLOAD), 200),
+])
+def test_if_none_match(header, status):
+    response = respond(if_none_match=header)
+    assert response.status_code == status
+    # El 304 lleva los mismos validadores y sin cuerpo
+    assert response.headers['etag'] == make_etag('v1', PAYLOAD)
+    if status == 304:
+        assert response.body == b''
+
+
+@pytest.mark.parametrize('since, status', [
+    (LAST_MODIFIED, 304),
+    ('Tue, 29 Jul 2025 08:00:00 GMT', 304),
+    ('Tue, 29 Jul 2025 06:52:39 GMT', 200),
+    # Anterior a la emisión si la hora de Madrid se tomara como UTC
+    ('Tue, 29 Jul 2025 08:52:39 GMT', 304),
+    ('no es una fecha', 200),
+])
+def test_if_modified_since(since, status):
+    assert respond(if_modified_since=since).status_code == status
+
+
+def test_if_none_match_takes_priority_over_if_modified_since():
+    # ETag distinto: se responde aunque la fecha diga que no ha cambiado
+    assert respond(if_none_match='W/"otro"', if_modified_since='Tue, 29 Jul 2025 08:00:00 GMT').status_code == 200
+    # ETag igual: 304 aunque la fecha sea anterior
+    assert respond(if_none_match=make_etag('v1', PAYLOAD),
+                   if_modified_since='Mon, 28 Jul 2025 00:00:00 GMT').status_code == 304
+
+
+def test_without_last_modified_only_the_etag_counts():
+    response = respond(last_modified=None, if_modified_since=LAST_MODIFIED)
+    assert response.status_code == 200 and 'last-modified' not in response.headers
+
+
+def test_naive_last_modified_is_compared_as_local_time():
+    naive = ISSUED.astimezone().replace(tzinfo=None)
+    response = respond(last_modified=naive, if_modified_since=LAST_MODIFIED)
+    assert response.status_code == 304 and response.headers['last-modified'] == LAST_MODIFIED
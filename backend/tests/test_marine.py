@@ -0,0 +1,144 @@
+"""
+Tests for the marine ingestion pipeline
+Coastal bulletin and buoy parsers and the zone/point table, against the recorded samples
+"""
+
+import glob
+import json
+import os
+
+import pytest
+
+from services.marine import (DEFAULT_SAMPLES_DIR, MarineConditionsTable, MarineIngestor, load_zones,
+                             parse_buoy_file, parse_coastal_bulletin, parse_sea_state, parse_swell, parse_wind,
+                             parse_zone_text)
+from services.resilience import OPEN, BreakerConfig
+from services.weather_service import AEMETService, MarineWeatherService
+
+
+@pytest.mark.parametrize('text, height', [
+    ('Marejadilla.', 0.3),
+    ('Marejadilla a marejada.', 0.68),
+    # "fuerte marejada" no cuenta además como "marejada"
+    ('Fuerte marejada.', 1.88),
+    ('Mar gruesa.', 3.25),
+    ('Calma.', 0.0),
+    ('Visibilidad buena.', None),
+])
+def test_sea_state(text, height):
+    assert parse_sea_state(text) == height
+
+
+@pytest.mark.parametrize('text, wind', [
+    ('Suroeste 3 a 4. Marejadilla.', ('SW', 4)),
+    ('Levante 5, amainando a 4.', ('E', 5)),
+    ('Componente norte 3.', ('N', 3)),
+    ('Variable 1 a 2.', ('VAR', 2)),
+    ('Marejada.', (None, None)),
+])
+def test_wind(text, wind):
+    assert parse_wind(text) == wind
+
+
+def test_swell():
+    assert parse_swell('Mar de fondo del noroeste de 1,5 a 2,5 m.') == ('NW', 2.0)
+    assert parse_swell('Mar de fondo del oeste de 1 m.') == ('W', 1.0)
+    assert parse_swell('Marejada.') == (None, None)
+
+
+def test_zone_text_keeps_the_highest_wave():
+    conditions = parse_zone_text('Suroeste 3 a 4. Marejadilla a marejada. Mar de fondo del noroeste de 1 a 2 m.')
+    assert conditions['wave_height'] == 1.5
+    assert conditions['wave_direction'] == 'NW'
+    assert (conditions['wind_direction'], conditions['wind_force'], conditions['wind_speed']) == ('SW', 4, 24)
+
+
+@pytest.mark.parametrize('path', sorted(glob.glob(os.path.join(DEFAULT_SAMPLES_DIR, 'costera_*.json'))))
+def test_recorded_bulletins(path):
+    zone_ids = {zone.id for zone in load_zones()}
+    with open(path, encoding='utf-8') as f:
+        issued, zones = parse_coastal_bulletin(json.load(f))
+    assert issued == '2025-07-29T09:00:00'
+    assert zones and set(zones) <= zone_ids
+    for conditions in zones.values():
+        assert conditions['issued'] == issued
+        assert 0 <= conditions['wave_height'] < 14
+
+
+def test_recorded_buoys():
+    with open(os.path.join(DEFAULT_SAMPLES_DIR, 'boyas.csv'), encoding='utf-8') as f:
+        buoys = parse_buoy_file(f.read())
+    assert len(buoys) == 14
+    first = buoys[0]
+    assert (first.id, first.wave_height, first.wave_period, first.wave_direction, first.water_temperature) == (
+        '2136', 1.4, 9.1, 'NW', 19.8
+    )
+
+
+def test_buoy_file_skips_invalid_rows():
+    text = ('estacion,nombre,lat,lon,fecha,hm0,tp,dir_media,temp_agua\n'
+            '1,Válida,36.5,-4.4,2025-07-29T10:00:00,0,8,-,21.5\n'
+            '2,Sin posición,,,2025-07-29T10:00:00,1.0,8,90,21.5\n')
+    buoys = parse_buoy_file(text)
+    assert [buoy.id for buoy in buoys] == ['1']
+    assert buoys[0].wave_height == 0.0 and buoys[0].wave_direction is None
+
+
+@pytest.fixture
+def ingestor(beaches):
+    table = MarineConditionsTable.load(beaches)
+    return MarineIngestor(table, AEMETService(), MarineWeatherService(), source='files')
+
+
+async def test_ingestion_fills_every_beach(ingestor, beaches):
+    assert ingestor.status()['status'] == 'warning'
+    changes = []
+    ingestor.table.add_listener(changes.append)
+
+    await ingestor.run_once()
+    for beach in beaches:
+        conditions = ingestor.table.lookup(beach.lat, beach.lng)
+        assert conditions['wave_height'] is not None and conditions['water_temperature'] is not None
+    malagueta = ingestor.table.lookup(36.7196, -4.4214)
+    assert malagueta['zone'] == '4503'
+    assert malagueta['issued'] == '2025-07-29T09:00:00'
+    assert len(changes) == 1 and len(changes[0]) == len({(round(b.lat, 4), round(b.lng, 4)) for b in beaches})
+
+    status = ingestor.status()
+    assert status['status'] == 'active'
+    assert status['last_bulletin'] == '2025-07-29T09:00:00'
+    assert status['zones_loaded'] == 27
+
+
+async def test_same_bulletins_are_parsed_once(ingestor):
+    changes = []
+    ingestor.table.add_listener(changes.append)
+    await ingestor.run_once()
+    await ingestor.run_once()
+    assert ingestor.parsed == len(ingestor.coasts)
+    assert ingestor.unchanged == len(ingestor.coasts)
+    assert ingestor.table.rebuilds == 1 and len(changes) == 1
+
+
+async def test_download_from_aemet(stub, make_manager, beaches):
+    manager = await make_manager(stub.base_url)
+    ingestor = MarineIngestor(MarineConditionsTable.load(beaches), manager.aemet, manager.marine,
+                              source='aemet', manager=manager)
+    await ingestor.run_once()
+    assert ingestor.parsed == len(ingestor.coasts) and ingestor.failed == 0
+    assert ingestor.table.lookup(36.7196, -4.4214)['zone'] == '4503'
+    # Dos saltos por costa
+    assert stub.provider_requests['aemet'] == 2 * len(ingestor.coasts)
+
+
+async def test_download_goes_through_the_aemet_breaker(stub, make_manager, beaches):
+    stub.faults = {'aemet': 'error'}
+    manager = await make_manager(stub.base_url, BreakerConfig(window=10, min_calls=3, open_seconds=60))
+    ingestor = MarineIngestor(MarineConditionsTable.load(beaches), manager.aemet, manager.marine,
+                              source='aemet', manager=manager)
+    for _ in range(5):
+        await ingestor.run_once()
+    # Cada pasada se corta en la primera costa que falla
+    assert ingestor.failed == 5 and ingestor.parsed == 0
+    assert manager.breakers['aemet'].state == OPEN
+    assert stub.provider_requests['aemet'] == 3
@@ -0,0 +1,97 @@
+"""
+Tests for the live weather push hub
+Snapshot, delta fan-out from the cache and slow-consumer disconnects, against the stub server
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from services.beach_repository import BeachRepository
+from services.push import WeatherPushHub
+
+BEACH_ID = 1
+
+
+@pytest.fixture
+async def setup(stub, make_manager):
+    # La temperatura de AEMET cambia en cada lectura
+    stub.drift = True
+    manager = await make_manager(stub.base_url)
+    repository = BeachRepository.load()
+    hubs = []
+
+    def factory(**kwargs) -> WeatherPushHub:
+        hub = WeatherPushHub(manager, repository, debounce=0, **kwargs)
+        hubs.append(hub)
+        return hub
+
+    yield manager, repository, factory
+    for hub in hubs:
+        await hub.stop()
+
+
+async def refresh_station(manager, repository):
+    # Lectura upstream del grupo de la playa, como hace el pre-calentamiento
+    (group,) = [group for group in manager.group_by_station(repository.all())
+                if BEACH_ID in {beach.id for beach in group.beaches}]
+    await manager.refresh('aemet', group.lat, group.lon, group.station, group.fallback_stations,
+                          group.municipality_code)
+
+
+def decode(event: bytes):
+    name, data = event.decode().strip().split('\n')
+    return name[len('event: '):], json.loads(data[len('data: '):])
+
+
+async def test_subscriber_receives_deltas_without_upstream_calls(setup, stub):
+    manager, repository, factory = setup
+    hub = factory()
+    subscriber = hub.subscribe([BEACH_ID])
+    snapshot = await hub.snapshot([BEACH_ID])
+    assert snapshot[BEACH_ID]['source'] == 'AEMET'
+    # La lectura del snapshot ya es la referencia: no genera cambios
+    await hub.start()
+    await asyncio.sleep(0.05)
+    assert subscriber.queue.empty()
+
+    await refresh_station(manager, repository)
+    requests = stub.requests
+    name, data = decode(await asyncio.wait_for(subscriber.queue.get(), 1))
+    assert name == 'delta' and data['beach_id'] == BEACH_ID
+    assert data['changes']['temperature']['air'] != snapshot[BEACH_ID]['temperature']['air']
+    # La tanda se calcula desde la caché: ninguna petición más al proveedor
+    assert stub.requests == requests
+    assert hub.events_sent == 1
+
+
+async def test_publish_without_cached_data_does_not_fetch(setup, stub):
+    _, _, factory = setup
+    hub = factory()
+    subscriber = hub.subscribe([BEACH_ID])
+    await hub.publish([BEACH_ID])
+    assert stub.requests == 0
+    assert subscriber.queue.empty() and hub.events_sent == 0
+
+
+async def test_slow_consumer_is_dropped(setup):
+    manager, repository, factory = setup
+    hub = factory(queue_size=2)
+    slow = hub.subscribe([BEACH_ID])
+    fast = hub.subscribe([BEACH_ID])
+    await hub.snapshot([BEACH_ID])
+
+    received = []
+    for _ in range(3):
+        await refresh_station(manager, repository)
+        await hub.publish([BEACH_ID])
+        received.append(fast.queue.get_nowait())
+    assert all(decode(event)[0] == 'delta' for event in received)
+
+    # El lento se cierra al llenarse su cola: solo le queda la señal de fin
+    assert slow.closed and not fast.closed
+    assert slow.queue.get_nowait() is None and slow.queue.empty()
+    assert (hub.events_sent, hub.disconnected) == (5, 1)
+    hub.unsubscribe(slow)
+    assert hub.stats()['subscribers'] == 1
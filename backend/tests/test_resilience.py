@@ -0,0 +1,174 @@
+"""
+Tests for the per-provider circuit breakers and adaptive fallback ordering
+Breaker state machine in isolation and end to end against the fault-injecting stub server
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from services.rate_limit import QuotaConfig, TokenBucket
+from services.resilience import CLOSED, HALF_OPEN, OPEN, BreakerConfig, CircuitBreaker, HedgeConfig, RequestHedger
+
+MALAGA = (36.7196, -4.4214, '6155A')
+
+
+def test_breaker_opens_on_failure_rate():
+    breaker = CircuitBreaker('aemet', BreakerConfig(window=10, min_calls=3, failure_rate=0.5))
+    breaker.record(True, 0.1)
+    breaker.record(False, 0.1)
+    assert breaker.state == CLOSED
+    breaker.record(False, 0.1)
+    assert breaker.state == OPEN
+    assert not breaker.allow() and not breaker.available()
+    assert breaker.stats()['rejected'] == 1
+
+
+def test_breaker_opens_on_slow_calls():
+    breaker = CircuitBreaker('aemet', BreakerConfig(window=10, min_calls=3, slow_call_seconds=1.0, slow_rate=0.5))
+    for _ in range(3):
+        breaker.record(True, 2.0)
+    assert breaker.state == OPEN
+
+
+def test_half_open_probe_closes_or_reopens():
+    breaker = CircuitBreaker('aemet', BreakerConfig(window=10, min_calls=1, open_seconds=0.05))
+    breaker.record(False, 0.1)
+    time.sleep(0.06)
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    # Una sola sonda a la vez
+    assert not breaker.allow()
+    breaker.record(False, 0.1)
+    assert breaker.state == OPEN
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record(True, 0.1)
+    assert breaker.state == CLOSED and breaker.allow()
+
+
+def test_released_probe_can_be_taken_again():
+    breaker = CircuitBreaker('aemet', BreakerConfig(window=10, min_calls=1, open_seconds=0.0))
+    breaker.record(False, 0.1)
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+@pytest.mark.parametrize('fault', ['error', 'hang', 'reset'])
+async def test_dead_aemet_falls_back_and_stops_being_called(stub, make_manager, fault):
+    stub.faults = {'aemet': fault}
+    # Algo más que el timeout de lectura (0,5 s)
+    stub.hang_seconds = 0.6
+    manager = await make_manager(stub.base_url, BreakerConfig(window=10, min_calls=3, open_seconds=60))
+
+    for _ in range(3):
+        manager.cache.clear()
+        data = await manager.get_complete_weather_data(*MALAGA)
+        assert data['source'] == 'OpenWeatherMap'
+    assert manager.breakers['aemet'].state == OPEN
+    assert manager.provider_order() == ['openweather', 'aemet']
+
+    # Con el circuito abierto AEMET no se llama y no cuesta ningún timeout
+    calls = stub.provider_requests['aemet']
+    manager.cache.clear()
+    started = time.perf_counter()
+    data = await manager.get_complete_weather_data(*MALAGA)
+    assert data['source'] == 'OpenWeatherMap'
+    assert time.perf_counter() - started < 0.25
+    assert stub.provider_requests['aemet'] == calls
+    if fault == 'hang':
+        # Las respuestas colgadas terminan antes de cerrar el stub
+        await asyncio.sleep(stub.hang_seconds)
+
+
+async def test_half_open_probe_restores_aemet(stub, make_manager):
+    stub.faults = {'aemet': 'error'}
+    manager = await make_manager(stub.base_url, BreakerConfig(window=10, min_calls=3, open_seconds=0.2))
+    for _ in range(3):
+        manager.cache.clear()
+        await manager.get_complete_weather_data(*MALAGA)
+    assert manager.breakers['aemet'].state == OPEN
+
+    stub.faults = {}
+    await asyncio.sleep(0.25)
+    manager.cache.clear()
+    data = await manager.get_complete_weather_data(*MALAGA)
+    assert data['source'] == 'AEMET'
+    assert manager.breakers['aemet'].state == CLOSED
+
+
+async def test_both_providers_down_returns_fallback_data(stub, make_manager):
+    stub.faults = {'aemet': 'error', 'openweather': 'error'}
+    manager = await make_manager(stub.base_url, BreakerConfig(window=10, min_calls=3, open_seconds=60))
+    data = await manager.get_complete_weather_data(*MALAGA)
+    assert data['source'] == 'Fallback'
+    assert 'atmospheric' in data['missing']
+
+
+async def test_quota_wait_is_not_provider_latency(make_manager):
+    manager = await make_manager()
+    bucket = TokenBucket('aemet', QuotaConfig(per_minute=600, burst=1))
+    bucket.tokens = 0
+
+    async def fetch():
+        await bucket.acquire(1)  # ~0,1 s esperando cupo propio
+        await asyncio.sleep(0.02)
+        return 'ok'
+
+    assert await manager._call_provider('aemet', fetch) == 'ok'
+    assert manager.breakers['aemet'].latency_ewma < 0.06
+
+
+async def test_cancelled_probe_is_released(make_manager):
+    manager = await make_manager(breaker=BreakerConfig(window=10, min_calls=1, open_seconds=0.0))
+    breaker = manager.breakers['aemet']
+    breaker.record(False, 0.1)
+    assert breaker.state == OPEN
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    # La sonda semiabierta se cancela (p. ej. el cliente se desconecta) antes de responder
+    probe = asyncio.ensure_future(manager._call_provider('aemet', hang))
+    await asyncio.sleep(0.01)
+    assert breaker.state == HALF_OPEN and not breaker.available()
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    assert breaker.available()
+
+    async def ok():
+        return 'ok'
+
+    assert await manager._call_provider('aemet', ok) == 'ok'
+    assert breaker.state == CLOSED
+
+
+async def test_cache_hits_are_not_hedged(stub, make_manager):
+    manager = await make_manager(stub.base_url)
+    manager.hedger = RequestHedger(HedgeConfig(enabled=True, initial_delay=0.2))
+    for _ in range(3):
+        data, source = await manager._get_atmospheric_data(*MALAGA)
+        assert data is not None and source == 'AEMET'
+    # Solo la primera lectura llega al proveedor y cuenta para el hedger
+    assert manager.hedger.requests == 1 and manager.hedger.stats()['hedge_rate'] == 0.0
+    assert stub.provider_requests['aemet'] == 2 and 'openweather' not in stub.provider_requests
+
+
+@pytest.mark.parametrize('outcome', ['empty', 'error'])
+async def test_hedge_without_result_falls_back_in_order(stub, make_manager, monkeypatch, outcome):
+    stub.faults = {'aemet': 'error'}
+    manager = await make_manager(stub.base_url)
+    manager.hedger = RequestHedger(HedgeConfig(enabled=True))
+
+    async def run(*args):
+        if outcome == 'error':
+            raise RuntimeError('hedge failed')
+        return None, None
+
+    monkeypatch.setattr(manager.hedger, 'run', run)
+    data, source = await manager._get_atmospheric_data(*MALAGA)
+    assert data is not None and source == 'OpenWeatherMap'
@@ -20,7 +20,7 @@ import { useQuery } from 'react-query';
 import axios from 'axios';
 
 interface WeatherAlert {
-  id: number;
+  id: string | number;
   type: string;
   level: 'yellow' | 'orange' | 'red';
   title: string;
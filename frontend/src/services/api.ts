@@ -58,6 +58,7 @@ export interface WeatherData {
   conditions: string;
   pressure: number;
   source?: string;
+  missing?: string[];
   coordinates?: {
     lat: number;
     lng: number;